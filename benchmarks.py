@@ -0,0 +1,548 @@
+from threading import Thread,Event
+from pathlib import Path
+import json
+import time
+import statistics
+import logging
+import python_files.models as models
+import python_files.connection as co
+
+def printLatencies(title: str, latencies: list):
+    """
+    Print mean, median and max of a list of latencies given in seconds.
+    """
+    print(f"{title} ({len(latencies)} samples)")
+    print(f"  mean   : {statistics.mean(latencies)*1000:.3f} ms")
+    print(f"  median : {statistics.median(latencies)*1000:.3f} ms")
+    print(f"  max    : {max(latencies)*1000:.3f} ms")
+
+def benchThreadExecutor(nb_tasks: int = 1000, legacy_tasks: int = 6, legacy_interval: float = 0.5):
+    """
+    Measure the time between ThreadExecutor.addTask and the start of the task.
+    The same measure is done on a loop polling its waiting list every legacy_interval seconds, like the previous executor.
+
+    :param nb_tasks: number of tasks queued on the ThreadExecutor
+    :type nb_tasks: int
+    :param legacy_tasks: number of tasks queued on the polling loop (each one costs up to legacy_interval)
+    :type legacy_tasks: int
+    :param legacy_interval: sleeping time of the polling loop (s)
+    :type legacy_interval: float
+    """
+    # Event driven executor
+    te = models.ThreadExecutor("BenchThreadExecutor")
+    te.start()
+    latencies = []
+    for i in range(nb_tasks):
+        started = Event()
+        enqueued = time.perf_counter()
+        te.addTask(lambda e=enqueued, s=started: (latencies.append(time.perf_counter()-e), s.set()))
+        started.wait()
+        # let the executor join the task before adding the next one (waiting list size is 1)
+        while te.getState() != 0:
+            time.sleep(0)
+    te.kill()
+    te.join()
+    printLatencies("ThreadExecutor enqueue-to-start latency", latencies)
+
+    # Polling loop as reference
+    wait_list = []
+    legacy_latencies = []
+    stop = Event()
+    def pollingLoop():
+        while not stop.is_set():
+            time.sleep(legacy_interval)
+            if wait_list:
+                wait_list.pop(0)()
+    poller = Thread(target=pollingLoop)
+    poller.start()
+    for i in range(legacy_tasks):
+        started = Event()
+        # desynchronise enqueue time from the polling period
+        time.sleep(legacy_interval*i/legacy_tasks)
+        enqueued = time.perf_counter()
+        wait_list.append(lambda e=enqueued, s=started: (legacy_latencies.append(time.perf_counter()-e), s.set()))
+        started.wait()
+    stop.set()
+    poller.join()
+    printLatencies(f"Polling loop ({legacy_interval}s) enqueue-to-start latency", legacy_latencies)
+
+def benchSimulator(nb_moves: int = 4, baudrates: list = None):
+    """
+    Measure movement and position query durations through a ModelControl connected to a CSeriesSimulator,
+    for each baudrate of the controllers settings file.
+
+    :param nb_moves: number of back and forth movements of 1mm at each baudrate
+    :type nb_moves: int
+    :param baudrates: *(Optional)* baudrates to simulate, by default the ones of settings_files/controleurs.json
+    :type baudrates: list[int]
+    """
+    from python_files.simulator import CSeriesSimulator
+
+    if baudrates is None:
+        with open(Path(__file__).parent / "settings_files" / "controleurs.json", "r") as f:
+            baudrates = sorted({ controller["baudrate"] for controller in json.load(f).values() }, reverse=True)
+
+    axis = ('X','Y')
+    settings = models.ModelSettings(axis)
+    for baudrate in baudrates:
+        sim = CSeriesSimulator(baudrate=baudrate)
+        sim.start()
+        settings.applySettings(
+            port=sim.port,
+            stepscales={ a:100 for a in axis },
+            speed_limits={ a:{ "max":None, "min":None } for a in axis },
+            baudrate=baudrate,
+            communication="cseries"
+        )
+        control = models.ModelControl(axis, settings)
+
+        queries = []
+        for i in range(nb_moves):
+            start = time.perf_counter()
+            control.readPositionSteps()
+            queries.append(time.perf_counter()-start)
+
+        moves = []
+        for i in range(nb_moves):
+            start = time.perf_counter()
+            control.incrMove({ 'X':1 if i%2 == 0 else -1, 'Y':0.5 }, { 'X':10, 'Y':10 }).result()
+            moves.append(time.perf_counter()-start)
+
+        control.quit()
+        sim.kill()
+        print(f"Simulated C-series at {baudrate} baud/s")
+        printLatencies("  position query", queries)
+        printLatencies("  1mm movement at 10mm/s (0.1s of motion)", moves)
+
+def benchPortDiscovery(nb_scans: int = 5):
+    """
+    Measure port discovery durations : ports opened one after another like before, first concurrent scan,
+    cached scans, and ModelSettings construction.
+
+    :param nb_scans: number of cached scans and constructions measured
+    :type nb_scans: int
+    """
+    discovery = co.PortDiscovery()
+
+    start = time.perf_counter()
+    for port in discovery.candidates():
+        discovery.probe(port)
+    sequential = time.perf_counter()-start
+
+    start = time.perf_counter()
+    ports = discovery.scan()
+    first = time.perf_counter()-start
+
+    cached = []
+    for i in range(nb_scans):
+        start = time.perf_counter()
+        discovery.scan()
+        cached.append(time.perf_counter()-start)
+
+    constructions = []
+    for i in range(nb_scans):
+        start = time.perf_counter()
+        settings = models.ModelSettings(('X','Y'))
+        constructions.append(time.perf_counter()-start)
+        settings.waitPorts()
+
+    print(f"Port discovery ({len(discovery.candidates())} candidates, {len(ports)} available)")
+    print(f"  sequential probes : {sequential*1000:.3f} ms")
+    print(f"  concurrent scan   : {first*1000:.3f} ms")
+    printLatencies("  cached scan", cached)
+    printLatencies("  ModelSettings construction", constructions)
+
+def benchStartup(nb_starts: int = 3):
+    """
+    Measure startup time of the app until its window is displayed, and of the console ui, each one is destroyed after.
+
+    :param nb_starts: number of startups measured
+    :type nb_starts: int
+    """
+    import main
+    import uiconsole
+
+    startups = []
+    try:
+        for i in range(nb_starts):
+            start = time.perf_counter()
+            app = main.launchApp(('X','Y'), mainloop=False)
+            app.update()
+            startups.append(time.perf_counter()-start)
+            app.mControl.quit()
+            app.destroy()
+        printLatencies("main.launchApp until window displayed", startups)
+    except Exception as e:
+        # no display or settings files
+        print(f"main.launchApp skipped: {e}")
+
+    startups = []
+    try:
+        for i in range(nb_starts):
+            start = time.perf_counter()
+            uiconsole.launchUiConsole(('X','Y'), interactive=False)
+            startups.append(time.perf_counter()-start)
+        printLatencies("uiconsole.launchUiConsole construction and quit", startups)
+    except Exception as e:
+        print(f"uiconsole.launchUiConsole skipped: {e}")
+
+def benchRoadmap(nb_points: int = 1000000, chunk_size: int = 10000):
+    """
+    Compare the roadmap loading of MoveAndMeasure.loadMoveSet (whole file into a list of lists)
+    with RoadmapReader : time until the first position is available and time to read every position.
+
+    :param nb_points: number of positions in the generated csv file
+    :type nb_points: int
+    :param chunk_size: number of positions read at once by RoadmapReader
+    :type chunk_size: int
+    """
+    import tempfile
+    import warnings
+    import os
+    import numpy as np
+    import pandas as pd
+    from python_files.otheruses.roadmap import RoadmapReader
+
+    fd,filepath = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        with open(filepath, "w") as f:
+            f.write("X,Y\ndefault,default\n")
+            np.savetxt(f, np.random.default_rng(0).uniform(0, 100, (nb_points,2)), fmt="%.3f", delimiter=",")
+
+        # same steps as loadMoveSet
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # mixed types warning because of the platines line
+            warnings.simplefilter("ignore")
+            df = pd.read_csv(filepath)
+        roadmap = [ list(pos) for pos in df.values[1:] ]
+        first = roadmap[0]
+        whole = time.perf_counter()-start
+
+        start = time.perf_counter()
+        reader = RoadmapReader(filepath, chunk_size=chunk_size)
+        first = next(iter(reader))
+        streamFirst = time.perf_counter()-start
+        start = time.perf_counter()
+        count = sum( len(chunk) for chunk in reader.chunks() )
+        streamAll = time.perf_counter()-start
+
+        print(f"Roadmap loading ({nb_points} positions)")
+        print(f"  loadMoveSet list of lists     : {whole*1000:.1f} ms before the first move")
+        print(f"  RoadmapReader first position  : {streamFirst*1000:.1f} ms before the first move")
+        print(f"  RoadmapReader every position  : {streamAll*1000:.1f} ms ({count} positions)")
+    finally:
+        os.remove(filepath)
+
+def benchRoadmapOrder(nb_rows: int = 30, speeds: tuple = (10,5)):
+    """
+    Estimated movement time of a row-major grid roadmap (with flybacks between rows) for each order mode,
+    and time taken to compute the order.
+
+    :param nb_rows: number of rows and of positions per row of the grid
+    :type nb_rows: int
+    :param speeds: speed of each axis (mm/s)
+    :type speeds: tuple
+    """
+    import numpy as np
+    from python_files.otheruses.roadmap import orderRoadmap,ORDER_MODES
+
+    xs,ys = np.meshgrid(np.arange(nb_rows), np.arange(nb_rows))
+    positions = np.column_stack([xs.ravel(), ys.ravel()]).astype(np.float64)
+    print(f"Roadmap order ({len(positions)} positions row-major grid)")
+    for mode in ORDER_MODES:
+        start = time.perf_counter()
+        order,before,after = orderRoadmap(positions, speeds, mode=mode, start=(0,0))
+        compute = time.perf_counter()-start
+        print(f"  {mode:<10} : {after:.1f}s of movement ({before-after:.1f}s saved), computed in {compute*1000:.1f} ms")
+
+def benchResultsSink(nb_points: int = 100000, batch_size: int = 1000):
+    """
+    Measure the time taken by ResultsSink.add at the start and at the end of a long run,
+    and the time to write the last rows at close.
+
+    :param nb_points: number of rows added
+    :type nb_points: int
+    :param batch_size: number of rows of each chunk file
+    :type batch_size: int
+    """
+    import tempfile
+    import numpy as np
+    from python_files.otheruses.results import ResultsSink
+
+    with tempfile.TemporaryDirectory() as directory:
+        sink = ResultsSink(directory, 2, batch_size=batch_size)
+        sink.start()
+        payload = np.zeros(16)
+        latencies = []
+        for i in range(nb_points):
+            start = time.perf_counter()
+            sink.add(i, (i*0.1, 0.0), time.time(), time.time(), payload)
+            latencies.append(time.perf_counter()-start)
+        start = time.perf_counter()
+        sink.close()
+        closing = time.perf_counter()-start
+
+        print(f"ResultsSink ({nb_points} rows, {sink.nb_chunks} chunks)")
+        printLatencies("  add, first 10% of the run", latencies[:nb_points//10])
+        printLatencies("  add, last 10% of the run", latencies[-nb_points//10:])
+        print(f"  close : {closing*1000:.3f} ms")
+
+def benchRoadmapGenerators(nb_side: int = 1000):
+    """
+    Time to generate roadmaps of about nb_side*nb_side positions.
+
+    :param nb_side: number of positions per line of the grids
+    :type nb_side: int
+    """
+    from python_files.otheruses import roadmap as rm
+
+    generators = {
+        "gridRoadmap": lambda: rm.gridRoadmap([(0,100,nb_side),(0,100,nb_side)]),
+        "serpentineRoadmap": lambda: rm.serpentineRoadmap([(0,100,nb_side),(0,100,nb_side)]),
+        # spiral length is about pi*radius**2/pitch
+        "spiralRoadmap": lambda: rm.spiralRoadmap([0,0], 50, 0.1, 3.1416*50**2/(0.1*nb_side**2)),
+        "polarRoadmap": lambda: rm.polarRoadmap([0,0], [ 50*i/nb_side for i in range(nb_side) ], nb_side),
+        "latinHypercubeRoadmap": lambda: rm.latinHypercubeRoadmap([0,0], [100,100], nb_side*nb_side, seed=0)
+    }
+    print("Roadmap generators")
+    for name,generator in generators.items():
+        start = time.perf_counter()
+        positions = generator()
+        duration = time.perf_counter()-start
+        print(f"  {name:<22}: {len(positions)} positions in {duration*1000:.1f} ms")
+
+def benchMoveEncoding(nb_moves: int = 100000):
+    """
+    Moves encoded per second and bytes sent per move by CSeries.moveCmd, compared to the previous encoder
+    which built the movement with f-strings and sent the axis definition before every move.
+
+    :param nb_moves: number of moves encoded
+    :type nb_moves: int
+    """
+    from python_files.communications import CSeries
+
+    speeds = { 'X':500, 'Y':300, 'Z':100 }
+    moves = [ { 'X':i%1000, 'Y':-(i%700), 'Z':i%300 } for i in range(nb_moves) ]
+
+    def previousMoveCmd(cs: CSeries, axis_values: dict)-> list:
+        axisStr = ""
+        for axis,dist in axis_values.items():
+            axisStr+=f"{int(round(dist))},{int(round(cs.speeds[axis]))},"
+        return [f"@0{cs.axisDefinition(len(axis_values))}\n\r".encode("ascii"), f"@0a {axisStr[:-1]}\n\r".encode("ascii")]
+
+    cs = CSeries(dict(speeds))
+    print("Move encoding")
+    for name,encode in (("previous encoder", lambda m: previousMoveCmd(cs, m)), ("CSeries.moveCmd", cs.moveCmd)):
+        cs.resetState()
+        start = time.perf_counter()
+        nbBytes = 0
+        nbCommands = 0
+        for move in moves:
+            cmds = encode(move)
+            # acknowledged by the controller, the axis definition is known
+            cs.commandsSent([ (cmd,b"0") for cmd in cmds ])
+            nbCommands += len(cmds)
+            nbBytes += sum( len(cmd) for cmd in cmds )
+        duration = time.perf_counter()-start
+        print(f"  {name:<17}: {nb_moves/duration:.0f} moves/s, {nbCommands/nb_moves:.2f} commands and {nbBytes/nb_moves:.1f} bytes per move")
+
+def benchCompileRoadmap(nb_moves: int = 100000):
+    """
+    Per move time to convert and encode a roadmap : prepareAbsMove for each position, like absMove,
+    compared to ModelControl.compileRoadmap on the whole roadmap. No controller is needed.
+
+    :param nb_moves: number of positions of the roadmap
+    :type nb_moves: int
+    """
+    import numpy as np
+
+    axis = ('X','Y')
+    settings = models.ModelSettings(axis)
+    settings.applySettings(
+        stepscales={ a:100 for a in axis },
+        speed_limits={ a:{ "max":20, "min":None } for a in axis },
+        communication="cseries"
+    )
+    control = models.ModelControl(axis, settings)
+    positions = np.random.default_rng(0).uniform(0, 100, (nb_moves, len(axis)))
+    speeds = { 'X':10, 'Y':5 }
+    try:
+        start = time.perf_counter()
+        for place in positions.tolist():
+            target = dict(zip(axis, place))
+            control.prepareAbsMove(target, dict(speeds))
+            control.values.update(target)
+        perMove = time.perf_counter()-start
+
+        control.values.update({ a:0 for a in axis })
+        start = time.perf_counter()
+        control.compileRoadmap(positions, speeds)
+        compiled = time.perf_counter()-start
+    finally:
+        control.quit()
+
+    print(f"Roadmap of {nb_moves} moves converted and encoded")
+    print(f"  prepareAbsMove per move : {perMove:.3f}s, {perMove/nb_moves*1e6:.1f} us per move")
+    print(f"  compileRoadmap          : {compiled:.3f}s, {compiled/nb_moves*1e6:.1f} us per move")
+
+def benchProgram(nb_moves: int = 30, baudrate: int = 9600):
+    """
+    Compare the time to do the moves of a compiled roadmap on a CSeriesSimulator, each move sent with compiledMove
+    or stored in a program run with programMove.
+
+    :param nb_moves: number of moves
+    :type nb_moves: int
+    :param baudrate: simulated baudrate
+    :type baudrate: int
+    """
+    import numpy as np
+    from python_files.simulator import CSeriesSimulator
+
+    axis = ('X','Y')
+    sim = CSeriesSimulator(baudrate=baudrate)
+    sim.start()
+    settings = models.ModelSettings(axis)
+    settings.applySettings(
+        port=sim.port,
+        stepscales={ a:100 for a in axis },
+        speed_limits={ a:{ "max":None, "min":None } for a in axis },
+        baudrate=baudrate,
+        communication="cseries"
+    )
+    control = models.ModelControl(axis, settings)
+    positions = np.random.default_rng(0).uniform(0, 2, (nb_moves, len(axis)))
+    speeds = { 'X':50, 'Y':50 }
+    durations = {}
+    try:
+        for name in ("compiledMove", "programMove"):
+            control.absMove({ a:0 for a in axis }, speeds).result()
+            compiled = control.compileRoadmap(positions, speeds)
+            start = time.perf_counter()
+            for index in range(len(compiled)):
+                if name == "compiledMove":
+                    control.compiledMove(compiled, index).result()
+                else:
+                    control.programMove(compiled, index, segment_size=nb_moves).result()
+            durations[name] = time.perf_counter()-start
+    finally:
+        control.quit()
+        sim.kill()
+
+    print(f"{nb_moves} moves, simulated C-series at {baudrate} baud/s, movement time {compiled.times.sum():.3f}s")
+    for name,duration in durations.items():
+        print(f"  {name:<12}: {duration:.3f}s, {nb_moves/duration:.1f} moves/s")
+
+def benchFlyScan(nb_points: int = 50, length: float = 5, speed: float = 10, baudrate: int = 115200):
+    """
+    Compare points per second of stop and go movements (absMove then measure) and of a continuous movement
+    (flyMove) on a line of a CSeriesSimulator.
+
+    :param nb_points: number of measurements along the line
+    :type nb_points: int
+    :param length: length of the line (mm)
+    :type length: float
+    :param speed: speed along the line (mm/s)
+    :type speed: float
+    :param baudrate: simulated baudrate
+    :type baudrate: int
+    """
+    from python_files.simulator import CSeriesSimulator
+
+    axis = ('X','Y')
+    sim = CSeriesSimulator(baudrate=baudrate)
+    sim.start()
+    settings = models.ModelSettings(axis)
+    settings.applySettings(
+        port=sim.port,
+        stepscales={ a:100 for a in axis },
+        speed_limits={ a:{ "max":None, "min":None } for a in axis },
+        baudrate=baudrate,
+        communication="cseries"
+    )
+    control = models.ModelControl(axis, settings)
+    speeds = { 'X':speed, 'Y':speed }
+    try:
+        start = time.perf_counter()
+        for i in range(1, nb_points+1):
+            control.absMove({ 'X':length*i/nb_points, 'Y':0 }, speeds).result()
+        stopAndGo = time.perf_counter()-start
+
+        control.absMove({ 'X':0, 'Y':0 }, speeds).result()
+        start = time.perf_counter()
+        samples = control.flyMove({ 'X':length, 'Y':0 }, speeds, length/speed/nb_points, lambda position: None)
+        fly = time.perf_counter()-start
+    finally:
+        control.quit()
+        sim.kill()
+
+    print(f"Line of {length}mm at {speed}mm/s, simulated C-series at {baudrate} baud/s")
+    print(f"  stop and go : {nb_points} points in {stopAndGo:.3f}s, {nb_points/stopAndGo:.1f} points/s")
+    print(f"  fly scan    : {len(samples)} points in {fly:.3f}s, {len(samples)/fly:.1f} points/s")
+
+def benchSession(nb_commands: int = 200, baudrate: int = 115200):
+    """
+    Compare commands per second on a CSeriesSimulator when the serial link is opened and configured for each
+    command (executeCmd) and when it is kept open (executeSelfCmd), and count openings of the link when settings
+    are applied again with the same values.
+
+    :param nb_commands: number of commands sent by each path
+    :type nb_commands: int
+    :param baudrate: simulated baudrate
+    :type baudrate: int
+    """
+    from python_files.simulator import CSeriesSimulator
+
+    axis = ('X','Y')
+    sim = CSeriesSimulator(baudrate=baudrate)
+    sim.start()
+    settings = models.ModelSettings(axis)
+    settings.applySettings(port=sim.port, baudrate=baudrate, communication="cseries")
+    connection = settings.connection
+    cmd = settings.communication.axis_definition_cmds[len(axis)]
+    durations = {}
+    try:
+        start = time.perf_counter()
+        for i in range(nb_commands):
+            connection.executeCmd(cmd)
+        durations["executeCmd"] = time.perf_counter()-start
+
+        connection.executeSelfCmd(cmd)
+        nbOpens = connection.nb_opens
+        start = time.perf_counter()
+        for i in range(nb_commands):
+            connection.executeSelfCmd(cmd)
+            # same settings, the session is kept
+            settings.applySettings(port=sim.port, baudrate=baudrate)
+        durations["executeSelfCmd"] = time.perf_counter()-start
+        reopened = connection.nb_opens-nbOpens
+    finally:
+        connection.close()
+        sim.kill()
+
+    print(f"{nb_commands} commands, simulated C-series at {baudrate} baud/s")
+    for name,duration in durations.items():
+        print(f"  {name:<14}: {duration:.3f}s, {nb_commands/duration:.1f} commands/s")
+    print(f"  link opened {reopened} times while applying the same settings {nb_commands} times")
+
+if __name__ == "__main__":
+    print("start")
+
+    logging.basicConfig(level=logging.WARNING)
+
+    benchThreadExecutor()
+    benchPortDiscovery()
+    benchStartup()
+    benchRoadmap()
+    benchRoadmapOrder()
+    benchRoadmapGenerators()
+    benchResultsSink()
+    benchSimulator()
+    benchMoveEncoding()
+    benchCompileRoadmap()
+    benchProgram()
+    benchSession()
+    benchFlyScan()
+
+    print("end")
@@ -2,7 +2,7 @@ from pathlib import Path
 import python_files.app.mainFrame as mf
 import logging
 
-def launchApp(axis_names: tuple[str] = ('X','Y','Z')):
+def launchApp(axis_names: tuple[str] = ('X','Y','Z'), mainloop: bool = True):
     # Current path used to find settings files
     mf.path = str(Path(__file__).parent.absolute())+"\\"
 
@@ -11,6 +11,9 @@ def launchApp(axis_names: tuple[str] = ('X','Y','Z')):
     app = mf.MainApp(title="control app",axis_names=axis_names)
     app.geometry("%dx%d" % (600,app.winfo_screenheight()))
 
+    # without mainloop the app is returned, used to measure startup time
+    if not mainloop:
+        return app
     app.mainloop()
 
 if __name__ == "__main__":
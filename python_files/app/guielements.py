@@ -153,6 +153,21 @@ class SettingLabeledEntry:
         else:
             self.entValue.config(state="normal")
     
+    def setOptions(self, options: dict):
+        """
+        Replace preset values of the combobox, the selected one is kept if still available.
+        """
+        self.options = options
+        if self.cmbSetting is None:
+            return
+        listOptions = [ "" ]
+        listOptions += [ oneOption["name"] for oneOption in options.values() ]
+        self.cmbSetting.config(values=listOptions)
+        self.cmbSetting.bind("<<ComboboxSelected>>", self.applyOption)
+        if self.cmbSetting.get() not in listOptions:
+            self.cmbSetting.set('')
+        self.entValue.config(state="disabled" if options else "normal")
+
     def applyOption(self, event=None):
         if self.cmbSetting.get() == "":
             self.inpValue.set('')
@@ -10,12 +10,18 @@ from python_files.models import ModelControl, ModelSettings
 from python_files.communications import CSeries
 from python_files.connection import MissingValue
 from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Current path
 # path = str(Path(__file__).parent.absolute())+"\\"
 path = ""
 
 class MainApp(tk.Tk):
+    # time between two checks of the background port scan (ms)
+    scan_check_interval = 100
+
     def __init__(self, axis_names, title: str ="", wait_ack = True, *args, **kwargs):
         super().__init__(*args,**kwargs)
         self.title(title)
@@ -66,6 +72,11 @@ class MainApp(tk.Tk):
         # self.reset_layout()
         # self.apply_layout()
 
+        # Ports are scanned in background, settings data is prepared once the scan is done
+        self.settingsDict = None
+        self.settingsFrame = None
+        self.after(self.scan_check_interval, self.checkPortsScan)
+
     def afterMove(self,var=None,index=None,mode=None):
         """
         Enable movement buttons and update current position labels.
@@ -129,12 +140,14 @@ class MainApp(tk.Tk):
                 fail_cbs = [lambda msg="Settings are not all set", tl="Missing value": showerror(title=tl,message=msg)]
                 # fail_cbs.append(lambda tl="Missing value", msg="Settings are not all set": showerror(title=tl,message=msg))
                 final_cbs = [lambda s="normal": self.changeStateMovementsButtons(s)]
+                # position reached, also after a stop
+                final_cbs.append(self.updateCurrentPosition)
                 # final_cbs = [lambda s=True: self.EventMoveFinished.set(s)]
                 # final_cbs.append(lambda s="normal": self.changeStateMovementsButtons(s))
 
-                cmd = self.mControl.incrMove(incrMoveDict,incrSpeedDict,callbacks=updateList,miss_val_cbs=fail_cbs,finally_cbs=final_cbs)
+                move = self.mControl.incrMove(incrMoveDict,incrSpeedDict,callbacks=updateList,miss_val_cbs=fail_cbs,finally_cbs=final_cbs)
                 # self.changeStateMovementsButtons("normal")
-                self.inpIncrCmd.set(cmd)
+                self.inpIncrCmd.set(move.command)
                 self.updateCurrentPosition()
             except MissingValue as e:
                 print("ERROR: MissingValue",e)
@@ -168,11 +181,13 @@ class MainApp(tk.Tk):
             fail_cbs = [lambda msg="Settings are not all set", tl="Missing value": showerror(title=tl,message=msg)]
             # fail_cbs.append(lambda tl="Missing value", msg="Settings are not all set": showerror(title=tl,message=msg))
             final_cbs = [lambda s="normal": self.changeStateMovementsButtons(s)]
+            # position reached, also after a stop
+            final_cbs.append(self.updateCurrentPosition)
             # final_cbs.append(lambda s="normal": self.changeStateMovementsButtons(s))
 
-            cmd = self.mControl.absMove(absMoveDict,absSpeedDict,callbacks=updateList,miss_val_cbs=fail_cbs,finally_cbs=final_cbs)
+            move = self.mControl.absMove(absMoveDict,absSpeedDict,callbacks=updateList,miss_val_cbs=fail_cbs,finally_cbs=final_cbs)
 
-            self.inpAbsCmd.set(cmd)
+            self.inpAbsCmd.set(move.command)
             self.updateCurrentPosition()
         except MissingValue as e:
             print("ERROR: MissingValue",e)
@@ -217,6 +232,8 @@ class MainApp(tk.Tk):
             fail_cbs = [lambda msg="Settings are not all set", tl="Missing value": showerror(title=tl,message=msg)]
             # fail_cbs.append(lambda tl="Missing value", msg="Settings are not all set": showerror(title=tl,message=msg))
             final_cbs = [lambda s="normal": self.changeStateMovementsButtons(s)]
+            # position reached, also after a stop
+            final_cbs.append(self.updateCurrentPosition)
             # final_cbs.append(lambda s="normal": self.changeStateMovementsButtons(s))
 
             self.mControl.goZero(callbacks=updateList, miss_val_cbs=fail_cbs, finally_cbs=final_cbs)
@@ -227,11 +244,36 @@ class MainApp(tk.Tk):
 
         # self.changeStateMovementsButtons("normal")
 
+    def checkPortsScan(self):
+        """
+        Wait for the background port scan without blocking the window, then update ports options.
+        Tkinter widgets are only used from its own thread, so the scan result is checked with after.
+        """
+        if not self.mSettings.portsScan.done():
+            self.after(self.scan_check_interval, self.checkPortsScan)
+            return
+        self.after_idle(self.onPortsScanned)
+
+    def onPortsScanned(self):
+        """
+        Prepare settings data for the settings window and update ports of the opened one.
+        """
+        try:
+            self.mSettings.loadSettings(path)
+            self.settingsDict = self.mSettings.getSettingsDict()
+        except Exception as e:
+            # loaded again when opening the settings window
+            logger.warning(f"MainApp: could not prepare settings: {e}")
+            self.settingsDict = None
+        if self.settingsFrame and self.settingsFrame.winfo_exists():
+            self.settingsFrame.parameters["port"].setOptions(self.mSettings.portsData)
+
     def closeSettings(self):
         """
         Close setting window and enable back to button to open it again.
         """
         self.settingWindow.destroy()
+        self.settingsDict = None
         self.btnOpenSettings.config(state="normal")
 
     def openSettings(self):
@@ -244,11 +286,16 @@ class MainApp(tk.Tk):
         self.settingWindow.protocol("WM_DELETE_WINDOW",self.closeSettings)
         self.settingWindow.title("Settings")
 
-        self.mSettings.loadSettings(path)
+        # use data prepared after the port scan, it is only read once
+        if self.settingsDict is None:
+            self.mSettings.loadSettings(path)
+            self.settingsDict = self.mSettings.getSettingsDict()
+        settingsDict = self.settingsDict
+        self.settingsDict = None
 
         # print("\n".join([ f"{key}:: {val}" for key,val in self.mSettings.getSettingsDict().items() ]))
 
-        self.settingsFrame = SettingsFrame(self.settingWindow, self.mSettings.getSettingsDict())
+        self.settingsFrame = SettingsFrame(self.settingWindow, settingsDict)
         self.settingsFrame.pack(expand=True, fill="both")
 
         self.settingsFrame.btnApply.config(command=self.applySettings)
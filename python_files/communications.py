@@ -1,5 +1,6 @@
 from abc import ABC,abstractmethod
 import struct
+import numpy as np
 
 # Abstract class with all methods each language should implement. Functionalities of the app.
 class Commands(ABC):
@@ -46,13 +47,148 @@ class Commands(ABC):
         """
         pass
 
+    def axisCmds(self, nbAxis: int)-> list:
+        """
+        Returns a list of commands to send before moves of nbAxis axis, empty if none is needed.
+        """
+        return []
+
+    def compileMoves(self, steps, speeds)-> list:
+        """
+        Returns the movement command of each move, without the commands of axisCmds.
+        None if the language can't compile moves, moveCmd is used for each move instead.
+        """
+        return None
+
+    def programCmds(self, steps, speeds)-> list:
+        """
+        Returns a list of commands storing moves as a program in the controller, with a wait point after each move.
+        None if the language can't store programs.
+        """
+        return None
+
+    def programRunCmd(self)-> list:
+        """
+        Returns a list of commands starting the stored program, or continuing it after a wait point.
+        None if the language can't store programs.
+        """
+        return None
+
+    def programPauseCmd(self)-> list:
+        """
+        Returns a list of commands pausing the stored program.
+        None if the language can't store programs.
+        """
+        return None
+
+    def resetState(self):
+        """
+        Forget the controller state known by the language, the next commands are built as for a new controller.
+        To call when commands are sent without the language or when the controller may have been reset.
+        """
+        pass
+
+    def commandsSent(self, acks: list):
+        """
+        Update the controller state known by the language once commands have been sent, building commands doesn't change it.
+        acks are each command and its acknowledge like SerialConnection.exchange returns them, the acknowledge is b"" if not waited
+        and None if missing.
+        """
+        pass
+
+    def positionCmd(self, nbAxis: int)-> list:
+        """
+        Returns a list of commands to ask the current position of the axis to the controller.
+        None if the language can't query the position.
+        """
+        return None
+
+    def positionResponseSize(self)-> int:
+        """
+        Returns the number of bytes answered by the controller to positionCmd.
+        """
+        return 0
+
+    def parsePosition(self, response: bytes, nbAxis: int)-> list:
+        """
+        Returns the position in steps of each axis from the controller answer to positionCmd.
+        None if the answer can't be read.
+        """
+        return None
+
+    def parseStatus(self, response: bytes)-> dict:
+        """
+        Returns the status of the controller answer to a command, as { "ok": bool, "code": str, "message": str }.
+        None if the language has no answer to read.
+        """
+        return None
+
+    def unsolicitedMarkers(self)-> bytes:
+        """
+        Returns the first bytes of the frames sent by the controller without command (like a program wait point).
+        None if unknown, every byte recieved without command is then taken as unsolicited.
+        """
+        return None
+
 class CSeries(Commands):
     """
     Summary:
         Commands language C-series extended from Commands abstract class. 
+        The axis definition known by the controller is tracked from the commands sent, so it is sent only when the number of axis moving changes.
     """
+    MOVE_PREFIX = b"@0a "
+    TERMINATOR = b"\n\r"
+    # Stored program codes
+    PROGRAM_START = b"@0i"  # next lines are stored as a program
+    PROGRAM_MOVE = b"0"     # program line of a relative move, followed by distance,speed of each axis
+    PROGRAM_WAIT = b"W"     # program line of a wait point : send PROGRAM_SYNC and wait for PROGRAM_RUN
+    PROGRAM_END = b"9"      # end of the program
+    PROGRAM_RUN = b"@0S"    # start the program, or continue after a wait point
+    PROGRAM_PAUSE = b"@0H"  # pause the program after its current line
+    PROGRAM_SYNC = b"S"     # sent by the controller on a wait point
+    # Status character answered to each command
+    ACK = b"0"
+    ERRORS = {
+        b"1": "error in a number recieved",
+        b"2": "limit switch reached",
+        b"3": "invalid axis",
+        b"4": "no axis defined",
+        b"5": "syntax error",
+        b"6": "end of program memory",
+        b"7": "invalid number of parameters",
+        b"8": "incorrect command to store",
+        b"9": "system error",
+        b"D": "invalid speed",
+        b"F": "stopped by the user",
+    }
+
     def __init__(self, axis_speeds: dict = None):
         super().__init__(axis_speeds)
+        # number of axis of the last axis definition sent, None if unknown
+        self.defined_axis = None
+        # axis definition commands by number of axis, built once
+        self.axis_definition_cmds = { nbAxis:f"@0{self.axisDefinition(nbAxis=nbAxis)}".encode("ascii")+self.TERMINATOR for nbAxis in (1,2,3) }
+
+    def resetState(self):
+        """
+        Forget the axis definition, the next move sends it again.
+        """
+        self.defined_axis = None
+
+    def commandsSent(self, acks: list):
+        """
+        Keep the axis definition acknowledged by the controller. It is forgotten after an error, a missing acknowledge
+        or a reference run (goHome, setHome), the controller may not keep it.
+        """
+        definitions = { cmd:nbAxis for nbAxis,cmd in self.axis_definition_cmds.items() }
+        for cmd,ack in acks:
+            status = self.parseStatus(ack)
+            if ack is None or (status is not None and not status["ok"]):
+                self.resetState()
+            elif cmd in definitions:
+                self.defined_axis = definitions[cmd]
+            elif cmd[:3] in (b"@0R", b"@0n"):
+                self.resetState()
 
     def stopCmd(self)-> str:
         """
@@ -66,21 +202,22 @@ class CSeries(Commands):
         Parameters:
         - axis_values : dictionary of positions by axis to move to. Move to the specified position from it's current position. Unit is in steps.
         - axis_speeds : dictionary of speed values by axis. Speed set for each axis for the move to come. Unit is in step/s.
-        Returns a list of two commands:
-        - first one is to define axis that are concerned by the move.
-        - second one is the movement command to specified position from current position.
+        Returns a list of one or two commands:
+        - the command to define axis that are concerned by the move, only if they are not the axis of the previous move.
+        - the movement command to specified position from current position.
         """
-        commands = []
-        # Define axis concerned
-        commands.append(self.axisDefinitionCmd(len(axis_values)))
+        # Define axis concerned, if the controller doesn't have this definition yet
+        commands = self.axisCmds(len(axis_values))
         # update movement speeds if redefined.
         if axis_speeds:
             self.speeds = axis_speeds
         # Create movement command
-        axisStr = ""
-        for axis,dist in axis_values.items():
-            axisStr+=f"{int(round(dist))},{int(round(self.speeds[axis]))}," 
-        commands.append(f"@0a {axisStr[:-1]}\n\r".encode("ascii"))
+        speeds = self.speeds
+        commands.append(b"".join((
+            self.MOVE_PREFIX,
+            b",".join([ b"%d,%d" % (int(round(dist)),int(round(speeds[axis]))) for axis,dist in axis_values.items() ]),
+            self.TERMINATOR
+        )))
 
         # # Test like the 2nd LabView
         # commands.append("@03\n".encode("ascii"))
@@ -94,6 +231,66 @@ class CSeries(Commands):
 
         return commands
 
+    def axisCmds(self, nbAxis: int)-> list:
+        """
+        Returns the axis definition command if the controller doesn't have the definition of nbAxis axis yet, else an empty list.
+        The definition is known by the controller once sent, see commandsSent.
+        """
+        if nbAxis == self.defined_axis:
+            return []
+        return [self.axisDefinitionCmd(nbAxis)]
+
+    def compileMoves(self, steps, speeds)-> list:
+        """
+        Parameters:
+        - steps : relative movement of each move in steps, integer array of shape (number of moves, number of axis).
+        - speeds : speed of each axis for each move in step/s, integer array of the same shape.
+        Returns:
+        - list of the movement command of each move, the axis definition is not included (see axisCmds).
+        """
+        nbAxis = steps.shape[1]
+        # one template for every move, values are interleaved as distance,speed of each axis.
+        # Formatting each row with bytes % is faster than building the columns with np.char or np.savetxt.
+        template = self.MOVE_PREFIX+b",".join([b"%d,%d"]*nbAxis)+self.TERMINATOR
+        values = np.empty((steps.shape[0], 2*nbAxis), dtype=np.int64)
+        values[:,0::2] = steps
+        values[:,1::2] = speeds
+        return [ template % tuple(row) for row in values.tolist() ]
+
+    def programCmds(self, steps, speeds)-> list:
+        """
+        Parameters:
+        - steps : relative movement of each move in steps, integer array of shape (number of moves, number of axis).
+        - speeds : speed of each axis for each move in step/s, integer array of the same shape.
+        Returns:
+        - list of commands storing a program of the moves, each one followed by a wait point.
+          The axis definition is sent before if needed, the program is started with programRunCmd.
+        """
+        nbAxis = steps.shape[1]
+        template = self.PROGRAM_MOVE+b",".join([b"%d,%d"]*nbAxis)+self.TERMINATOR
+        wait = self.PROGRAM_WAIT+self.TERMINATOR
+        values = np.empty((steps.shape[0], 2*nbAxis), dtype=np.int64)
+        values[:,0::2] = steps
+        values[:,1::2] = speeds
+        commands = self.axisCmds(nbAxis)+[self.PROGRAM_START+self.TERMINATOR]
+        for row in values.tolist():
+            commands.append(template % tuple(row))
+            commands.append(wait)
+        commands.append(self.PROGRAM_END+self.TERMINATOR)
+        return commands
+
+    def programRunCmd(self)-> list:
+        """
+        Returns one command starting the stored program, or continuing it after a wait point.
+        """
+        return [self.PROGRAM_RUN+self.TERMINATOR]
+
+    def programPauseCmd(self)-> list:
+        """
+        Returns one command pausing the stored program after its current line.
+        """
+        return [self.PROGRAM_PAUSE+self.TERMINATOR]
+
     def goHome(self, nbAxis: int)-> list:
         return [f"@0R{self.axisDefinition(nbAxis=nbAxis)}".encode("ascii")]
 
@@ -104,6 +301,60 @@ class CSeries(Commands):
         cmds = [cmd.decode("utf-8")[:-2] for cmd in commands]
         return "\n".join(cmds)
 
+    def positionCmd(self, nbAxis: int)-> list:
+        """
+        Returns one command asking the position of every axis.
+        """
+        return [f"@0P\n\r".encode("ascii")]
+
+    def positionResponseSize(self)-> int:
+        """
+        Answer is an acknowledge character followed by 6 hexadecimal characters for each of the 3 axis, whatever the number of axis used.
+        """
+        return 1+6*3
+
+    def parsePosition(self, response: bytes, nbAxis: int)-> list:
+        """
+        Parameters:
+        - response : answer of the controller to positionCmd, like b"0000064FFFF9C000000".
+        - nbAxis : number of axis to read.
+        Returns:
+        - list of positions in steps of the nbAxis first axis, None if the answer is incomplete or an error.
+        """
+        if len(response) < self.positionResponseSize() or response[:1] != self.ACK:
+            return None
+        positions = []
+        for idxAxis in range(nbAxis):
+            try:
+                pos = int(response[1+6*idxAxis:7+6*idxAxis], 16)
+            except ValueError:
+                return None
+            # 24 bits two's complement
+            if pos >= 0x800000:
+                pos -= 0x1000000
+            positions.append(pos)
+        return positions
+
+    def parseStatus(self, response: bytes)-> dict:
+        """
+        Parameters:
+        - response : answer of the controller to a command, its first character is the status.
+        Returns:
+        - { "ok": bool, "code": str, "message": str }, ok is False for an error character, None if response is empty or None.
+        """
+        if not response:
+            return None
+        code = bytes(response[:1])
+        if code == self.ACK:
+            return { "ok": True, "code": "0", "message": "ok" }
+        return { "ok": False, "code": code.decode("ascii", errors="replace"), "message": self.ERRORS.get(code, f"unknown answer {code}") }
+
+    def unsolicitedMarkers(self)-> bytes:
+        """
+        Returns PROGRAM_SYNC, the only frame sent without command. Answers to commands start with a status digit.
+        """
+        return self.PROGRAM_SYNC
+
     def axisDefinitionCmd(self, nbAxis: int)-> str:
         """
         Parameters:
@@ -111,6 +362,8 @@ class CSeries(Commands):
         Returns:
         - command to define axis meant to move.
         """
+        if nbAxis in self.axis_definition_cmds:
+            return self.axis_definition_cmds[nbAxis]
         axisDefCode = self.axisDefinition(nbAxis=nbAxis)
         return f"@0{axisDefCode}\n\r".encode("ascii")
 
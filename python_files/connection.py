@@ -1,6 +1,14 @@
 from serial import Serial
+from threading import Thread,RLock,Lock,Condition,Event,current_thread
+from concurrent.futures import ThreadPoolExecutor,Future,wait
+import os
+import io
+import select
+from collections import deque
+import asyncio
 import serial.tools.list_ports
 import time
+import math
 import sys
 import glob
 import logging
@@ -23,8 +31,19 @@ class SerialConnection(Serial):
         - timeout: int, maximum time to send a command without any response, unit is s.
         - bytesize: message length
         - parity 
+        - ack_window: int, number of commands sent without waiting for their acknowledge.
+        - acks: list of (command, acknowledge) of the last transmission, acknowledge is None if not recieved or command not sent.
+        - use_reader: bool, read answers with a SerialReader started when the link is opened.
+        - reader: SerialReader, reading thread of the open link, None if not used.
+        - unsolicited_markers: bytes, first bytes of the frames the controller sends without command, see SerialReader. None if unknown.
+        - reconnect_attempts: int, number of new attempts to open the link after a failure.
+        - reconnect_delay: float, wait before the first new attempt, doubled after each one up to reconnect_max_delay (s).
+        - nb_opens: int, number of times the link has been opened.
+
+    The link is kept open between commands (session) by executeSelfCmd and query. It is reconfigured only when configure
+    changes the port, baudrate or parity, and closed after a transmission error, then opened again by the next command.
     """
-    def __init__(self, timeout: int = 10, bytesize: int = 8, wait_ack = True):
+    def __init__(self, timeout: int = 10, bytesize: int = 8, wait_ack = True, ack_window: int = 1, use_reader: bool = True):
         """
         :param timeout: max waiting time when reading before aborting
         :type timeout: float | int
@@ -32,6 +51,10 @@ class SerialConnection(Serial):
         :type bytesize: int
         :param wait_ack: *(Optional)* Wait for an acknowledge message after sending each command.
         :type wait_ack: bool
+        :param ack_window: *(Optional)* Number of commands in flight before waiting for the oldest acknowledge. 1 waits each acknowledge before sending the next command.
+        :type ack_window: int
+        :param use_reader: *(Optional)* Read answers with an always-on SerialReader instead of reading after each write.
+        :type use_reader: bool
         """
         super().__init__()
         self.port = None
@@ -40,40 +63,285 @@ class SerialConnection(Serial):
         self.bytesize = bytesize
         self.parity = serial.PARITY_NONE
         self.wait_ack = wait_ack
+        self.ack_window = ack_window
+        self.acks: list = []
+        self.use_reader = use_reader
+        self.reader: SerialReader = None
+        self.unsolicited_markers: bytes = None
+        self.reconnect_attempts = 3
+        self.reconnect_delay = 0.1
+        self.reconnect_max_delay = 2.0
+        self.nb_opens = 0
+        # one exchange at a time on the serial link
+        self.lock = RLock()
+        # registering an answer and writing its command, also taken by interrupt during an exchange
+        self.write_lock = Lock()
 
-    def available_serial_ports(self):
+    def available_serial_ports(self, refresh: bool = False):
         """
-        Read the available serial ports names
+        Read the available serial ports names, probed concurrently and cached by portDiscovery.
 
+        :param refresh: *(Optional)* probe again every port, even the cached ones.
+        :type refresh: bool
         :raises EnvironmentError:
             On unsupported or unknown platforms
         :return: A list of the serial ports available on the system
         :rtype: list[str]
         """
-        if sys.platform.startswith('win'):
-            ports = ['COM%s' % (i + 1) for i in range(256)]
-        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-            # this excludes your current terminal "/dev/tty"
-            ports = glob.glob('/dev/tty[A-Za-z]*')
-        elif sys.platform.startswith('darwin'):
-            ports = glob.glob('/dev/tty.*')
-        else:
-            raise EnvironmentError('Unsupported platform')
+        return portDiscovery.scan(refresh=refresh)
+
+    def checkSettings(self, port=None):
+        """
+        Check every setting needed to communicate is set.
+
+        :param port: *(Optional)* port to send commands to, self.port is used if not given.
+        :type port: str
+        :raises MissingValue: if a setting is not set.
+        :return: port to communicate with.
+        :rtype: str
+        """
+        if not port:
+            port = self.port
+        if not port:
+            raise MissingValue("Missing setting: port is not set. Either give it in function param or set it in class attribute")
+        if not self.baudrate or self.baudrate <= 0:
+            raise MissingValue("Missing setting: baudrate is not set. Set it in class attribute")
+        if not self.bytesize or self.bytesize <= 0:
+            raise MissingValue("Missing setting: bytesize is not set. Set it in class attribute")
+        if not self.parity:
+            raise MissingValue("Missing setting: parity is not set. Set it in class attribute")
+        return port
+
+    def configure(self, port: str = None, baudrate: int = None, parity: str = None)-> bool:
+        """
+        Change the settings of the link which are given and different from the current ones.
+        An open link is closed if the port changes (opened again by the next command), and reconfigured in place for baudrate and parity.
+
+        :param port: *(Optional)* new port
+        :type port: str
+        :param baudrate: *(Optional)* new baudrate (baud/s)
+        :type baudrate: int
+        :param parity: *(Optional)* new parity, like serial.PARITY_NONE
+        :type parity: str
+        :return: True if a setting changed
+        :rtype: bool
+        """
+        changed = False
+        with self.lock:
+            if port is not None and port != self.port:
+                if self.is_open:
+                    self.close()
+                self.port = port
+                changed = True
+            if baudrate is not None and baudrate != self.baudrate:
+                self.baudrate = baudrate
+                changed = True
+            if parity is not None and parity != self.parity:
+                self.parity = parity
+                changed = True
+        if changed:
+            logger.debug(f"connection configured: port {self.port}, baudrate {self.baudrate}, parity {self.parity}")
+        return changed
+
+    def ensureOpen(self):
+        """
+        Open the serial link if necessary, and start its SerialReader if use_reader is set.
+        A link whose reader stopped on an error is opened again.
+        Opening is attempted again reconnect_attempts times, with a wait doubled after each failure.
+
+        :raises serial.SerialException: if the link can't be opened.
+        """
+        if self.reader is not None and self.reader.error is not None:
+            logger.warning(f"serial link lost ({self.reader.error}), reconnecting")
+            self.close()
+        if not self.is_open:
+            delay = self.reconnect_delay
+            for attempt in range(self.reconnect_attempts+1):
+                try:
+                    # print("Openning the serial connection")
+                    logger.info("Openning the serial connection")
+                    self.open()
+                    self.nb_opens += 1
+                    break
+                except serial.SerialException as e:
+                    if attempt == self.reconnect_attempts:
+                        raise
+                    logger.warning(f"could not open {self.port} ({e}), new attempt in {delay}s")
+                    time.sleep(delay)
+                    delay = min(2*delay, self.reconnect_max_delay)
+        if self.use_reader and (self.reader is None or not self.reader.is_alive()):
+            self.reader = SerialReader(self, unsolicited_markers=self.unsolicited_markers)
+            self.reader.start()
+
+    def setUnsolicitedMarkers(self, markers: bytes):
+        """
+        :param markers: first bytes of the frames the controller sends without command (like a program wait point), None if unknown.
+            Other bytes recieved without command are late answers, discarded by the SerialReader.
+        :type markers: bytes
+        """
+        self.unsolicited_markers = markers
+        if self.reader is not None:
+            with self.reader.condition:
+                self.reader.unsolicited_markers = markers
+
+    def readAnswer(self, request: "FrameRequest", size: int = 1)-> bytes:
+        """
+        Read an answer, from the request registered to the SerialReader before writing its command, or from the link if no reader is used.
+
+        :param request: request of the answer, None if no reader is used.
+        :type request: python_files.connection.FrameRequest
+        :param size: *(Optional)* number of bytes of the answer if no reader is used.
+        :type size: int
+        :return: answer, shorter than expected if timed out.
+        :rtype: bytes
+        """
+        if request is None:
+            return self.read(size)
+        return request.wait(self.timeout)
+
+    def expect(self, size: int = 1)-> "FrameRequest":
+        """
+        :return: request of the answer of the next command written, None if no reader is used.
+        :rtype: python_files.connection.FrameRequest
+        """
+        if self.reader is None:
+            return None
+        return self.reader.expect(size)
+
+    def send(self, cmd: bytes, size: int = None)-> "FrameRequest":
+        """
+        Register the answer of a command and write it, as one step so commands written by interrupt keep their answers in order.
+
+        :param cmd: command to write
+        :type cmd: bytes
+        :param size: *(Optional)* number of bytes of the answer, no answer expected if not given.
+        :type size: int
+        :return: request of the answer, None if no answer is expected or no reader is used.
+        :rtype: python_files.connection.FrameRequest
+        """
+        with self.write_lock:
+            request = self.expect(size) if size else None
+            self.write(cmd)
+        return request
+
+    def interrupt(self, commands)-> list:
+        """
+        Write commands right away, without waiting for the end of the exchange in progress (like a stop during a position query).
+        Their acknowledges are given in order with the other answers by the SerialReader. Without reader or if the link is
+        not open, commands are executed by executeSelfCmd.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :return: each command and its acknowledge, None if missing, empty if not waited.
+        :rtype: list[tuple[bytes,bytes]]
+        """
+        if(isinstance(commands,bytes) or isinstance(commands,str)):
+            commands = [commands]
+        commands = [ cmd.encode("ascii") if isinstance(cmd,str) else cmd for cmd in commands ]
+        if self.reader is None or not self.reader.is_alive() or not self.is_open:
+            return self.exchange(commands)
+        requests = []
+        try:
+            for cmd in commands:
+                logger.debug(f"launch interrupting cmd: {cmd}")
+                requests.append((cmd, self.send(cmd, 1 if self.wait_ack else None)))
+        except (serial.SerialException, OSError) as e:
+            logger.warning(f"transmission error, closing the serial link: {e}")
+            self.close()
+            raise
+        acks = []
+        for cmd,request in requests:
+            ack = request.wait(self.timeout) if request is not None else b""
+            acks.append((cmd,ack if request is None or ack else None))
+        return acks
+
+    def discardUnsolicited(self)-> bytes:
+        """
+        Forget the unsolicited frames recieved and not read yet, like a program wait point recieved after its timeout.
+        Without SerialReader, the bytes waiting in the input buffer are discarded.
+
+        :return: bytes discarded, empty without SerialReader.
+        :rtype: bytes
+        """
+        if self.reader is None:
+            with self.lock:
+                if self.is_open:
+                    self.reset_input_buffer()
+            return b""
+        with self.reader.condition:
+            data = b"".join(self.reader.unsolicited)
+            self.reader.unsolicited.clear()
+        if data:
+            logger.debug(f"unsolicited frames discarded: {data}")
+        return data
+
+    def query(self, commands, size: int, port=None, timeout: float = None)-> bytes:
+        """
+        Send a single command or a list of commands and read the answer of the controller.
+        Open the serial link if necessary but let it open afterwards.
+        Without commands and with a SerialReader, the next unsolicited bytes are read.
 
-        result = []
-        for port in ports:
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param size: number of bytes expected in the answer.
+        :type size: int
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        :param timeout: *(Optional)* max waiting time for the answer, self.timeout is used if not given.
+        :type timeout: float | int
+        :return: bytes recieved, shorter than size if the answer timed out.
+        :rtype: bytes
+        """
+        port = self.checkSettings(port)
+
+        if not commands and self.reader is not None and self.reader.is_alive():
+            # unsolicited bytes, the exchange lock is not needed and other commands (like a stop) can be sent meanwhile
+            answer = self.reader.nextUnsolicited(size, self.timeout if timeout is None else timeout)
+            logger.debug(f"unsolicited answer ({len(answer)}): {answer}")
+            return answer
+
+        with self.lock:
+            self.ensureOpen()
             try:
-                s = serial.Serial(port)
-                s.close()
-                result.append(port)
-            except (OSError, serial.SerialException):
-                pass
-        return result
+                # Manage single command
+                if(isinstance(commands,bytes) or isinstance(commands,str)):
+                    commands = [commands]
+                with self.write_lock:
+                    request = self.expect(size) if commands else None
+                    for cmd in commands:
+                        if isinstance(cmd,str):
+                            cmd = cmd.encode("ascii")
+                        logger.debug(f"launch query: {cmd}")
+                        self.write(cmd)
+
+                if self.reader and request is None:
+                    answer = self.reader.nextUnsolicited(size, self.timeout if timeout is None else timeout)
+                elif request is not None:
+                    answer = request.wait(self.timeout if timeout is None else timeout)
+                else:
+                    default_timeout = self.timeout
+                    if timeout is not None:
+                        self.timeout = timeout
+                    try:
+                        answer = self.read(size)
+                    finally:
+                        if timeout is not None:
+                            self.timeout = default_timeout
+            except (serial.SerialException, OSError) as e:
+                # reopened by the next command
+                logger.warning(f"transmission error, closing the serial link: {e}")
+                self.close()
+                raise
+        logger.debug(f"query answer ({len(answer)}): {answer}")
+        return answer
 
     def executeSelfCmd(self, commands, port=None):
         """
         Execute a single command or a list of commands.
         Open the serial link if necessary but let it open afterwards.
+        If ack_window is greater than 1, commands are pipelined with executePipelinedCmd.
+        Each command and its acknowledge (None if missing, empty if not waited) are stored in self.acks,
+        use exchange to get them from the call when other threads send commands too.
         
         Return options :
         - 0 if no acknowledge is recieved, all commands might not have been sent.
@@ -86,16 +354,31 @@ class SerialConnection(Serial):
         :return: success state of the transmission.
         :rtype: int
         """
-        if not port:
-            port = self.port
-        if not port:
-            raise MissingValue("Missing setting: port is not set. Either give it in function param or set it in class attribute")
-        if not self.baudrate or self.baudrate <= 0:
-            raise MissingValue("Missing setting: baudrate is not set. Set it in class attribute")
-        if not self.bytesize or self.bytesize <= 0:
-            raise MissingValue("Missing setting: bytesize is not set. Set it in class attribute")
-        if not self.parity:
-            raise MissingValue("Missing setting: parity is not set. Set it in class attribute")
+        self.checkSettings(port)
+        if self.wait_ack and self.ack_window > 1:
+            return self.executePipelinedCmd(commands, self.ack_window)
+        self.exchange(commands, port)
+        # end of command transmission
+        # print("end of command transmission")
+        logger.debug("end of command transmission")
+        return 1
+
+    def exchange(self, commands, port=None)-> list:
+        """
+        Execute a single command or a list of commands like executeSelfCmd, and return their acknowledges.
+        Open the serial link if necessary but let it open afterwards.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        :return: each command and its acknowledge, None if missing or not sent, empty if not waited.
+        :rtype: list[tuple[bytes,bytes]]
+        """
+        port = self.checkSettings(port)
+
+        if self.wait_ack and self.ack_window > 1:
+            return self.pipelinedExchange(commands, self.ack_window)
 
         # # Simulation
         # # TO_REMOVE OR COMMENT
@@ -110,48 +393,152 @@ class SerialConnection(Serial):
         # logger.info("...end of simulated connection")
         # return 1
 
-        if not self.is_open:
-            # print("Openning the serial connection")
-            logger.info("Openning the serial connection")
-            self.open()
+        acks = []
+        with self.lock:
+            self.ensureOpen()
+            try:
+                # Manage single command
+                if(isinstance(commands,bytes) or isinstance(commands,str)):
+                    commands = [commands]
+                # Execute commands
+                for cmd in commands:
+                    # encode to ascii format if not already done
+                    if isinstance(cmd,str):
+                        cmd = cmd.encode("ascii")
+                    # execute command if good format
+                    if isinstance(cmd,bytes):
+                        # print("launch cmd: ",cmd)
+                        logger.debug(f"launch cmd: {cmd}")
+                        request = self.send(cmd, 1 if self.wait_ack else None)
+                        if self.wait_ack:
+                            # ack = self.readline()
+                            ack = self.readAnswer(request)
+                            # raw bytes, parsed by the commands language (Commands.parseStatus)
+                            # print(f"recieved ({len(ack)}): {ack}")
+                            logger.debug(f"recieved ({len(ack)}): {ack}")
+                            # check if an acknowledge is recieved
+                            if len(ack) == 0:
+                                # print("no acknowledge recieved")
+                                logger.debug("no acknowledge recieved")
+                                ack = None
+                                # return 0
+                            acks.append((cmd,ack))
+                        else:
+                            acks.append((cmd,b""))
+            except (serial.SerialException, OSError) as e:
+                # reopened by the next command
+                logger.warning(f"transmission error, closing the serial link: {e}")
+                self.close()
+                raise
+            self.acks = acks
+        return acks
 
-        # Manage single command
+    def executePipelinedCmd(self, commands, window: int):
+        """
+        Execute a list of commands keeping up to window commands sent without acknowledge, see pipelinedExchange.
+        Open the serial link if necessary but let it open afterwards.
+
+        Each command and its acknowledge (None if missing or not sent) are stored in self.acks.
+
+        Return options :
+        - 0 if an acknowledge is missing, all commands might not have been sent.
+        - 1 if all commands were sent and all acknowledge revieved.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param window: max number of commands waiting for their acknowledge.
+        :type window: int
+        :return: success state of the transmission.
+        :rtype: int
+        """
+        acks = self.pipelinedExchange(commands, window)
+        if any( ack is None for cmd,ack in acks ):
+            return 0
+        return 1
+
+    def pipelinedExchange(self, commands, window: int)-> list:
+        """
+        Execute a list of commands keeping up to window commands sent without acknowledge, and return their acknowledges.
+        Acknowledges are read in the order commands were sent, each one is matched with the oldest command in flight.
+        If an acknowledge is missing, no more commands are sent, the acknowledges of the commands in flight are not waited
+        and the commands left are reported as not sent.
+        Open the serial link if necessary but let it open afterwards.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param window: max number of commands waiting for their acknowledge.
+        :type window: int
+        :return: each command and its acknowledge, None if missing or not sent.
+        :rtype: list[tuple[bytes,bytes]]
+        """
+        # Manage single command and encode to ascii format if not already done
         if(isinstance(commands,bytes) or isinstance(commands,str)):
             commands = [commands]
-        # Execute commands
-        for cmd in commands:
-            # encode to ascii format if not already done
-            if isinstance(cmd,str):
-                cmd = cmd.encode("ascii")
-            # execute command if good format
-            if isinstance(cmd,bytes):
-                # print("launch cmd: ",cmd)
-                logger.debug(f"launch cmd: {cmd}")
-                self.write(cmd)
-                if self.wait_ack:
-                    # ack = self.readline()
-                    ack = self.read()
-                    try:
-                        # print(f"recieved ({len(ack)}): {str(ack,'UTF-8')}")
-                        logger.debug(f"raw recieved ({len(ack)}): {ack}")
-                        logger.debug(f"recieved ({len(ack)}): {ack.decode('utf-16')}")
-                    except UnicodeDecodeError as e:
-                        # print(f"WARNING : Could'nt decode a byte recieved after sending a command\n{e}")
-                        logger.warning(f"WARNING : Could'nt decode a byte recieved after sending a command\n{e}")
-                    # check if an acknowledge is recieved
-                    if len(ack) == 0:
-                        # print("no acknowledge recieved")
-                        logger.debug("no acknowledge recieved")
-                        # return 0
-        # end of command transmission
-        # print("end of command transmission")
-        logger.debug("end of command transmission")
-        return 1
+        commands = [ cmd.encode("ascii") if isinstance(cmd,str) else cmd for cmd in commands if isinstance(cmd,(str,bytes)) ]
+
+        acks = []
+        in_flight = deque()
+        missing_ack = False
+        with self.lock:
+            self.ensureOpen()
+            try:
+                for cmd in commands:
+                    if missing_ack:
+                        logger.warning(f"command not sent after a missing acknowledge: {cmd}")
+                        acks.append((cmd,None))
+                        continue
+                    logger.debug(f"launch cmd: {cmd}")
+                    request = self.send(cmd, 1)
+                    in_flight.append((cmd,request))
+                    if len(in_flight) >= window:
+                        missing_ack = not self.readPipelinedAck(in_flight.popleft(), acks)
+                # Acknowledges of the last commands, not waited after a missing one
+                while in_flight:
+                    if not missing_ack:
+                        missing_ack = not self.readPipelinedAck(in_flight.popleft(), acks)
+                        continue
+                    cmd,request = in_flight.popleft()
+                    ack = request.wait(0) if request is not None else b""
+                    acks.append((cmd,ack or None))
+                if missing_ack and self.reader is None:
+                    # late acknowledges would be read as the answers of the next commands
+                    self.reset_input_buffer()
+            except (serial.SerialException, OSError) as e:
+                # reopened by the next command
+                logger.warning(f"transmission error, closing the serial link: {e}")
+                self.close()
+                raise
+            self.acks = acks
+
+        logger.debug("end of pipelined command transmission")
+        return acks
+
+    def readPipelinedAck(self, in_flight: tuple, acks: list)-> bool:
+        """
+        Read the acknowledge of the oldest command in flight and add it to acks.
+
+        :param in_flight: command the acknowledge belongs to, and its request if a SerialReader is used.
+        :type in_flight: tuple[bytes,python_files.connection.FrameRequest]
+        :param acks: acknowledges of the exchange
+        :type acks: list[tuple[bytes,bytes]]
+        :return: True if an acknowledge has been recieved.
+        :rtype: bool
+        """
+        cmd,request = in_flight
+        ack = self.readAnswer(request)
+        if len(ack) == 0:
+            logger.warning(f"no acknowledge recieved for command {cmd}")
+            acks.append((cmd,None))
+            return False
+        logger.debug(f"recieved {ack} for command {cmd}")
+        acks.append((cmd,ack))
+        return True
 
     def executeCmd(self, commands, port=None):
         """
         Execute a single command or a list of commands.
-        Open a serial link and close it afterwards.
+        Open a serial link and close it afterwards, an open session is closed first.
+        Prefer executeSelfCmd, which keeps the link open between commands.
         
         Return options :
         - 0 if no acknowledge is recieved, all commands might not have been sent.
@@ -164,16 +551,7 @@ class SerialConnection(Serial):
         :return: success state of the transmission.
         :rtype: int
         """
-        if not port:
-            port = self.port
-        if not port:
-            raise MissingValue("Missing setting: port is not set. Either give it in function param or set it in class attribute")
-        if not self.baudrate or self.baudrate <= 0:
-            raise MissingValue("Missing setting: baudrate is not set. Set it in class attribute")
-        if not self.bytesize or self.bytesize <= 0:
-            raise MissingValue("Missing setting: bytesize is not set. Set it in class attribute")
-        if not self.parity:
-            raise MissingValue("Missing setting: parity is not set. Set it in class attribute")
+        port = self.checkSettings(port)
 
         # # Simulation
         # # TO_REMOVE OR COMMENT
@@ -189,13 +567,17 @@ class SerialConnection(Serial):
         # return 1
 
         # Execution
+        if self.is_open:
+            self.close()
         with self as ser:
             ser.port        = port
             ser.baudrate    = self.baudrate
             ser.timeout     = self.timeout
             ser.bytesize    = self.bytesize
             ser.parity      = self.parity
-            ser.open()
+            # already opened by the context manager if self.port was set
+            if not ser.is_open:
+                ser.open()
             # print("serial opened")
             logger.debug("serial opened")
             # Manage single command
@@ -213,12 +595,8 @@ class SerialConnection(Serial):
                     ser.write(cmd)
                     if self.wait_ack:
                         ack = ser.read()
-                        try:
-                            # print(f"recieved ({len(ack)}): {str(ack,'UTF-8')}")
-                            logger.debug(f"recieved ({len(ack)}): {str(ack,'UTF-8')}")
-                        except UnicodeDecodeError as e:
-                            # print(f"WARNING : Could'nt decode a byte recieved after sending a command\n{e}")
-                            logger.warning(f"WARNING : Could'nt decode a byte recieved after sending a command\n{e}")
+                        # print(f"recieved ({len(ack)}): {ack}")
+                        logger.debug(f"recieved ({len(ack)}): {ack}")
                         # check if an acknowledge is recieved
                         if len(ack) == 0:
                             # print("no acknowledge recieved")
@@ -232,12 +610,642 @@ class SerialConnection(Serial):
 
     def close(self):
         """
-        Close the current serial link if it is open.
+        Close the current serial link if it is open, and stop its SerialReader.
         """
+        if self.reader:
+            self.reader.kill()
+            self.reader = None
         if self.is_open:
             # print("Closing the serial")
             logger.debug("Closing the serial")
             super().close()
         else:
             # print("serial is not open, already closed")
-            logger.debug("serial is not open, already closed")
\ No newline at end of file
+            logger.debug("serial is not open, already closed")
+
+class FrameRequest:
+    """
+    Answer expected by a command, filled by a SerialReader.
+
+    Attributes:
+        - size: int, number of bytes of the answer.
+        - data: bytes, answer once recieved, None before.
+        - abandoned_at: float, time.monotonic() when its consumer stopped waiting, None while waited.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.data: bytes = None
+        self.abandoned_at: float = None
+        self.event = Event()
+
+    def wait(self, timeout: float = None)-> bytes:
+        """
+        Wait for the answer.
+
+        :param timeout: *(Optional)* max waiting time (s), without limit if not given.
+        :type timeout: float
+        :return: answer, empty if timed out. A late answer is then discarded by the reader.
+        :rtype: bytes
+        """
+        if self.event.wait(timeout):
+            return self.data
+        self.abandoned_at = time.monotonic()
+        return b""
+
+class SerialReader(Thread):
+    """
+    Always-on reading of a SerialConnection : recieved bytes are drained into a preallocated ring buffer
+    and split into frames.
+
+    Commands register the answer they expect with expect(size) before being written, answers are given
+    to requests in order. An answer recieved after its request timed out is discarded, until late_timeout
+    has passed, so it is not taken as the answer of the next command. Unsolicited frames of unsolicited_size
+    bytes (like a program wait point) are read with nextUnsolicited or given to unsolicited_callbacks.
+    With unsolicited_markers, they are the frames starting with one of these bytes, even while requests are waiting,
+    and other bytes recieved without request (a late answer after late_timeout) are discarded.
+    Without, every byte recieved without request is unsolicited.
+
+    On platforms where the serial port has a file descriptor, bytes are read directly into the ring buffer.
+
+    Attributes:
+        - connection: SerialConnection, serial link read.
+        - size: int, size of the ring buffer (bytes).
+        - late_timeout: float, time a timed out request keeps its late answer (s).
+        - unsolicited_size: int, size of an unsolicited frame (bytes).
+        - unsolicited_markers: bytes, first bytes of unsolicited frames, None if every byte without request is unsolicited.
+        - unsolicited_callbacks: list of functions called with each unsolicited frame, from the reading thread.
+        - unsolicited: deque of the unsolicited frames not read yet, the oldest are dropped after max_unsolicited frames.
+    """
+    def __init__(self, connection: "SerialConnection", size: int = 4096, late_timeout: float = 1.0, unsolicited_size: int = 1, unsolicited_markers: bytes = None, max_unsolicited: int = 1024):
+        """
+        :param connection: open serial connection
+        :type connection: python_files.connection.SerialConnection
+        :param size: *(Optional)* size of the ring buffer (bytes)
+        :type size: int
+        :param late_timeout: *(Optional)* time a timed out request keeps its late answer (s)
+        :type late_timeout: float
+        :param unsolicited_size: *(Optional)* size of an unsolicited frame (bytes)
+        :type unsolicited_size: int
+        :param unsolicited_markers: *(Optional)* first bytes of unsolicited frames, like b"S"
+        :type unsolicited_markers: bytes
+        :param max_unsolicited: *(Optional)* number of unsolicited frames kept while they are not read
+        :type max_unsolicited: int
+        """
+        Thread.__init__(self, name="SerialReader", daemon=True)
+        self.connection = connection
+        self.size = size
+        self.late_timeout = late_timeout
+        self.unsolicited_size = unsolicited_size
+        self.unsolicited_markers = unsolicited_markers
+        self.unsolicited_callbacks: list = []
+
+        self.ring = bytearray(size)
+        self.view = memoryview(self.ring)
+        # bytes recieved and not framed yet : count bytes from head, wrapping at size
+        self.head = 0
+        self.count = 0
+        self.requests = deque()
+        self.unsolicited = deque(maxlen=max_unsolicited)
+        self.condition = Condition()
+        self.killed = False
+        # exception which stopped the reading, None if none
+        self.error: Exception = None
+
+    def expect(self, size: int)-> FrameRequest:
+        """
+        Register the answer of the next command, before writing it.
+
+        :param size: number of bytes of the answer
+        :type size: int
+        :return: request to wait for the answer
+        :rtype: python_files.connection.FrameRequest
+        """
+        request = FrameRequest(size)
+        with self.condition:
+            self.requests.append(request)
+            self.frame()
+        return request
+
+    def nextUnsolicited(self, size: int = None, timeout: float = None)-> bytes:
+        """
+        Wait for unsolicited frames.
+
+        :param size: *(Optional)* number of bytes to read, unsolicited_size if not given.
+        :type size: int
+        :param timeout: *(Optional)* max waiting time (s), without limit if not given.
+        :type timeout: float
+        :return: bytes of the oldest unsolicited frames, shorter than size if timed out.
+        :rtype: bytes
+        """
+        size = size or self.unsolicited_size
+        deadline = None if timeout is None else time.monotonic()+timeout
+        data = b""
+        with self.condition:
+            while len(data) < size:
+                if self.unsolicited:
+                    data += self.unsolicited.popleft()
+                    continue
+                remaining = None if deadline is None else deadline-time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        return data
+
+    def run(self):
+        """
+        Read recieved bytes into the ring buffer until killed or the serial link is closed.
+        """
+        fd = None
+        try:
+            fd = self.connection.fileno()
+            fileio = io.FileIO(fd, "rb", closefd=False)
+        except (AttributeError, OSError, ValueError):
+            fileio = None
+        while not self.killed and self.connection.is_open:
+            try:
+                if fileio is not None:
+                    readable,_,_ = select.select([fd], [], [], 0.05)
+                    if not readable:
+                        self.expire()
+                        continue
+                    with self.condition:
+                        region = self.freeRegion()
+                    nb = fileio.readinto(region)
+                    if nb == 0:
+                        raise serial.SerialException("device reports readiness to read but returned no data")
+                    nb = nb or 0
+                else:
+                    waiting = self.connection.in_waiting
+                    if not waiting:
+                        time.sleep(0.001)
+                        self.expire()
+                        continue
+                    with self.condition:
+                        region = self.freeRegion()
+                    # at most the contiguous free part, the rest is read at the next pass after wrapping
+                    data = self.connection.read(min(waiting, len(region)))
+                    nb = len(data)
+                    region[:nb] = data
+            except (OSError, ValueError, serial.SerialException) as e:
+                if not self.killed and self.connection.is_open:
+                    logger.warning(f"SerialReader stopped: {e}")
+                    self.error = e
+                break
+            if nb:
+                with self.condition:
+                    self.count += nb
+                    self.frame()
+        logger.debug(f"{self.name} has been killed.")
+
+    def freeRegion(self)-> memoryview:
+        """
+        :return: contiguous free part of the ring buffer, the oldest bytes are dropped if it is full.
+        :rtype: memoryview
+        """
+        if self.count == self.size:
+            logger.warning(f"SerialReader buffer full, {self.unsolicited_size} oldest bytes dropped")
+            self.head = (self.head+self.unsolicited_size)%self.size
+            self.count -= self.unsolicited_size
+        end = (self.head+self.count)%self.size
+        return self.view[end:min(self.size, end+self.size-self.count)]
+
+    def take(self, nb: int)-> bytes:
+        """
+        :return: the nb oldest bytes of the ring buffer, removed from it.
+        :rtype: bytes
+        """
+        end = self.head+nb
+        if end <= self.size:
+            data = bytes(self.view[self.head:end])
+        else:
+            data = b"".join((self.view[self.head:], self.view[:end-self.size]))
+        self.head = end%self.size
+        self.count -= nb
+        return data
+
+    def expire(self):
+        """
+        Forget timed out requests whose late answer is not expected anymore.
+        """
+        with self.condition:
+            now = time.monotonic()
+            while self.requests and self.requests[0].abandoned_at is not None and now-self.requests[0].abandoned_at > self.late_timeout:
+                logger.debug(f"no late answer recieved for a request of {self.requests[0].size} bytes")
+                self.requests.popleft()
+            self.frame()
+
+    def frame(self):
+        """
+        Split the bytes recieved into unsolicited frames and answers of the requests, in order. Called with condition held.
+        """
+        frames = []
+        markers = self.unsolicited_markers
+        while self.count:
+            if markers and self.ring[self.head] in markers:
+                if self.count < self.unsolicited_size:
+                    break
+                frames.append(self.take(self.unsolicited_size))
+            elif self.requests:
+                request = self.requests[0]
+                if self.count < request.size:
+                    break
+                self.requests.popleft()
+                request.data = self.take(request.size)
+                if request.abandoned_at is not None:
+                    logger.debug(f"late answer discarded: {request.data}")
+                request.event.set()
+            elif markers:
+                # late answer of a forgotten request
+                logger.debug(f"byte recieved without request discarded: {self.take(1)}")
+            elif self.count >= self.unsolicited_size:
+                frames.append(self.take(self.unsolicited_size))
+            else:
+                break
+        if frames:
+            dropped = len(self.unsolicited)+len(frames)-self.unsolicited.maxlen
+            if dropped > 0:
+                logger.warning(f"{dropped} unsolicited frames not read are dropped")
+            self.unsolicited.extend(frames)
+            self.condition.notify_all()
+            for data in frames:
+                logger.debug(f"unsolicited frame recieved: {data}")
+                for callback in self.unsolicited_callbacks:
+                    callback(data)
+
+    def kill(self):
+        """
+        Stop reading, the pending requests time out.
+        """
+        self.killed = True
+        if self.is_alive() and self is not current_thread():
+            self.join()
+
+class AsyncSerialConnection:
+    """
+    Send commands with asyncio, using the settings of a SerialConnection.
+
+    On platforms where the serial port has a file descriptor, the event loop is notified when bytes
+    are recieved, no thread is used. Otherwise reads are done in the default executor of the loop.
+
+    Attributes:
+        - connection: SerialConnection, settings and serial link used.
+        - buffer: bytearray, bytes recieved and not read yet.
+        - pending_acks: int, acknowledges of commands written by interrupt, read before the next exchange.
+    """
+    def __init__(self, connection: SerialConnection):
+        """
+        :param connection: serial connection with port, baudrate, bytesize and parity set.
+        :type connection: python_files.connection.SerialConnection
+        """
+        self.connection = connection
+        # the event loop reads the link, no SerialReader
+        self.connection.use_reader = False
+        self.buffer = bytearray()
+        self.pending_acks = 0
+        self.lock: asyncio.Lock = None
+        self.data_event: asyncio.Event = None
+        self.reader_fd: int = None
+        self.loop: asyncio.AbstractEventLoop = None
+
+    def open(self, port=None):
+        """
+        Open the serial link if necessary and watch it from the running event loop.
+
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        """
+        self.connection.checkSettings(port)
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+            self.data_event = asyncio.Event()
+        if not self.connection.is_open:
+            logger.info("Openning the serial connection")
+            self.connection.open()
+        if self.reader_fd is None and hasattr(self.connection, "fileno"):
+            self.reader_fd = self.connection.fileno()
+            self.loop = asyncio.get_running_loop()
+            self.loop.add_reader(self.reader_fd, self.onReadable)
+
+    def onReadable(self):
+        """
+        Move recieved bytes from the serial link to self.buffer. Called by the event loop.
+        """
+        data = self.connection.read(self.connection.in_waiting or 1)
+        if data:
+            self.buffer.extend(data)
+            self.data_event.set()
+
+    async def read(self, size: int = 1, timeout: float = None)-> bytes:
+        """
+        Wait until size bytes are recieved or timeout is reached.
+
+        :param size: number of bytes to read.
+        :type size: int
+        :param timeout: *(Optional)* max waiting time, connection timeout is used if not given (s).
+        :type timeout: float | int
+        :return: bytes recieved, shorter than size if timed out.
+        :rtype: bytes
+        """
+        if timeout is None:
+            timeout = self.connection.timeout
+        loop = asyncio.get_running_loop()
+        if self.reader_fd is None:
+            # no file descriptor to watch
+            return await loop.run_in_executor(None, self.connection.read, size)
+
+        deadline = loop.time()+timeout
+        while len(self.buffer) < size:
+            self.data_event.clear()
+            remaining = deadline-loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self.data_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    async def executeCmd(self, commands, port=None)-> int:
+        """
+        Execute a single command or a list of commands, waiting for each acknowledge if connection.wait_ack is set.
+        Open the serial link if necessary but let it open afterwards.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        :return: success state of the transmission, 0 if an acknowledge is missing, 1 otherwise.
+        :rtype: int
+        """
+        self.open(port)
+        # Manage single command
+        if(isinstance(commands,bytes) or isinstance(commands,str)):
+            commands = [commands]
+        res = 1
+        async with self.lock:
+            await self.readPendingAcks()
+            for cmd in commands:
+                if isinstance(cmd,str):
+                    cmd = cmd.encode("ascii")
+                logger.debug(f"launch cmd: {cmd}")
+                self.connection.write(cmd)
+                if self.connection.wait_ack:
+                    ack = await self.read(1)
+                    if len(ack) == 0:
+                        logger.warning(f"no acknowledge recieved for command {cmd}")
+                        res = 0
+        logger.debug("end of command transmission")
+        return res
+
+    async def query(self, commands, size: int, port=None, timeout: float = None)-> bytes:
+        """
+        Send a single command or a list of commands and read the answer of the controller.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param size: number of bytes expected in the answer.
+        :type size: int
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        :param timeout: *(Optional)* max waiting time for the answer, connection timeout is used if not given.
+        :type timeout: float | int
+        :return: bytes recieved, shorter than size if the answer timed out.
+        :rtype: bytes
+        """
+        self.open(port)
+        if(isinstance(commands,bytes) or isinstance(commands,str)):
+            commands = [commands]
+        async with self.lock:
+            await self.readPendingAcks()
+            for cmd in commands:
+                if isinstance(cmd,str):
+                    cmd = cmd.encode("ascii")
+                logger.debug(f"launch query: {cmd}")
+                self.connection.write(cmd)
+            answer = await self.read(size, timeout)
+        logger.debug(f"query answer ({len(answer)}): {answer}")
+        return answer
+
+    def interrupt(self, commands, port=None)-> int:
+        """
+        Write commands (like a stop) at once, without waiting for the exchange in progress.
+        Their acknowledges come after the answer of the exchange in progress, they are not waited
+        but read at the start of the next exchange.
+
+        :param commands: commands to be executed, byte format should be ascii.
+        :type commands: str | byte | list[str|byte]
+        :param port: *(Optional)* port to send commands to.
+        :type port: str
+        :return: number of commands written
+        :rtype: int
+        """
+        self.open(port)
+        if(isinstance(commands,bytes) or isinstance(commands,str)):
+            commands = [commands]
+        for cmd in commands:
+            if isinstance(cmd,str):
+                cmd = cmd.encode("ascii")
+            logger.debug(f"launch interrupt: {cmd}")
+            self.connection.write(cmd)
+            if self.connection.wait_ack:
+                self.pending_acks += 1
+        return len(commands)
+
+    async def readPendingAcks(self):
+        """
+        Read the acknowledges of the commands written by interrupt, so they are not taken as answers of the next commands.
+        Called with the lock held.
+        """
+        if self.pending_acks == 0:
+            return
+        nb = self.pending_acks
+        self.pending_acks = 0
+        acks = await self.read(nb)
+        if len(acks) < nb:
+            logger.warning(f"{nb-len(acks)} acknowledges of interrupt commands not recieved")
+        logger.debug(f"interrupt acknowledges: {acks}")
+
+    def close(self):
+        """
+        Stop watching the serial link and close it.
+        """
+        if self.reader_fd is not None:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.reader_fd)
+            self.reader_fd = None
+            self.loop = None
+        self.connection.close()
+
+
+class PortDiscovery:
+    """
+    Discover available serial ports.
+
+    Candidates are probed concurrently by max_workers threads, each probe has probe_timeout seconds to open the port.
+    Results are cached by device node : a scan only probes new or replaced nodes, and nothing at all
+    if the devices folder did not change since the last scan. A port whose probe did not return in time is cached
+    as unavailable, it is not probed again while its probe is stuck.
+
+    Attributes:
+        - probe_timeout: float, time given to the probes to open their port, unit is s.
+        - cache: dict of device node:(node signature, available).
+        - stuck: dict of device node:future of its probe still running after its scan.
+    """
+    def __init__(self, probe_timeout: float = 0.5, max_workers: int = 16):
+        """
+        :param probe_timeout: *(Optional)* time given to the probes to open their port, unit is s.
+        :type probe_timeout: float
+        :param max_workers: *(Optional)* maximum number of ports probed at the same time.
+        :type max_workers: int
+        """
+        self.probe_timeout = probe_timeout
+        self.max_workers = max_workers
+        self.cache: dict = {}
+        self.devices_signature = None
+        self.lock = Lock()
+        self.stuck: dict = {}
+        # kept between scans, a stuck probe holds one of its threads instead of a new thread per scan
+        self.prober = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="PortProbe")
+        # single worker, background scans are done one after the other
+        self.scanner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="PortDiscovery")
+
+    def candidates(self)-> list:
+        """
+        List device nodes which could be serial ports.
+
+        :raises EnvironmentError:
+            On unsupported or unknown platforms
+        :return: candidate port names
+        :rtype: list[str]
+        """
+        if sys.platform.startswith('win'):
+            # only ports known by the system, instead of COM1 to COM256
+            return [ port.device for port in serial.tools.list_ports.comports() ]
+        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+            # this excludes your current terminal "/dev/tty"
+            return glob.glob('/dev/tty[A-Za-z]*')
+        elif sys.platform.startswith('darwin'):
+            return glob.glob('/dev/tty.*')
+        else:
+            raise EnvironmentError('Unsupported platform')
+
+    def devicesSignature(self):
+        """
+        :return: value changing when device nodes are added or removed, None if unknown.
+        """
+        if sys.platform.startswith('win'):
+            return None
+        try:
+            return os.stat("/dev").st_mtime_ns
+        except OSError:
+            return None
+
+    def nodeSignature(self, port: str):
+        """
+        :return: value changing when the device node is replaced, like when a usb adapter is plugged again.
+        """
+        try:
+            stat = os.stat(port)
+            return (stat.st_ctime_ns, getattr(stat, "st_rdev", 0))
+        except OSError:
+            return None
+
+    def probe(self, port: str)-> bool:
+        """
+        Try to open and close a port, reads and writes limited to probe_timeout.
+
+        :return: If the port could be opened.
+        :rtype: bool
+        """
+        try:
+            s = serial.Serial(port, timeout=self.probe_timeout, write_timeout=self.probe_timeout)
+            s.close()
+            return True
+        except (OSError, serial.SerialException):
+            return False
+
+    def scan(self, refresh: bool = False)-> list:
+        """
+        Update the cache and return available ports.
+
+        :param refresh: *(Optional)* probe again every candidate, even the cached ones.
+        :type refresh: bool
+        :return: available port names
+        :rtype: list[str]
+        """
+        with self.lock:
+            signature = self.devicesSignature()
+            if not refresh and signature is not None and signature == self.devices_signature:
+                return self.ports()
+
+            signatures = { port: self.nodeSignature(port) for port in self.candidates() }
+            # forget removed nodes
+            for port in list(self.cache.keys()):
+                if port not in signatures:
+                    del self.cache[port]
+            toProbe = [ port for port,sign in signatures.items()
+                        if refresh or port not in self.cache or self.cache[port][0] != sign ]
+
+            complete = True
+            for port,probe in list(self.stuck.items()):
+                if probe.done():
+                    del self.stuck[port]
+                elif port in toProbe:
+                    # still stuck in its previous probe
+                    toProbe.remove(port)
+                    self.cache[port] = (signatures[port], False)
+            if toProbe:
+                logger.debug(f"PortDiscovery: probing {len(toProbe)} ports")
+                try:
+                    probes = { self.prober.submit(self.probe, port): port for port in toProbe }
+                except RuntimeError:
+                    # interpreter is shutting down
+                    logger.debug("PortDiscovery: scan cancelled")
+                    return self.ports()
+                # probe_timeout for each probe, max_workers probes at a time
+                done,notDone = wait(probes, timeout=math.ceil(len(probes)/self.max_workers)*self.probe_timeout)
+                for probe in done:
+                    self.cache[probes[probe]] = (signatures[probes[probe]], probe.result())
+                for probe in notDone:
+                    port = probes[probe]
+                    if probe.cancel():
+                        # not started, behind stuck probes : probed again on next scan
+                        self.cache.pop(port, None)
+                        complete = False
+                    else:
+                        logger.debug(f"PortDiscovery: probe of {port} did not return in {self.probe_timeout}s, unavailable")
+                        self.cache[port] = (signatures[port], False)
+                        self.stuck[port] = probe
+
+            self.devices_signature = signature if complete else None
+            return self.ports()
+
+    def scanInBackground(self, callbacks: list = None, refresh: bool = False)-> Future:
+        """
+        Scan ports in a background thread.
+
+        :param callbacks: *(Optional)* functions called with the available port names list at the end of the scan.
+        :type callbacks: list[function]
+        :param refresh: *(Optional)* probe again every candidate, even the cached ones.
+        :type refresh: bool
+        :return: future resolved with the available port names
+        :rtype: concurrent.futures.Future
+        """
+        def scanAndCall():
+            ports = self.scan(refresh=refresh)
+            for cb in callbacks or []:
+                cb(ports)
+            return ports
+        return self.scanner.submit(scanAndCall)
+
+    def ports(self)-> list:
+        """
+        :return: available port names from the cache, without probing.
+        :rtype: list[str]
+        """
+        return sorted( port for port,(sign,available) in self.cache.items() if available )
+
+# shared by every connection, so ports are probed once per program
+portDiscovery = PortDiscovery()
@@ -1,24 +1,45 @@
 import json
 import python_files.communications as com
 import python_files.connection as co
-from threading import Thread,Lock
+from threading import Thread,Lock,Condition,Event
 import time
+import math
+import asyncio
+from concurrent.futures import Future,CancelledError
 from copy import deepcopy
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class MoveInterrupted(Exception):
+    """
+    Meant to be raise when axis stopped before the end of a movement, like after a stop.
+    Position values are then the position reached.
+    """
+    pass
+
+class ControllerError(Exception):
+    """
+    Meant to be raise when the controller answered an error or didn't acknowledge a command which must be recieved.
+    """
+    pass
+
 class ModelSettings:
     """
     Load, store and update settings to send the signal.
     """
     axisParameters = ["platine"]
     
-    def __init__(self, axis_names : tuple, wait_ack : bool = True):
+    def __init__(self, axis_names : tuple, wait_ack : bool = True, ack_window : int = 1):
         """
         :param axis_names: list of axis names, up to 3 axis implemented
         :type axis_names: tuple, list
+        :param wait_ack: *(Optional)* Wait for an acknowledge message after sending each command.
+        :type wait_ack: bool
+        :param ack_window: *(Optional)* Number of commands sent before waiting for the oldest acknowledge.
+        :type ack_window: int
         """
         self.axis = axis_names
         # link to controller class for port list
@@ -29,10 +50,11 @@ class ModelSettings:
 
         self.default_speeds: dict = { axis_name:None for axis_name in axis_names } # default speed values
 
-        self.connection: co.SerialConnection = co.SerialConnection(wait_ack=wait_ack) # connection to controller
+        self.connection: co.SerialConnection = co.SerialConnection(wait_ack=wait_ack, ack_window=ack_window) # connection to controller
 
-        # Ports data
-        self.portsData = self.getAvailablePorts()
+        # Ports data, cached ports now and the others when the background scan is done
+        self.portsData = self.portsToData(co.portDiscovery.ports())
+        self.portsScan = self.scanPorts()
 
     def saveSettings(self, path: str, port: str = None, platines: dict = None, controller: str = None):
         """
@@ -142,7 +164,9 @@ class ModelSettings:
             if(not isinstance(port,str)):
                 raise TypeError(f"port should be a string, not {type(port)} [value:{port}]")
             self.port = port
-            self.connection.port = self.port
+            if self.connection.configure(port=self.port) and getattr(self, "communication", None):
+                # new controller, its axis definition is unknown
+                self.communication.resetState()
         if stepscales != -1:
             for keyAxis,valStepScale in stepscales.items():
                 if keyAxis in self.stepscales.keys(): # and valStepScale in self.platinesData ?
@@ -175,13 +199,15 @@ class ModelSettings:
             # print(f"ModelSetting: setting baudrate as {baudrate}")
             logger.debug(f"ModelSetting: setting baudrate as {baudrate}")
             self.baudrate = baudrate
-            self.connection.baudrate = self.baudrate
+            self.connection.configure(baudrate=self.baudrate)
 
         if communication != -1:
             if(not isinstance(communication,str)):
                 logger.warning(f"communication should be a str, not {type(communication)} [value:{communication}]")
             logger.debug(f"ModelSetting: setting communication as {communication}")
             self.communication = com.getCommandsClass(communication, self.default_speeds)
+            if self.communication is not None:
+                self.connection.setUnsolicitedMarkers(self.communication.unsolicitedMarkers())
 
     def applySettingsFromData(self):
         """
@@ -415,11 +441,13 @@ class ModelSettings:
             if arel and pname == "speed":
                 self.default_speeds[key[len(pname):]] = defData
 
-    def getAvailablePorts(self):
+    def getAvailablePorts(self, refresh: bool = False):
         """
-        Read available ports from pyserial.Serial.
+        Read available ports from python_files.connection.portDiscovery.
         Returns format is like : { "COM3": { "name": "COM3", "value": "COM3" } }
 
+        :param refresh: *(Optional)* probe again every port, even the cached ones.
+        :type refresh: bool
         :return: dictionary of available ports 
         :rtype: dict[dict]
         """
@@ -429,7 +457,56 @@ class ModelSettings:
         #     "COM3": { "name": "COM3", "value": "COM3"},
         #     "COM4": { "name": "COM4", "value": "COM4"}
         # }
-        return { port: { "name": port, "value": port } for port in self.connection.available_serial_ports() }
+        return self.portsToData(self.connection.available_serial_ports(refresh=refresh))
+
+    def portsToData(self, ports: list)-> dict:
+        """
+        :param ports: port names
+        :type ports: list[str]
+        :return: dictionary of ports formatted like { "COM3": { "name": "COM3", "value": "COM3" } }
+        :rtype: dict[dict]
+        """
+        return { port: { "name": port, "value": port } for port in ports }
+
+    def scanPorts(self, callbacks: list = None, refresh: bool = False)-> "Future":
+        """
+        Update portsData from a port scan done in background.
+
+        :param callbacks: *(Optional)* functions called with portsData at the end of the scan, from the scanning thread.
+        :type callbacks: list[function]
+        :param refresh: *(Optional)* probe again every port, even the cached ones.
+        :type refresh: bool
+        :return: future resolved with portsData
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        def updatePorts(ports):
+            self.portsData = self.portsToData(ports)
+            logger.debug(f"ModelSetting: {len(self.portsData)} ports available")
+            future.set_result(self.portsData)
+            for cb in callbacks or []:
+                cb(self.portsData)
+        def scanFailed(scan):
+            if scan.exception() is not None and not future.done():
+                logger.warning(f"ModelSetting: port scan failed: {scan.exception()}")
+                future.set_exception(scan.exception())
+        co.portDiscovery.scanInBackground(callbacks=[updatePorts], refresh=refresh).add_done_callback(scanFailed)
+        return future
+
+    def waitPorts(self, timeout: float = None)-> dict:
+        """
+        Wait for the end of the last port scan.
+
+        :param timeout: *(Optional)* maximum waiting time, unit is s.
+        :type timeout: float
+        :return: dictionary of available ports, like portsData
+        :rtype: dict[dict]
+        """
+        try:
+            self.portsScan.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"ModelSetting: port scan failed or too long: {e}")
+        return self.portsData
 
 class ModelControl:
     """
@@ -438,7 +515,7 @@ class ModelControl:
     Launch commands, save current position, read settings from python_files.models.ModelSettings and save concrete settings.
     Every actions is managed by this class.
     """
-    def __init__(self, axis_names, settings: ModelSettings = None):
+    def __init__(self, axis_names, settings: ModelSettings = None, completion: str = "status", poll_interval: float = 0.05):
         """
         :param axis_names: axis names like ('X','Y'). Up to 3 axis supported.
         :type axis_names: tuple | list
@@ -446,18 +523,52 @@ class ModelControl:
         :type communication: python_files.communications.Commands
         :param settings: settings class to get values from
         :type settings: python_files.models.ModelSettings 
+        :param completion: *(Optional)* how the end of a movement is detected. "status" polls the controller position, "timed" waits the time calculated by calcMoveTime.
+        :type completion: str
+        :param poll_interval: *(Optional)* time between two position queries when completion is "status" (s).
+        :type poll_interval: float
         """
         self.values     = { axis_name:0 for axis_name in axis_names } # usually in mm (unit)
         self.speeds     = { axis_name:0 for axis_name in axis_names } # usually in mm/s (unit/s)
         self.settings = settings
+        self.completion = completion
+        self.poll_interval = poll_interval
+        self.query_timeout = 1 # seconds, max waiting time of a position answer
+        # consecutive position queries without answer before completion is set to "timed" for good
+        self.max_position_failures = 3
+        self.position_failures = 0
+        self.position_ttl = 0.2 # seconds, max age of the position returned by getPosition
+        # (time.monotonic(), steps of each axis) of the last position read, None if none or outdated
+        self.position_cache: tuple = None
+        self.position_lock = Lock()
+        # incremented each time the cache is cleared, a position read started before is not cached
+        self.position_generation = 0
+        self.cache_lock = Lock()
+        # controller position (step) of the origin of position values, None while unknown
+        self.origin: dict = None
+        # set by stop, ends the wait of a program wait point
+        self.stop_event = Event()
+        # (compiled roadmap, first move, move after the last one) of the program stored in the controller, None if none
+        self.program: tuple = None
 
         self.connection = self.settings.connection # controller connection
 
+        # future of the action being executed
+        self.currentFuture: "MoveFuture" = None
         # self.teCommands = None
-        self.teCommands = ThreadExecutor("SerialConnectionThreadList")
-
-        self.teCommands.start()
+        self.teCommands = self.createExecutor()
     
+    def createExecutor(self)-> "ThreadExecutor":
+        """
+        Create and start the thread waiting list executing actions one after another.
+
+        :return: started thread waiting list
+        :rtype: python_files.models.ThreadExecutor
+        """
+        teCommands = ThreadExecutor("SerialConnectionThreadList")
+        teCommands.start()
+        return teCommands
+
     def setValue(self, axis, value):
         """
         Set current position value on the specified axis. Unit is mm.
@@ -537,6 +648,95 @@ class ModelControl:
                 axis_speeds[axis] = smin
         return axis_speeds
 
+    def completeSpeeds(self, axis_values: dict, axis_speeds: dict = None)-> dict:
+        """
+        Give the default speed of the ModelSettings linked to each axis of axis_values without a speed in axis_speeds.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: *(Optional)* speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :return: speed values of every axis of axis_values. Unit is mm/s
+        :rtype: dict[str:int|float]
+        :raises ValueError: an axis has neither a speed given nor a default speed.
+        """
+        axis_speeds = dict(axis_speeds or {})
+        for axis in axis_values.keys():
+            if axis_speeds.get(axis) is None:
+                default = self.settings.default_speeds.get(axis)
+                if default is None:
+                    raise ValueError(f"!! ERROR !! no speed given nor default speed set for axis {axis}")
+                axis_speeds[axis] = default
+        return axis_speeds
+
+    def prepareIncrMove(self, axis_values: dict, axis_speeds: dict)-> tuple[list,dict,dict]:
+        """
+        Convert an incremental movement to steps and create its commands.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :return: commands, movement (step) and speeds (step/s) of each axis
+        :rtype: tuple[list,dict,dict]
+        :raises ValueError: an axis moved has neither a speed given nor a default speed.
+        """
+        axis_speeds = self.completeSpeeds(axis_values, axis_speeds)
+        axis_speeds = self.checkSpeed(axis_speeds)
+        axis_values = self.convertMmToSteps(axis_values)
+        axis_speeds = self.convertMmToSteps(axis_speeds)
+        cmds = self.settings.communication.moveCmd(axis_values=axis_values, axis_speeds=axis_speeds)
+        return cmds,axis_values,axis_speeds
+
+    def prepareAbsMove(self, axis_values: dict, axis_speeds: dict)-> tuple[list,dict,dict]:
+        """
+        Convert an absolute movement to a relative movement in steps from current position values and create its commands.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :return: commands, relative movement (step) and speeds (step/s) of each axis
+        :rtype: tuple[list,dict,dict]
+        """
+        # Transform absolute values to relative values
+        rel_axis_values = axis_values.copy()
+        for key,val in axis_values.items():
+            rel_axis_values[key] = -(self.values[key]-val)
+        return self.prepareIncrMove(rel_axis_values, axis_speeds)
+
+    def prepareGoZero(self)-> tuple[list,dict,dict]:
+        """
+        Create the commands of a movement to position 0 on each axis from the current position values.
+        Speed of the movement is either mid value between max and min, or max/2 if no min, or min*2 if no max, 5mm/s instead.
+
+        :return: commands, relative movement (step) and speeds (step/s) of each axis
+        :rtype: tuple[list,dict,dict]
+        """
+        # Getting axis delta to go to zero
+        axis_values = {}
+        axis_speeds = {}
+        for axis,curPos in self.values.items():
+            smax = self.settings.speed_limits[axis]["max"]
+            smin = self.settings.speed_limits[axis]["min"]
+            speed = 5
+            if smax and smin and smax-smin>0:
+                speed = (smin+smax)/2
+            elif smax and smax>0:
+                speed = smax/2
+            elif smin and smin>0:
+                speed = smin*2
+            axis_values.update({
+                axis: -curPos
+            })
+            axis_speeds.update({
+                axis: speed
+            })
+        axis_values = self.convertMmToSteps(axis_values)
+        axis_speeds = self.convertMmToSteps(axis_speeds)
+        cmds = self.settings.communication.moveCmd(axis_values=axis_values,axis_speeds=axis_speeds)
+        return cmds,axis_values,axis_speeds
+
     def incrMove(self, axis_values: dict, axis_speeds: dict = None, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
         """
         launch a command to move to axis_values without taking on board current position.
@@ -551,41 +751,19 @@ class ModelControl:
         :type miss_val_cbs: list[function]
         :param finally_cbs: actions to do after the movement in a finally statement
         :type finally_cbs: list[function]
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values at the end of the movement, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
-        axis_speeds = self.checkSpeed(axis_speeds)
-        axis_values = self.convertMmToSteps(axis_values)
-        axis_speeds = self.convertMmToSteps(axis_speeds)
         # Create and execute command
-        cmds = self.settings.communication.moveCmd(axis_values=axis_values, axis_speeds=axis_speeds)
+        cmds,axis_values,axis_speeds = self.prepareIncrMove(axis_values, axis_speeds)
         # res = self.connection.executeSelfCmd(cmds)
         # res = self.teCommands.addTask(self.connection.executeSelfCmd, cmds)
 
-        tth = Thread(target=time.sleep,args=(self.calcMoveTime(axis_values,axis_speeds),))
-
         functionList = []
-        functionList.append(tth.start)
-        functionList.append(lambda c=cmds: self.connection.executeSelfCmd(c))
-        functionList.append(tth.join)
-        # functionList.append(lambda t=self.calcMoveTime(axis_values,axis_speeds): time.sleep(t))
+        functionList.append(lambda c=cmds,axv=axis_values,axs=axis_speeds: self.executeMove(c,axv,axs))
         functionList.append(lambda axv=axis_values,axs=axis_speeds: self.incrUpdate(axv,axs))
-        if callbacks:
-            functionList += callbacks
         logger.info(f"sending incremental move to {axis_values}")
-        res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
-
-        # time.sleep(1)
-
-        # print("DO SMTH?",res)
-        # if res == 0:
-        #     # Deduce current value
-        #     for key,incrVal in axis_values.items():
-        #         if axis_speeds[key] > 0:
-        #             self.values[key] += incrVal / self.settings.stepscales[key]
-        
-        # print("curr pos: ",self.values)
-        return self.settings.communication.commandsToString(cmds)
+        return self.queueAction(self.settings.communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
 
 
     def absMove(self, axis_values: dict, axis_speeds: dict = None, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
@@ -602,62 +780,60 @@ class ModelControl:
         :type miss_val_cbs: list[function]
         :param finally_cbs: actions to do after the movement in a finally statement
         :type finally_cbs: list[function]
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values at the end of the movement, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
-        # Transform absolute values to relative values
-        rel_axis_values = axis_values.copy()
-        for key,val in axis_values.items():
-            rel_axis_values[key] = -(self.values[key]-val)
-
-        axis_speeds = self.checkSpeed(axis_speeds)
-        rel_axis_values = self.convertMmToSteps(rel_axis_values)
-        axis_speeds = self.convertMmToSteps(axis_speeds)
-        # print(rel_axis_values)
-
         # Create and execute command
-        cmds = self.settings.communication.moveCmd(axis_values=rel_axis_values, axis_speeds=axis_speeds)
+        cmds,rel_axis_values,axis_speeds = self.prepareAbsMove(axis_values, axis_speeds)
         # print("sending ",cmds)
         # res = self.connection.executeSelfCmd(cmds)
         # res = self.teCommands.addTask(self.connection.executeSelfCmd, cmds)
 
-        tth = Thread(target=time.sleep,args=(self.calcMoveTime(rel_axis_values,axis_speeds),))
-
         functionList = []
-        functionList.append(tth.start)
-        functionList.append(lambda c=cmds: self.connection.executeSelfCmd(c))
-        # functionList.append(lambda t=self.calcMoveTime(rel_axis_values,axis_speeds): time.sleep(t))
-        functionList.append(tth.join)
+        functionList.append(lambda c=cmds,axv=rel_axis_values,axs=axis_speeds: self.executeMove(c,axv,axs))
         functionList.append(lambda axv=axis_values,axs=axis_speeds: self.absUpdate(axv,axs))
-        if callbacks:
-            functionList += callbacks
         logger.info(f"sending absolute move to {axis_values}")
-        res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
-        
-
-        # if res:
-        #     # Deduce current value
-        #     for key,absVal in axis_values.items():
-        #         if axis_speeds[key] > 0:
-        #             self.values[key] = absVal #/ self.settings.stepscales[key]
-
-        # print("curr pos: ",self.values)
-        return self.settings.communication.commandsToString(cmds)
+        return self.queueAction(self.settings.communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
 
     def stop(self):
         """
         launch a command to stop the controller in it's task.
 
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: 0, the stop command is not printable.
+        :rtype: int
         """
         cmds = self.settings.communication.stopCmd()
         # print("sending ",cmd)
         logger.info("sending stop")
-        Thread(target=self.connection.executeSelfCmd, args=(cmds,)).start()
-
+        self.invalidatePosition()
+        self.stop_event.set()
+        # interrupt does not wait behind the acknowledge or position query in progress
+        self.connection.interrupt(cmds)
         return 0
-        return self.settings.communication.commandsToString(cmds)
+
+    def abandon(self, future: "MoveFuture"):
+        """
+        Stop an action which takes too long. Its future fails with MoveInterrupted and position values are not set to its destination :
+        they are read from the controller at the end of the action (see syncValues).
+
+        :param future: future of the action
+        :type future: python_files.models.MoveFuture
+        """
+        future.abandoned = True
+        if not future.cancel():
+            self.stop()
+
+    def checkAbandoned(self):
+        """
+        Called before updating position values at the end of an action.
+
+        :raises MoveInterrupted: if the running action has been abandoned, position values are then read from the controller.
+        """
+        future = self.currentFuture
+        if future is not None and future.abandoned:
+            if self.syncValues() is None:
+                logger.warning("controller position not read, position values may be wrong after the abandoned action")
+            raise MoveInterrupted(f"!! ERROR !! action abandoned: {future.command}")
 
     def goZero(self, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
         """
@@ -670,123 +846,743 @@ class ModelControl:
         :type miss_val_cbs: list[function]
         :param finally_cbs: actions to do after the movement in a finally statement
         :type finally_cbs: list[function]
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values at the end of the movement, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
-        # Getting axis delta to go to zero
-        axis_values = {}
-        axis_speeds = {}
-        for axis,curPos in self.values.items():
-            smax = self.settings.speed_limits[axis]["max"]
-            smin = self.settings.speed_limits[axis]["min"]
-            speed = 5
-            if smax and smin and smax-smin>0:
-                speed = (smin+smax)/2
-            elif smax and smax>0:
-                speed = smax/2
-            elif smin and smin>0:
-                speed = smin*2
-            axis_values.update({
-                axis: -curPos
-            })
-            axis_speeds.update({
-                axis: speed
-            })
-        axis_values = self.convertMmToSteps(axis_values)
-        axis_speeds = self.convertMmToSteps(axis_speeds)
-
         # Create and execute command
-        cmds = self.settings.communication.moveCmd(axis_values=axis_values,axis_speeds=axis_speeds)
+        cmds,axis_values,axis_speeds = self.prepareGoZero()
         # print("go zero ",cmds)
         # res = self.connection.executeSelfCmd(cmds)
         # res = self.teCommands.addTask(self.connection.executeSelfCmd, cmds)
 
-        tth = Thread(target=time.sleep,args=(self.calcMoveTime(axis_values,axis_speeds),))
-
         functionList = []
-        functionList.append(tth.start)
-        functionList.append(lambda c=cmds: self.connection.executeSelfCmd(c))
-        # functionList.append(lambda t=self.calcMoveTime(axis_values,axis_speeds): time.sleep(t))
-        functionList.append(tth.join)
+        functionList.append(lambda c=cmds,axv=axis_values,axs=axis_speeds: self.executeMove(c,axv,axs))
         functionList.append(self.zeroUpdate)
-        if callbacks:
-            functionList += callbacks
         logger.info("sending go to zero")
-        res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
-
-        # if res:
-        #     # Update current position values
-        #     for axis in self.values.keys(): self.values[axis] = 0
-
-        return self.settings.communication.commandsToString(cmds)
+        return self.queueAction(self.settings.communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
     
     def setZero(self):
         """
         Set current position values as zero on each axis without moving or sending a command to controller.
         """
+        if self.origin is not None:
+            self.origin = { axis:origin+self.values[axis]*self.settings.stepscales[axis] for axis,origin in self.origin.items() }
         for axis in self.values.keys(): self.values[axis] = 0
         # print("set as zero")
         logger.info("current position set as zero")
 
     def goHome(self, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
         """
-        Set current position as home on the controller.
+        Go to current home position on the controller.
         
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values once commands are sent, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
-        # functionList = []
-        # functionList.append(lambda c=self.settings.communication.goHome: self.connection.executeSelfCmd(c))
-        # if callbacks:
-        #     functionList += callbacks
-        # res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
-
         cmds = self.settings.communication.goHome(len(self.settings.axis))
+        functionList = []
+        functionList.append(lambda c=cmds: self.sendCommands(c))
         # print("sending ",cmd)
         logger.info("sending go home")
-        self.connection.executeSelfCmd(cmds)
-        return self.settings.communication.commandsToString(cmds)
+        return self.queueAction(self.settings.communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
 
 
     def setHome(self, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
         """
-        Go to current home position on the controller.
+        Set current position as home on the controller.
         
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values once commands are sent, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
-        # functionList = []
-        # functionList.append(lambda c=self.settings.communication.setHome: self.connection.executeSelfCmd(c))
-        # if callbacks:
-        #     functionList += callbacks
-        # res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
-
         cmds = self.settings.communication.setHome(len(self.settings.axis))
+        functionList = []
+        functionList.append(lambda c=cmds: self.sendCommands(c))
+        # controller positions are now counted from here
+        functionList.append(lambda: setattr(self, "origin", None))
         # print("sending ",cmd)
         logger.info("sending set home")
-        self.connection.executeSelfCmd(cmds)
-        return self.settings.communication.commandsToString(cmds)
+        return self.queueAction(self.settings.communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
 
 
     def rawAction(self, commands: list[str], callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
         """
         Send list of commands converted in ascii into the serial connection.
         
-        :return: command(s) sent to controller
-        :rtype: str
+        :return: future resolved with the position values once commands are sent, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
         """
         cmds = []
         for cmd in commands:
             cmds.append(cmd.encode("ascii"))
 
         functionList = []
-        functionList.append(lambda c=cmds: self.connection.executeSelfCmd(c))
+        functionList.append(lambda c=cmds: self.sendCommands(c))
+        # raw commands can change the controller state
+        functionList.append(lambda: self.settings.communication.resetState())
+        functionList.append(lambda: setattr(self, "origin", None))
+        logger.info("sending raw commands")
+        return self.queueAction("\n".join(commands), functionList, callbacks, miss_val_cbs, finally_cbs)
+
+    def compileRoadmap(self, positions, axis_speeds: dict)-> "CompiledRoadmap":
+        """
+        Convert every position of a roadmap to relative movements in steps at once with numpy, then encode their commands
+        with the compileMoves of the communication (one bytes template per move for CSeries).
+        Absolute positions are rounded to steps before taking the differences, so rounding errors don't add up.
+        The moves start from the current position values : run them with compiledMove right after, in order.
+
+        :param positions: position values of each move, shape is (number of moves, number of axis) with columns in settings axis order. Unit is mm
+        :type positions: numpy.ndarray
+        :param axis_speeds: speed values for each axis formatted like { 'X': 5 }, a value or an array with one speed per move. Unit is mm/s
+        :type axis_speeds: dict[str:int|float|numpy.ndarray]
+        :return: moves of the roadmap
+        :rtype: python_files.models.CompiledRoadmap
+        """
+        axis = tuple(self.settings.axis)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, len(axis))
+        stepscales = np.array([ self.settings.stepscales[oneAxis] for oneAxis in axis ], dtype=np.float64)
+        # speed limits like checkSpeed, a limit not set or 0 doesn't apply
+        speedMax = np.array([ self.settings.speed_limits[oneAxis]["max"] or np.inf for oneAxis in axis ], dtype=np.float64)
+        speedMin = np.array([ self.settings.speed_limits[oneAxis]["min"] or -np.inf for oneAxis in axis ], dtype=np.float64)
+        speeds = np.column_stack([ np.broadcast_to(np.asarray(axis_speeds[oneAxis], dtype=np.float64), len(positions)) for oneAxis in axis ])
+        speeds = np.clip(speeds, speedMin, speedMax)
+
+        start = np.array([ self.values[oneAxis] for oneAxis in axis ], dtype=np.float64)
+        absSteps = np.rint(np.vstack([start, positions])*stepscales).astype(np.int64)
+        steps = np.diff(absSteps, axis=0)
+        speedSteps = np.rint(speeds*stepscales).astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            times = np.max(np.where(speedSteps != 0, np.abs(steps)/speedSteps, 0), axis=1, initial=0)
+
+        commands = self.settings.communication.compileMoves(steps, speedSteps)
+        logger.info(f"{len(positions)} moves compiled")
+        return CompiledRoadmap(axis, start, positions, steps, speedSteps, times, commands)
+
+    def compiledMove(self, compiled: "CompiledRoadmap", index: int, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        launch the move index of a compiled roadmap.
+
+        :param compiled: roadmap compiled by compileRoadmap
+        :type compiled: python_files.models.CompiledRoadmap
+        :param index: index of the move, moves must be launched in order
+        :type index: int
+        :param callbacks: actions to do at the end of the movement
+        :type callbacks: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised during the movement and the callbacks
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do after the movement in a finally statement
+        :type finally_cbs: list[function]
+        :return: future resolved with the position values at the end of the movement, command(s) sent to controller in its command attribute
+        :rtype: python_files.models.MoveFuture
+        """
+        axis = compiled.axis
+        axis_values = dict(zip(axis, compiled.steps[index].tolist()))
+        axis_speeds = dict(zip(axis, compiled.speeds[index].tolist()))
+        target = dict(zip(axis, compiled.positions[index].tolist()))
+        communication = self.settings.communication
+        if compiled.commands is None:
+            cmds = communication.moveCmd(axis_values=axis_values, axis_speeds=axis_speeds)
+        else:
+            cmds = communication.axisCmds(len(axis))+[compiled.commands[index]]
+
+        functionList = []
+        functionList.append(lambda c=cmds,axv=axis_values,axs=axis_speeds: self.executeMove(c,axv,axs))
+        functionList.append(lambda axv=target,axs=axis_speeds: self.absUpdate(axv,axs))
+        logger.debug(f"sending compiled move {index} to {target}")
+        return self.queueAction(communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
+
+    def uploadProgram(self, compiled: "CompiledRoadmap", start: int = 0, stop: int = None, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        launch the storage of moves start to stop of a compiled roadmap as a program of the controller, a wait point after each move.
+        Run it with programMove, move by move.
+
+        :param compiled: roadmap compiled by compileRoadmap
+        :type compiled: python_files.models.CompiledRoadmap
+        :param start: *(Optional)* index of the first move of the program
+        :type start: int
+        :param stop: *(Optional)* index after the last move of the program, end of the roadmap if not given
+        :type stop: int
+        :raises ValueError: if the controller language can't store programs.
+        :return: future resolved once the program is stored, command(s) sent to controller in its command attribute.
+            Its exception is a ControllerError if a line is not acknowledged or answered with an error, the program can't be run then.
+        :rtype: python_files.models.MoveFuture
+        """
+        communication = self.settings.communication
+        cmds = communication.programCmds(compiled.steps[start:stop], compiled.speeds[start:stop])
+        if cmds is None:
+            raise ValueError(f"!! ERROR !! {type(communication).__name__} controllers can't store programs")
+        stop = len(compiled) if stop is None else stop
+
+        functionList = []
+        functionList.append(lambda: setattr(self, "program", None))
+        functionList.append(lambda c=cmds: self.sendCommands(c, strict=True))
+        functionList.append(lambda: setattr(self, "program", (compiled, start, stop)))
+        logger.info(f"uploading a program of moves {start} to {stop}")
+        return self.queueAction(communication.commandsToString(cmds), functionList, callbacks, miss_val_cbs, finally_cbs)
+
+    def programMove(self, compiled: "CompiledRoadmap", index: int, segment_size: int = 100, timeout: float = None)-> "MoveFuture":
+        """
+        Do the move index of a compiled roadmap with a stored program : the program of the next segment_size moves
+        is uploaded when index is a multiple of segment_size, then the program is started (or continued) and its next wait point waited.
+        The command is a few bytes and the end of the move is known from the controller, without polling nor timed wait.
+        Moves must be done in order, in the calling thread.
+
+        :param compiled: roadmap compiled by compileRoadmap
+        :type compiled: python_files.models.CompiledRoadmap
+        :param index: index of the move
+        :type index: int
+        :param segment_size: *(Optional)* number of moves of each program uploaded
+        :type segment_size: int
+        :param timeout: *(Optional)* maximum time to wait for the wait point (s), expected move time plus 1s if not given.
+        :type timeout: float
+        :return: future, already done, resolved with the position values at the end of the movement or with the exception raised.
+            The program is not run if its upload failed.
+        :rtype: python_files.models.MoveFuture
+        """
+        communication = self.settings.communication
+        cmds = communication.programRunCmd()
+        future = MoveFuture(communication.commandsToString(cmds))
+        future.set_running_or_notify_cancel()
+        self.stop_event.clear()
+        try:
+            if index % segment_size == 0:
+                self.uploadProgram(compiled, index, min(index+segment_size, len(compiled))).result()
+            program = self.program
+            if program is None or program[0] is not compiled or not program[1] <= index < program[2]:
+                raise ControllerError(f"!! ERROR !! move {index} is not in the program stored in the controller")
+            if self.origin is None:
+                # known before the first move, to read position values from the controller after a stop or a timeout
+                self.updateOrigin(self.readPositionSteps())
+            self.invalidatePosition()
+            future.markStarted()
+            acks = self.exchangeCommands(cmds)
+            self.checkAcks(acks)
+            if timeout is None:
+                timeout = float(compiled.times[index])+1
+            sync = self.waitProgramSync(timeout)
+            if self.stop_event.is_set():
+                # the program is paused by the stop, values are read from the controller
+                if self.syncValues() is None:
+                    logger.warning("controller position not read, position values may be wrong after the stop")
+                # a wait point reached just before the stop is not the one of the next move
+                self.connection.discardUnsolicited()
+                raise MoveInterrupted(f"!! ERROR !! move {index} of the program stopped")
+            if sync != communication.PROGRAM_SYNC:
+                self.abortProgram()
+                raise TimeoutError(f"!! ERROR !! wait point of move {index} not recieved after {timeout}s (recieved {sync}), program stopped")
+            self.values.update(zip(compiled.axis, compiled.positions[index].tolist()))
+            future.markEnded()
+            future.set_result(dict(self.values))
+        except Exception as e:
+            logger.error(f"ERROR: {e}")
+            future.set_exception(e)
+        return future
+
+    def abortProgram(self):
+        """
+        Stop the stored program after a wait point not recieved in time : the controller is stopped, a wait point recieved late
+        is discarded so it is not taken as the one of the next move, position values are read from the controller
+        and the program is forgotten, the next programMove uploads its segment again.
+        """
+        self.program = None
+        self.invalidatePosition()
+        try:
+            self.checkAcks(self.exchangeCommands(self.settings.communication.stopCmd()))
+        except ControllerError as e:
+            logger.warning(f"stop of the program failed: {e}")
+        self.connection.discardUnsolicited()
+        if self.syncValues() is None:
+            logger.warning("controller position not read, position values may be wrong after the program stop")
+
+    def waitProgramSync(self, timeout: float)-> bytes:
+        """
+        Wait for the synchronisation bytes of the next wait point of the program, until timeout or a stop.
+
+        :param timeout: maximum waiting time (s)
+        :type timeout: float
+        :return: bytes recieved, shorter than the synchronisation if timed out or stopped.
+        :rtype: bytes
+        """
+        size = len(self.settings.communication.PROGRAM_SYNC)
+        deadline = time.monotonic()+timeout
+        sync = b""
+        while len(sync) < size and not self.stop_event.is_set():
+            remaining = deadline-time.monotonic()
+            if remaining <= 0:
+                break
+            # by slices, a stop is seen without waiting for the timeout
+            sync += self.connection.query([], size-len(sync), timeout=min(remaining, self.poll_interval))
+        return sync
+
+    def pauseProgram(self):
+        """
+        launch a command pausing the stored program after its current line, programMove continues it.
+
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        cmds = self.settings.communication.programPauseCmd()
+        if cmds is None:
+            raise ValueError(f"!! ERROR !! {type(self.settings.communication).__name__} controllers can't store programs")
+        logger.info("sending program pause")
+        # interrupt does not wait behind the wait of the current wait point
+        self.connection.interrupt(cmds)
+        return self.settings.communication.commandsToString(cmds)
+
+    def flyMove(self, axis_values: dict, axis_speeds: dict, sample_period: float, sampleFunc, *args, **kwargs)-> list:
+        """
+        Move to axis_values in a single movement while calling sampleFunc every sample_period seconds, from the start of the movement to its end.
+        sampleFunc will be called as sampleFunc(position,*args,**kwargs), position values are interpolated from the commanded speeds and the start time of the movement.
+        Axis speeds are scaled so every axis arrives at the same time, the path is a straight line.
+        A sample which can't be on time (previous sampleFunc too long) is skipped.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: maximum speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :param sample_period: time between two calls of sampleFunc (s)
+        :type sample_period: float
+        :param sampleFunc: function called on each sample
+        :type sampleFunc: function
+        :raises concurrent.futures.CancelledError: if the waiting list is full.
+        :return: samples as (position values, time.monotonic() at the call, time.monotonic() at the end, sampleFunc result)
+        :rtype: list[tuple]
+        """
+        start = dict(self.values)
+        distances = { axis:val-start[axis] for axis,val in axis_values.items() }
+        duration = max([ abs(dist)/axis_speeds[axis] for axis,dist in distances.items() if dist != 0 and axis_speeds[axis] > 0 ], default=0)
+        if duration == 0:
+            speeds = dict(axis_speeds)
+        else:
+            speeds = { axis:(abs(dist)/duration if dist != 0 else axis_speeds[axis]) for axis,dist in distances.items() }
+        speeds = self.checkSpeed(speeds)
+        # time to arrive of each axis, with speeds changed by limits
+        arrivals = { axis:(abs(dist)/speeds[axis] if dist != 0 else 0) for axis,dist in distances.items() }
+
+        move = self.absMove(axis_values, dict(speeds))
+        # position is interpolated from the time the movement command was sent
+        while not move.started.wait(self.poll_interval):
+            if move.done():
+                break
+        if move.start_time is None:
+            move.result()
+            raise RuntimeError(f"movement {move.command} ended without being started")
+        t0 = move.start_time
+        end = t0+max(arrivals.values(), default=0)
+
+        samples = []
+        missed = 0
+        idxSample = 0
+        while t0+idxSample*sample_period <= end:
+            target = t0+idxSample*sample_period
+            now = time.monotonic()
+            if now < target:
+                time.sleep(target-now)
+            elif now-target >= sample_period:
+                # late, go to the next sample time
+                nextSample = math.ceil((now-t0)/sample_period)
+                missed += nextSample-idxSample
+                idxSample = nextSample
+                continue
+            t = time.monotonic()
+            position = {}
+            for axis,dist in distances.items():
+                done = min(1, (t-t0)/arrivals[axis]) if arrivals[axis] > 0 else 1
+                position[axis] = start[axis]+dist*done
+            result = sampleFunc(position,*args,**kwargs)
+            samples.append((position, t, time.monotonic(), result))
+            idxSample += 1
+
+        move.result()
+        if missed:
+            logger.warning(f"{missed} samples missed during the movement, sampleFunc takes more than {sample_period}s")
+        logger.debug(f"{len(samples)} samples during the movement to {axis_values}")
+        return samples
+
+    def queueAction(self, command: str, functionList: list, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None)-> "MoveFuture":
+        """
+        Add an action to the thread waiting list and return its future.
+        The future is resolved with a copy of the position values once functionList is executed, before callbacks.
+        If the waiting list is full, the action is dropped and its future cancelled.
+
+        :param command: command(s) sent to controller by the action
+        :type command: str
+        :param functionList: functions of the action, sending commands and updating position values
+        :type functionList: list[function]
+        :param callbacks: actions to do at the end of the action
+        :type callbacks: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised during the action and the callbacks
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do after the action in a finally statement
+        :type finally_cbs: list[function]
+        :return: future of the action
+        :rtype: python_files.models.MoveFuture
+        """
+        future = MoveFuture(command)
+        functionList = functionList + [lambda f=future: (f.markEnded(), f.set_result(dict(self.values)))]
         if callbacks:
             functionList += callbacks
-        logger.info("sending raw commands")
-        res = self.teCommands.addTask(lambda fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: functionPackage(fl,mv,fcb))
+        miss_val_cbs = [lambda e,f=future: f.done() or f.set_exception(e)] + (miss_val_cbs if miss_val_cbs else [])
+        res = self.teCommands.addTask(lambda f=future,fl=functionList,mv=miss_val_cbs,fcb=finally_cbs: self.runAction(f,fl,mv,fcb))
+        if res == -1:
+            # dropped, its commands will not be sent
+            future.cancel()
+        return future
+
+    def runAction(self, future: "MoveFuture", functionList: list, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        Execute an action from the thread waiting list, unless its future has been cancelled.
+        finally_cbs are executed in both cases.
+
+        :param future: future of the action
+        :type future: python_files.models.MoveFuture
+        :param functionList: functions of the action and callbacks
+        :type functionList: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do after the action in a finally statement
+        :type finally_cbs: list[function]
+        """
+        if not future.set_running_or_notify_cancel():
+            logger.info(f"action cancelled before being sent: {future.command}")
+            functionPackage(finally_cbs=finally_cbs)
+            return
+        self.currentFuture = future
+        try:
+            functionPackage(functionList, miss_val_cbs, finally_cbs)
+        except Exception as e:
+            if future.done():
+                raise
+            logger.error(f"ERROR: {e}")
+            future.set_exception(e)
+        finally:
+            self.currentFuture = None
+
+    def sendCommands(self, commands: list, strict: bool = False):
+        """
+        Send commands of the running action and set the start time of its future when its last command is sent.
+        The cached position is cleared.
+
+        :param commands: commands to send
+        :type commands: list[bytes]
+        :param strict: *(Optional)* also raise if a command is not acknowledged, see checkAcks.
+        :type strict: bool
+        :raises ControllerError: if the controller answered an error.
+        """
+        self.invalidatePosition()
+        if isinstance(commands,(str,bytes)):
+            commands = [commands]
+        # the last command starts the movement, its acknowledge may only come at the end of it (ack_after_move)
+        if len(commands) > 1:
+            self.checkAcks(self.exchangeCommands(commands[:-1]), strict)
+        if self.currentFuture:
+            self.currentFuture.markStarted()
+        self.checkAcks(self.exchangeCommands(commands[-1:]), strict)
+
+    def exchangeCommands(self, commands: list)-> list:
+        """
+        Send commands and give their acknowledges to the commands language, which keeps the controller state from them (see Commands.commandsSent).
+
+        :param commands: commands to send
+        :type commands: list[bytes]
+        :return: each command and its acknowledge, see SerialConnection.exchange
+        :rtype: list[tuple[bytes,bytes]]
+        """
+        communication = self.settings.communication
+        try:
+            acks = self.connection.exchange(commands)
+        except Exception:
+            # recieved or not by the controller
+            communication.resetState()
+            raise
+        communication.commandsSent(acks)
+        return acks
+
+    def checkAcks(self, acks: list, strict: bool = False):
+        """
+        Read the status of the acknowledges of commands sent.
+
+        :param acks: each command and its acknowledge, returned by SerialConnection.exchange
+        :type acks: list[tuple[bytes,bytes]]
+        :param strict: *(Optional)* also raise if a command is not acknowledged.
+        :type strict: bool
+        :raises ControllerError: if the controller answered an error, or if strict and an acknowledge is missing.
+        """
+        communication = self.settings.communication
+        errors = []
+        missing = []
+        for cmd,ack in acks:
+            if ack is None and self.connection.wait_ack:
+                missing.append(cmd)
+                continue
+            status = communication.parseStatus(ack)
+            if status is not None and not status["ok"]:
+                errors.append((cmd,status))
+        if errors:
+            for cmd,status in errors:
+                logger.warning(f"controller answered error {status['code']} ({status['message']}) to {cmd}")
+            cmd,status = errors[0]
+            raise ControllerError(f"!! ERROR !! controller answered error {status['code']} ({status['message']}) to {cmd}")
+        if strict and missing:
+            raise ControllerError(f"!! ERROR !! {len(missing)} commands not acknowledged, first is {missing[0]}")
+
+    def executeMove(self, commands: list, axis_values: dict, axis_speeds: dict):
+        """
+        Send movement commands and wait for the end of the movement.
+
+        With "status" completion, the controller position is read before the move and polled afterwards
+        until each axis reached its destination or stopped. If the controller can't answer a position query,
+        the time calculated by calcMoveTime is waited instead.
+        Axis stopped before their destination (like after a stop) raise MoveInterrupted, the update of position values
+        of the action is then not done.
+
+        :param commands: movement commands to send
+        :type commands: list[bytes]
+        :param axis_values: relative movement for each axis formatted like { 'X': 5000 }. Unit is step
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 500 }. Unit is step/s
+        :type axis_speeds: dict[str:int|float]
+        """
+        move_time = self.calcMoveTime(axis_values,axis_speeds)
+        start_steps = None
+        if self.completion == "status":
+            start_steps = self.readPositionSteps()
+            self.updateOrigin(start_steps)
+        start_time = time.monotonic()
+        self.sendCommands(commands)
+
+        if start_steps is not None:
+            target_steps = self.moveTarget(start_steps, axis_values)
+            if self.waitPosition(start_steps, target_steps, start_time+move_time):
+                return
+        # Timed fallback, until the end or the action is abandoned
+        future = self.currentFuture
+        remaining_time = move_time-(time.monotonic()-start_time)
+        while remaining_time > 0 and not (future is not None and future.abandoned):
+            time.sleep(min(remaining_time, self.poll_interval))
+            remaining_time = move_time-(time.monotonic()-start_time)
+
+    def waitPosition(self, start_steps: dict, target_steps: dict, deadline: float)-> bool:
+        """
+        Poll the controller position until axis are on target_steps, stopped moving, or deadline is passed.
+
+        :param start_steps: position of each axis before the move. Unit is step
+        :type start_steps: dict[str:int]
+        :param target_steps: position of each axis expected at the end of the move. Unit is step
+        :type target_steps: dict[str:int]
+        :param deadline: time.monotonic() value after which axis not moving have failed the move, see moveFinished.
+        :type deadline: float
+        :raises MoveInterrupted: if axis stopped before reaching target_steps.
+        :return: True if the end of the movement has been detected, False if the position couldn't be read.
+        :rtype: bool
+        """
+        last_steps = None
+        while True:
+            steps = self.readPositionSteps()
+            if steps is None:
+                return False
+            if self.moveFinished(steps, last_steps, start_steps, target_steps, time.monotonic() > deadline):
+                return True
+            last_steps = steps
+            time.sleep(self.poll_interval)
+
+    def moveFinished(self, steps: dict, last_steps: dict, start_steps: dict, target_steps: dict, late: bool)-> bool:
+        """
+        Check a position polled during a movement.
+        Axis stopped before reaching target_steps fail the movement, and position values are set to the position reached :
+        axis which moved then stopped, and after the expected movement time axis which did not move at all.
+        Axis still moving after the expected movement time are waited.
+
+        :param steps: position read. Unit is step
+        :type steps: dict[str:int]
+        :param last_steps: previous position read, None if first. Unit is step
+        :type last_steps: dict[str:int]
+        :param start_steps: position before the move. Unit is step
+        :type start_steps: dict[str:int]
+        :param target_steps: position expected at the end of the move. Unit is step
+        :type target_steps: dict[str:int]
+        :param late: if the expected movement time is passed
+        :type late: bool
+        :raises MoveInterrupted: if axis stopped before reaching target_steps.
+        :return: True if the movement is finished
+        :rtype: bool
+        """
+        if all( abs(steps[axis]-target) <= 1 for axis,target in target_steps.items() ):
+            logger.debug(f"move finished at {steps}")
+            return True
+        if steps == last_steps and (late or steps != start_steps):
+            # values follow the position reached, relative to the local zero
+            self.valuesFromPosition({ axis:val/self.settings.stepscales[axis] for axis,val in steps.items() })
+            if steps == start_steps:
+                raise MoveInterrupted(f"!! ERROR !! axis did not move from {steps} to {target_steps} in the expected movement time")
+            raise MoveInterrupted(f"!! ERROR !! axis stopped at {steps} before reaching {target_steps}")
+        if late:
+            logger.debug(f"axis still moving to {target_steps} after the expected movement time, position read {steps}")
+        return False
+
+    def readPositionSteps(self)-> dict:
+        """
+        Ask the controller the position of each axis.
+        If the controller doesn't answer, the move in progress is timed, see positionFromAnswer.
+
+        :return: position of each axis formatted like { 'X': 5000 }, None if it can't be read. Unit is step
+        :rtype: dict[str:int]
+        """
+        query = self.positionQuery()
+        if query is None:
+            return None
+        generation = self.position_generation
+        answer = self.connection.query(*query, timeout=self.query_timeout)
+        return self.positionFromAnswer(generation, answer)
 
-        return "\n".join(commands)
+    def positionQuery(self)-> tuple:
+        """
+        :return: commands asking the position of each axis and size of the answer, None if the controller can't be asked.
+        :rtype: tuple[list,int]
+        """
+        communication = self.settings.communication
+        cmds = communication.positionCmd(len(self.settings.axis))
+        if not cmds:
+            return None
+        return cmds,communication.positionResponseSize()
+
+    def positionFromAnswer(self, generation: int, answer: bytes)-> dict:
+        """
+        Decode the answer of a position query and cache the position.
+        If the controller didn't answer max_position_failures times in a row, completion is set to "timed" for the next moves.
+
+        :param generation: position_generation when the query started, see cachePosition
+        :type generation: int
+        :param answer: bytes recieved after the commands of positionQuery
+        :type answer: bytes
+        :return: position of each axis formatted like { 'X': 5000 }, None if it can't be read. Unit is step
+        :rtype: dict[str:int]
+        """
+        positions = self.settings.communication.parsePosition(answer, len(self.settings.axis))
+        if positions is None:
+            self.position_failures += 1
+            if self.position_failures >= self.max_position_failures:
+                logger.warning(f"controller did not answer {self.position_failures} position queries (last recieved {answer}), using timed completion")
+                self.completion = "timed"
+            else:
+                logger.warning(f"controller did not answer the position query (recieved {answer}), timed completion for this move")
+            return None
+        self.position_failures = 0
+        steps = { axis:pos for axis,pos in zip(self.settings.axis,positions) }
+        self.cachePosition(generation, steps)
+        return steps
+
+    def cachedPosition(self, max_age: float)-> dict:
+        """
+        :param max_age: maximum age of the cached position (s)
+        :type max_age: float
+        :return: position of each axis cached, None if there is none or it is older than max_age. Unit is step
+        :rtype: dict[str:int]
+        """
+        cache = self.position_cache
+        if cache is None or time.monotonic()-cache[0] > max_age:
+            return None
+        return cache[1]
+
+    def moveTarget(self, start_steps: dict, axis_values: dict)-> dict:
+        """
+        :param start_steps: position of each axis before the move. Unit is step
+        :type start_steps: dict[str:int]
+        :param axis_values: relative movement for each axis. Unit is step
+        :type axis_values: dict[str:int|float]
+        :return: position of each axis expected at the end of the move. Unit is step
+        :rtype: dict[str:int]
+        """
+        return { axis:start_steps[axis]+int(round(dist)) for axis,dist in axis_values.items() }
+
+    def invalidatePosition(self):
+        """
+        Clear the cached position before sending commands, a position read started before is not cached.
+        """
+        with self.cache_lock:
+            self.position_generation += 1
+            self.position_cache = None
+
+    def cachePosition(self, generation: int, steps: dict):
+        """
+        Cache a position read, unless the cache has been cleared since the read started.
+
+        :param generation: position_generation when the read started
+        :type generation: int
+        :param steps: position of each axis. Unit is step
+        :type steps: dict[str:int]
+        """
+        with self.cache_lock:
+            if generation == self.position_generation:
+                self.position_cache = (time.monotonic(), steps)
+
+    def updateOrigin(self, steps: dict):
+        """
+        Set the origin of position values from a controller position read while position values are known, like before a move.
+
+        :param steps: position of each axis, nothing done if None. Unit is step
+        :type steps: dict[str:int]
+        """
+        if steps is not None:
+            self.origin = { axis:steps[axis]-self.values[axis]*self.settings.stepscales[axis] for axis in self.values.keys() }
+
+    def setPositionTTL(self, ttl: float):
+        """
+        :param ttl: maximum age of the cached controller position returned by getPosition (s), 0 to query the controller each time.
+        :type ttl: float
+        """
+        self.position_ttl = ttl
+
+    def getPosition(self, max_age: float = None)-> dict:
+        """
+        Position of each axis read from the controller, with the controller home as 0.
+        The last position read is returned while it is younger than max_age, the controller is queried only when it is older
+        or after commands are sent. Every position read (like the polling of "status" completion) refreshes it.
+        Concurrent calls share a single query.
+
+        :param max_age: *(Optional)* maximum age of the cached position (s), position_ttl if not given.
+        :type max_age: float
+        :return: position values of each axis formatted like { 'X': 50 }, None if the controller can't answer. Unit is mm
+        :rtype: dict[str:float]
+        """
+        if max_age is None:
+            max_age = self.position_ttl
+        with self.position_lock:
+            steps = self.cachedPosition(max_age)
+            if steps is None:
+                steps = self.readPositionSteps()
+                if steps is None:
+                    return None
+        return { axis:val/self.settings.stepscales[axis] for axis,val in steps.items() }
+
+    def syncValues(self)-> dict:
+        """
+        Set position values from the position read from the controller, instead of the values deduced from the commands sent.
+        Position values keep their origin (see setZero) : the origin is known from the position read before each move,
+        if it is not known yet the current position values are kept and give it.
+
+        :return: position values, None if the controller can't answer. Unit is mm
+        :rtype: dict[str:float]
+        """
+        position = self.getPosition(max_age=0)
+        if position is None:
+            return None
+        return self.valuesFromPosition(position)
+
+    def valuesFromPosition(self, position: dict)-> dict:
+        """
+        Set position values from a controller position and the origin of position values.
+
+        :param position: controller position of each axis, see getPosition. Unit is mm
+        :type position: dict[str:float]
+        :return: position values. Unit is mm
+        :rtype: dict[str:float]
+        """
+        stepscales = self.settings.stepscales
+        if self.origin is None:
+            logger.info("origin of position values unknown, taken from the current position values")
+            self.updateOrigin({ axis:val*stepscales[axis] for axis,val in position.items() })
+            return dict(self.values)
+        self.values.update({ axis:val-self.origin[axis]/stepscales[axis] for axis,val in position.items() })
+        return dict(self.values)
 
     def incrUpdate(self, axis_values: dict, axis_speeds: dict):
         """
@@ -797,6 +1593,7 @@ class ModelControl:
         :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
         :type axis_speeds: dict[str:int|float]
         """
+        self.checkAbandoned()
         # Deduce current value
         for key,incrVal in axis_values.items():
             if axis_speeds[key] > 0:
@@ -811,6 +1608,7 @@ class ModelControl:
         :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
         :type axis_speeds: dict[str:int|float]
         """
+        self.checkAbandoned()
         # Deduce current value
         for key,absVal in axis_values.items():
             if axis_speeds[key] > 0:
@@ -820,6 +1618,7 @@ class ModelControl:
         """
         Update current position values to position 0.
         """
+        self.checkAbandoned()
         for axis in self.values.keys(): self.values[axis] = 0
 
     def quit(self):
@@ -832,6 +1631,503 @@ class ModelControl:
             self.connection.close()
             self.teCommands.kill()
 
+class AsyncModelControl(ModelControl):
+    """
+    ModelControl driven by an asyncio event loop.
+
+    Movements, stop and home actions are coroutines sending their commands through a
+    python_files.connection.AsyncSerialConnection, so one event loop can drive several stages
+    without a thread per action. Movements are executed one after another.
+    """
+    def __init__(self, axis_names, settings: ModelSettings = None, completion: str = "status", poll_interval: float = 0.05):
+        """
+        :param axis_names: axis names like ('X','Y'). Up to 3 axis supported.
+        :type axis_names: tuple | list
+        :param settings: settings class to get values from
+        :type settings: python_files.models.ModelSettings 
+        :param completion: *(Optional)* how the end of a movement is detected. "status" polls the controller position, "timed" waits the time calculated by calcMoveTime.
+        :type completion: str
+        :param poll_interval: *(Optional)* time between two position queries when completion is "status" (s).
+        :type poll_interval: float
+        """
+        super().__init__(axis_names, settings=settings, completion=completion, poll_interval=poll_interval)
+        self.transport = co.AsyncSerialConnection(self.connection)
+        self.moveLock: asyncio.Lock = asyncio.Lock()
+        self.positionLock: asyncio.Lock = asyncio.Lock()
+
+    def createExecutor(self):
+        """
+        No thread waiting list, actions are awaited in the event loop.
+        """
+        return None
+
+    def unavailable(self, name: str):
+        """
+        :raises NotImplementedError: always, the action needs the thread waiting list or the blocking connection of ModelControl.
+        """
+        raise NotImplementedError(f"!! ERROR !! {name} is not available with AsyncModelControl, use ModelControl")
+
+    def compiledMove(self, *args, **kwargs):
+        """
+        Not available, moves of a compiled roadmap are queued in the thread waiting list.
+        """
+        self.unavailable("compiledMove")
+
+    def uploadProgram(self, *args, **kwargs):
+        """
+        Not available, programs are sent from the thread waiting list.
+        """
+        self.unavailable("uploadProgram")
+
+    def programMove(self, *args, **kwargs):
+        """
+        Not available, program moves wait the wait points on the blocking connection.
+        """
+        self.unavailable("programMove")
+
+    def pauseProgram(self, *args, **kwargs):
+        """
+        Not available, the pause is sent on the blocking connection.
+        """
+        self.unavailable("pauseProgram")
+
+    def flyMove(self, *args, **kwargs):
+        """
+        Not available, samples are taken while the movement runs in the thread waiting list.
+        """
+        self.unavailable("flyMove")
+
+    def queueAction(self, *args, **kwargs):
+        """
+        Not available, there is no thread waiting list.
+        """
+        self.unavailable("queueAction")
+
+    def abandon(self, *args, **kwargs):
+        """
+        Not available, there is no thread waiting list.
+        """
+        self.unavailable("abandon")
+
+    async def incrMove(self, axis_values: dict, axis_speeds: dict = None):
+        """
+        Move of axis_values without taking on board current position, and wait for the end of the movement.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        async with self.moveLock:
+            # commands built in the order they are sent
+            cmds,axis_values,axis_speeds = self.prepareIncrMove(axis_values, axis_speeds)
+            logger.info(f"sending incremental move to {axis_values}")
+            await self.executeMove(cmds, axis_values, axis_speeds)
+            self.incrUpdate(axis_values, axis_speeds)
+        return self.settings.communication.commandsToString(cmds)
+
+    async def absMove(self, axis_values: dict, axis_speeds: dict = None):
+        """
+        Move to axis_values from current position values, and wait for the end of the movement.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 5 }. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        async with self.moveLock:
+            # relative values from the position reached by the previous move
+            cmds,rel_axis_values,axis_speeds = self.prepareAbsMove(axis_values, axis_speeds)
+            logger.info(f"sending absolute move to {axis_values}")
+            await self.executeMove(cmds, rel_axis_values, axis_speeds)
+            self.absUpdate(axis_values, axis_speeds)
+        return self.settings.communication.commandsToString(cmds)
+
+    async def goZero(self):
+        """
+        Move to position 0 on each axis from the current position values, and wait for the end of the movement.
+
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        async with self.moveLock:
+            cmds,axis_values,axis_speeds = self.prepareGoZero()
+            logger.info("sending go to zero")
+            await self.executeMove(cmds, axis_values, axis_speeds)
+            self.zeroUpdate()
+        return self.settings.communication.commandsToString(cmds)
+
+    async def stop(self):
+        """
+        Send a command to stop the controller in it's task, without waiting for the current movement
+        nor the exchange in progress (see AsyncSerialConnection.interrupt).
+
+        :return: 0, stop command is not printable
+        :rtype: int
+        """
+        cmds = self.settings.communication.stopCmd()
+        logger.info("sending stop")
+        self.invalidatePosition()
+        self.transport.interrupt(cmds)
+        return 0
+
+    async def goHome(self):
+        """
+        Go to current home position on the controller.
+
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        cmds = self.settings.communication.goHome(len(self.settings.axis))
+        logger.info("sending go home")
+        await self.sendCommands(cmds)
+        return self.settings.communication.commandsToString(cmds)
+
+    async def setHome(self):
+        """
+        Set current position as home on the controller.
+
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        cmds = self.settings.communication.setHome(len(self.settings.axis))
+        logger.info("sending set home")
+        await self.sendCommands(cmds)
+        # controller positions are now counted from here
+        self.origin = None
+        return self.settings.communication.commandsToString(cmds)
+
+    async def rawAction(self, commands: list[str]):
+        """
+        Send list of commands converted in ascii into the serial connection.
+
+        :return: command(s) sent to controller
+        :rtype: str
+        """
+        logger.info("sending raw commands")
+        self.invalidatePosition()
+        await self.transport.executeCmd([ cmd.encode("ascii") for cmd in commands ])
+        # raw commands can change the controller state
+        self.settings.communication.resetState()
+        self.origin = None
+        return "\n".join(commands)
+
+    async def executeMove(self, commands: list, axis_values: dict, axis_speeds: dict):
+        """
+        Send movement commands and wait for the end of the movement, see ModelControl.executeMove.
+
+        :param commands: movement commands to send
+        :type commands: list[bytes]
+        :param axis_values: relative movement for each axis formatted like { 'X': 5000 }. Unit is step
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: speed values for each axis formatted like { 'X': 500 }. Unit is step/s
+        :type axis_speeds: dict[str:int|float]
+        """
+        loop = asyncio.get_running_loop()
+        move_time = self.calcMoveTime(axis_values,axis_speeds)
+        start_steps = None
+        if self.completion == "status":
+            start_steps = await self.readPositionSteps()
+            self.updateOrigin(start_steps)
+        start_time = loop.time()
+        await self.sendCommands(commands)
+
+        if start_steps is not None:
+            target_steps = self.moveTarget(start_steps, axis_values)
+            if await self.waitPosition(start_steps, target_steps, start_time+move_time):
+                return
+        # Timed fallback
+        remaining_time = move_time-(loop.time()-start_time)
+        if remaining_time > 0:
+            await asyncio.sleep(remaining_time)
+
+    async def sendCommands(self, commands: list):
+        """
+        Send commands, clear the cached position and keep the controller state known by the commands language, see ModelControl.sendCommands.
+        A missing acknowledge makes the language forget the controller state.
+
+        :param commands: commands to send
+        :type commands: list[bytes]
+        """
+        communication = self.settings.communication
+        self.invalidatePosition()
+        try:
+            res = await self.transport.executeCmd(commands)
+        except Exception:
+            # recieved or not by the controller
+            communication.resetState()
+            raise
+        if res:
+            communication.commandsSent([ (cmd,b"") for cmd in commands ])
+        else:
+            communication.resetState()
+
+    async def waitPosition(self, start_steps: dict, target_steps: dict, deadline: float)-> bool:
+        """
+        Poll the controller position until axis are on target_steps, stopped moving, or deadline is passed.
+        See ModelControl.waitPosition, deadline is a time of the running event loop.
+
+        :raises MoveInterrupted: if axis stopped before reaching target_steps.
+        :return: True if the end of the movement has been detected, False if the position couldn't be read.
+        :rtype: bool
+        """
+        loop = asyncio.get_running_loop()
+        last_steps = None
+        while True:
+            steps = await self.readPositionSteps()
+            if steps is None:
+                return False
+            if self.moveFinished(steps, last_steps, start_steps, target_steps, loop.time() > deadline):
+                return True
+            last_steps = steps
+            await asyncio.sleep(self.poll_interval)
+
+    async def readPositionSteps(self)-> dict:
+        """
+        Ask the controller the position of each axis, see ModelControl.readPositionSteps.
+
+        :return: position of each axis formatted like { 'X': 5000 }, None if it can't be read. Unit is step
+        :rtype: dict[str:int]
+        """
+        query = self.positionQuery()
+        if query is None:
+            return None
+        generation = self.position_generation
+        answer = await self.transport.query(*query, timeout=self.query_timeout)
+        return self.positionFromAnswer(generation, answer)
+
+    async def getPosition(self, max_age: float = None)-> dict:
+        """
+        Position of each axis read from the controller, cached like ModelControl.getPosition.
+
+        :param max_age: *(Optional)* maximum age of the cached position (s), position_ttl if not given.
+        :type max_age: float
+        :return: position values of each axis formatted like { 'X': 50 }, None if the controller can't answer. Unit is mm
+        :rtype: dict[str:float]
+        """
+        if max_age is None:
+            max_age = self.position_ttl
+        async with self.positionLock:
+            steps = self.cachedPosition(max_age)
+            if steps is None:
+                steps = await self.readPositionSteps()
+                if steps is None:
+                    return None
+        return { axis:val/self.settings.stepscales[axis] for axis,val in steps.items() }
+
+    async def syncValues(self)-> dict:
+        """
+        Set position values from the position read from the controller, see ModelControl.syncValues.
+
+        :return: position values, None if the controller can't answer. Unit is mm
+        :rtype: dict[str:float]
+        """
+        position = await self.getPosition(max_age=0)
+        if position is None:
+            return None
+        return self.valuesFromPosition(position)
+
+    def quit(self):
+        """
+        Stop watching and close the serial link.
+
+        Meant to be executed at the end of the program.
+        """
+        self.transport.close()
+
+
+class MultiControl:
+    """
+    Coordinate several ModelControl, each one with its own settings, port and thread waiting list.
+
+    Axis of a movement are dispatched to the ModelControl owning them. Commands of each controller
+    are sent concurrently, a movement is finished when every controller finished it, so it takes
+    the time of the slowest controller.
+
+    Attributes:
+        - controls: list of ModelControl coordinated.
+        - axisControl: dict of axis name:ModelControl owning this axis.
+        - axis: tuple of every axis names.
+    """
+    def __init__(self, controls: list):
+        """
+        :param controls: ModelControl of each controller, an axis name can only be in one of them.
+        :type controls: list[python_files.models.ModelControl]
+        """
+        self.controls = controls
+        self.axisControl = {}
+        for control in controls:
+            for axis in control.values.keys():
+                if axis in self.axisControl:
+                    raise ValueError(f"axis {axis} is used by more than one controller")
+                self.axisControl[axis] = control
+        self.axis = tuple(self.axisControl.keys())
+
+    @property
+    def values(self)-> dict:
+        """
+        Current position values of every axis. Unit is mm
+        """
+        values = {}
+        for control in self.controls:
+            values.update(control.values)
+        return values
+
+    def splitByControl(self, axis_dict: dict)-> dict:
+        """
+        Split values by axis into values by ModelControl.
+
+        :param axis_dict: values formatted like { 'X': 50, 'Z': 10 }
+        :type axis_dict: dict[str:]
+        :return: values of each ModelControl formatted like { control1: { 'X': 50 }, control2: { 'Z': 10 } }
+        :rtype: dict[ModelControl:dict]
+        """
+        splitted = {}
+        for axis,value in axis_dict.items():
+            if axis not in self.axisControl:
+                raise KeyError(f"axis {axis} is not managed by any controller")
+            splitted.setdefault(self.axisControl[axis], {}).update({ axis:value })
+        return splitted
+
+    def incrMove(self, axis_values: dict, axis_speeds: dict = None, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        launch on each controller the commands to move to axis_values without taking on board current position.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: *(Optional)* speed values for each axis formatted like { 'X': 5 }, default speeds are used for missing axis. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :param callbacks: actions to do at the end of the movement on every controller
+        :type callbacks: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised by a controller
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do after the movement in a finally statement
+        :type finally_cbs: list[function]
+        :return: future resolved with the position values when every controller finished the movement
+        :rtype: python_files.models.MoveFuture
+        """
+        speeds = self.splitByControl(axis_speeds or {})
+        futures = [ control.incrMove(values, speeds.get(control, {})) for control,values in self.splitByControl(axis_values).items() ]
+        return self.gatherActions(futures, callbacks, miss_val_cbs, finally_cbs)
+
+    def absMove(self, axis_values: dict, axis_speeds: dict = None, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        launch on each controller the commands to move to axis_values from current position values.
+
+        :param axis_values: position values to move to for each axis. Formatted like { 'X': 50 }. Unit is mm
+        :type axis_values: dict[str:int|float]
+        :param axis_speeds: *(Optional)* speed values for each axis formatted like { 'X': 5 }, default speeds are used for missing axis. Unit is mm/s
+        :type axis_speeds: dict[str:int|float]
+        :param callbacks: actions to do at the end of the movement on every controller
+        :type callbacks: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised by a controller
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do after the movement in a finally statement
+        :type finally_cbs: list[function]
+        :return: future resolved with the position values when every controller finished the movement
+        :rtype: python_files.models.MoveFuture
+        """
+        speeds = self.splitByControl(axis_speeds or {})
+        futures = [ control.absMove(values, speeds.get(control, {})) for control,values in self.splitByControl(axis_values).items() ]
+        return self.gatherActions(futures, callbacks, miss_val_cbs, finally_cbs)
+
+    def goZero(self, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
+        """
+        launch on each controller the commands to go position 0 on each axis.
+
+        :return: future resolved with the position values when every controller finished the movement
+        :rtype: python_files.models.MoveFuture
+        """
+        futures = [ control.goZero() for control in self.controls ]
+        return self.gatherActions(futures, callbacks, miss_val_cbs, finally_cbs)
+
+    def setZero(self):
+        """
+        Set current position values as zero on each axis of each controller.
+        """
+        for control in self.controls:
+            control.setZero()
+
+    def stop(self):
+        """
+        launch a command to stop every controller in it's task.
+        """
+        for control in self.controls:
+            control.stop()
+        return 0
+
+    def gatherActions(self, futures: list, callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None)-> "MoveFuture":
+        """
+        Create a future done when every future of futures is done.
+        Cancelling it cancels the actions still in the waiting lists.
+
+        :param futures: futures of the actions of each controller
+        :type futures: list[python_files.models.MoveFuture]
+        :param callbacks: actions to do when every action succeeded
+        :type callbacks: list[function]
+        :param: miss_val_cbs: actions to do if a python_files.connection.MissingValue exception is raised by an action
+        :type miss_val_cbs: list[function]
+        :param finally_cbs: actions to do when every action is done
+        :type finally_cbs: list[function]
+        :return: future resolved with the position values of every axis
+        :rtype: python_files.models.MoveFuture
+        """
+        gathered = MoveFuture("\n".join([ future.command for future in futures ]))
+        remaining = [len(futures)]
+        lock = Lock()
+
+        def cancelActions(f: MoveFuture):
+            if f.cancelled():
+                for future in futures:
+                    future.cancel()
+
+        def actionDone(f: MoveFuture):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            error = None
+            for future in futures:
+                if future.cancelled():
+                    error = error or CancelledError(f"action cancelled: {future.command}")
+                elif future.exception():
+                    error = future.exception()
+            try:
+                if isinstance(error, co.MissingValue):
+                    logger.error(f"ERROR: {error}")
+                    if miss_val_cbs:
+                        for mvc in miss_val_cbs:
+                            if callable(mvc):
+                                mvc(error)
+                elif error is None:
+                    functionPackage(callbacks)
+            finally:
+                functionPackage(finally_cbs=finally_cbs)
+                if not gathered.cancelled():
+                    if error is None:
+                        gathered.set_result(self.values)
+                    else:
+                        gathered.set_exception(error)
+
+        gathered.add_done_callback(cancelActions)
+        if not futures:
+            functionPackage(callbacks, None, finally_cbs)
+            gathered.set_result(self.values)
+        for future in futures:
+            future.add_done_callback(actionDone)
+        return gathered
+
+    def quit(self):
+        """
+        Close and kill the thread waiting list of every controller.
+        """
+        for control in self.controls:
+            control.quit()
+
 
 def inWithStartKeys(value: str, startkeys: list):
     """
@@ -870,10 +2166,78 @@ def removeWithStartKey(dico: dict, startkey: str):
         del dico[key_to_remove]
     return dico
 
+class MoveFuture(Future):
+    """
+    Future of an action queued by a ModelControl, resolved with the position values once the action is done.
+    Can be cancelled while the action is still in the thread waiting list.
+
+    Attributes:
+        - command: str, command(s) sent to controller by the action.
+        - start_time: float, time.monotonic() when the command starting the movement is sent, None before.
+        - end_time: float, time.monotonic() at the end of the action, None before.
+        - started: threading.Event, set at start_time.
+        - abandoned: bool, set by ModelControl.abandon, the action doesn't set position values to its destination.
+    """
+    def __init__(self, command: str = ""):
+        """
+        :param command: command(s) sent to controller by the action
+        :type command: str
+        """
+        super().__init__()
+        self.command = command
+        self.start_time: float = None
+        self.end_time: float = None
+        self.started = Event()
+        self.abandoned = False
+
+    def markStarted(self):
+        """
+        Set start_time as now, the first time only.
+        """
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+            self.started.set()
+
+    def markEnded(self):
+        """
+        Set end_time as now.
+        """
+        self.markStarted()
+        self.end_time = time.monotonic()
+
+class CompiledRoadmap:
+    """
+    Movements of a roadmap converted to steps at once and encoded by ModelControl.compileRoadmap.
+    Moves are relative to the previous position, from the position values when compiled.
+
+    Attributes:
+        - axis: tuple, axis names, order of the columns.
+        - start: numpy.ndarray, position values before the first move (mm).
+        - positions: numpy.ndarray, position values after each move (mm), shape is (number of moves, number of axis).
+        - steps: numpy.ndarray, relative movement of each move (step).
+        - speeds: numpy.ndarray, speed of each axis for each move (step/s), after speed limits.
+        - times: numpy.ndarray, expected duration of each move (s).
+        - commands: list, movement command of each move, None if the language can't compile moves.
+    """
+    def __init__(self, axis: tuple, start, positions, steps, speeds, times, commands: list):
+        self.axis = axis
+        self.start = start
+        self.positions = positions
+        self.steps = steps
+        self.speeds = speeds
+        self.times = times
+        self.commands = commands
+
+    def __len__(self)-> int:
+        return len(self.positions)
+
 class ThreadExecutor(Thread):
     """
     Thread waiting list.
 
+    Sleeps on a condition variable until a task is added or the executor is killed,
+    so a queued task starts as soon as the previous one is finished.
+
     wait_list_size is a static parameter.
     """
     wait_list_size: int = 1
@@ -887,36 +2251,29 @@ class ThreadExecutor(Thread):
         self.curr_thread: Thread = None
         self.wait_list  : list   = []
         self._lock      : Lock   = Lock()
+        self._new_task  : Condition = Condition(self._lock)
         self.name       : str    = name
         self.killed     : bool   = False
-        self.interval_time : int = 0.5  # seconds
 
     def run(self):
         """
         Run until killed. Run tasks from it's waiting list.
         """
-        # counter = 0
-
-        while not self.killed:
-            # affichages
-            time.sleep(self.interval_time)
-            #print("\n" + self.name + "\t" + str(counter) + "s")
-            # print(self.curr_thread)
-            # print(self.wait_list)
-            # counter += interval_time
-
-            # gestion concrete
-            if self.wait_list:
-                # si liste non vide
-                with self._lock:
-                    # assignation du thread courant
-                    self.curr_thread = self.wait_list.pop(0)
-                # lancement du thread courant
-                self.curr_thread.start()
-                # attente de la fin du thread courant
-                self.curr_thread.join()
-                # suppression du thread courant execute
-                self.curr_thread = None
+        while True:
+            with self._new_task:
+                # attente d une tache ou de la fin de l executor
+                while not self.wait_list and not self.killed:
+                    self._new_task.wait()
+                if self.killed:
+                    break
+                # assignation du thread courant
+                self.curr_thread = self.wait_list.pop(0)
+            # lancement du thread courant
+            self.curr_thread.start()
+            # attente de la fin du thread courant
+            self.curr_thread.join()
+            # suppression du thread courant execute
+            self.curr_thread = None
         # print(self.name + " has been killed.")
         logger.debug(f"{self.name} has been killed.")
 
@@ -924,7 +2281,7 @@ class ThreadExecutor(Thread):
         """
         Create thread for the new task and add it to the waiting list.
 
-        :return: Added thread if everything went well, 1 if waiting list was full and task not took into account.
+        :return: Added thread if everything went well, -1 if waiting list was full and task not took into account.
         :rtype: Thread | int
         """
         thntask = Thread(target=newtask,args=taskargs)
@@ -937,22 +2294,22 @@ class ThreadExecutor(Thread):
     # ajout d une tache a la liste d attente a executer
     def addThreadedTask(self, newthread: Thread):
         """
-        Add task in a thread to the waiting list if not full.
+        Add task in a thread to the waiting list if not full, and wake up the executor.
 
-        :return: 0 if everything went well, 1 if waiting list was full and task not took into account.
+        :return: 0 if everything went well, -1 if waiting list was full and task not took into account.
         :rtype: int
         """
-        # verification de la taille de la liste d attente
-        if len(self.wait_list) < self.wait_list_size or (len(self.wait_list)==0 and not self.isRunning()):
-            with self._lock:
+        with self._new_task:
+            # verification de la taille de la liste d attente
+            if len(self.wait_list) < self.wait_list_size or (len(self.wait_list)==0 and not self.isRunning()):
                 # si il reste de la place, ajout a la liste
                 self.wait_list.append(newthread)
-            return 0
-        else:
-            # si plus de place, affichage de la non prise en compte de la tache
-            # print("/!\ Warning /!\ waiting list is too big, thread dropped :" + str(newthread))
-            logger.warning(f"/!\ Warning /!\ waiting list is too big, thread dropped : {str(newthread)}")
-            return -1
+                self._new_task.notify()
+                return 0
+        # si plus de place, affichage de la non prise en compte de la tache
+        # print("/!\ Warning /!\ waiting list is too big, thread dropped :" + str(newthread))
+        logger.warning(f"/!\ Warning /!\ waiting list is too big, thread dropped : {str(newthread)}")
+        return -1
 
     def isRunning(self):
         """
@@ -998,7 +2355,9 @@ class ThreadExecutor(Thread):
         End the infinite loop of waiting and execute next action.
         Does not interrupt an action.
         """
-        self.killed = True
+        with self._new_task:
+            self.killed = True
+            self._new_task.notify_all()
 
 
 def functionPackage(callbacks: list = None, miss_val_cbs: list = None, finally_cbs: list = None):
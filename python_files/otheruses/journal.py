@@ -0,0 +1,133 @@
+import os
+import struct
+import time
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RunJournal:
+    """
+    Binary log of the positions done by a run, to resume it after a crash.
+
+    The file starts with a header (magic, number of axis, controller position of the origin of position values
+    in steps for each axis, NaN if unknown), then one record per position done : its index in the roadmap file
+    and its position values (mm). A record is flushed as soon as it is written, the file is synced to the disk
+    at most every sync_interval seconds. An incomplete last record, written during a crash, is ignored.
+
+    Attributes :
+    - filepath (str) : path of the journal file.
+    - nb_axis (int) : number of position values of each record.
+    - origin (list[float]) : controller position of the origin of position values (step), NaN if unknown.
+    - completed (set[int]) : indexes of the positions done.
+    - last_position (list[float]) : position values of the last record, None if empty.
+    """
+    MAGIC = b"PPCJ"
+
+    def __init__(self, filepath: str, nb_axis: int, sync_interval: float = 1.0):
+        """
+        :param filepath: path of the journal file
+        :type filepath: str
+        :param nb_axis: number of axis
+        :type nb_axis: int
+        :param sync_interval: *(Optional)* maximum time between two syncs of the file to the disk (s).
+        :type sync_interval: float
+        """
+        self.filepath = filepath
+        self.nb_axis = nb_axis
+        self.sync_interval = sync_interval
+        self.header = struct.Struct(f"<4sB{nb_axis}d")
+        self.record = struct.Struct(f"<q{nb_axis}d")
+
+        self.origin = [ math.nan ]*nb_axis
+        self.completed = set()
+        self.last_position = None
+        self.file = None
+        self.last_sync = 0
+
+    def start(self, origin: list = None):
+        """
+        Start a new journal, an existing file is replaced.
+
+        :param origin: *(Optional)* controller position of the origin of position values (step) for each axis.
+        :type origin: list[float]
+        """
+        self.close()
+        self.origin = [ math.nan if val is None else float(val) for val in (origin or [None]*self.nb_axis) ]
+        self.completed = set()
+        self.last_position = None
+        self.file = open(self.filepath, "wb")
+        self.file.write(self.header.pack(self.MAGIC, self.nb_axis, *self.origin))
+        self.sync()
+
+    def load(self)-> set:
+        """
+        Read an existing journal, then open it to append the next positions.
+
+        :raises ValueError: if the file is not a journal of nb_axis axis.
+        :return: indexes of the positions done
+        :rtype: set[int]
+        """
+        self.close()
+        with open(self.filepath, "rb") as f:
+            data = f.read()
+        if len(data) < self.header.size:
+            raise ValueError(f"!! ERROR !! {self.filepath} is not a run journal")
+        magic,nb_axis,*origin = self.header.unpack_from(data)
+        if magic != self.MAGIC or nb_axis != self.nb_axis:
+            raise ValueError(f"!! ERROR !! {self.filepath} is not a run journal of {self.nb_axis} axis")
+        self.origin = origin
+
+        nb_records = (len(data)-self.header.size)//self.record.size
+        self.completed = set()
+        self.last_position = None
+        for index,*position in self.record.iter_unpack(data[self.header.size:self.header.size+nb_records*self.record.size]):
+            self.completed.add(index)
+            self.last_position = position
+        logger.info(f"journal loaded: {len(self.completed)} positions done")
+
+        # drop an incomplete record before appending
+        self.file = open(self.filepath, "r+b")
+        self.file.truncate(self.header.size+nb_records*self.record.size)
+        self.file.seek(0, os.SEEK_END)
+        return self.completed
+
+    def append(self, index: int, position: list):
+        """
+        Record a position as done.
+
+        :param index: index of the position in the roadmap file
+        :type index: int
+        :param position: position values (mm)
+        :type position: list[float]
+        """
+        self.file.write(self.record.pack(index, *position))
+        self.file.flush()
+        self.completed.add(index)
+        self.last_position = list(position)
+        if time.monotonic()-self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Write the journal to the disk.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def hasOrigin(self)-> bool:
+        """
+        :return: If the controller position of the origin is known on every axis.
+        :rtype: bool
+        """
+        return not any( math.isnan(val) for val in self.origin )
+
+    def close(self):
+        """
+        Sync and close the journal file.
+        """
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -1,9 +1,15 @@
 from ..models import ModelSettings,ModelControl
 from ..communications import CSeries
+from .roadmap import RoadmapReader,orderRoadmap,segmentTimes,gridRoadmap,gridCells,cellPoints,splitCells,positionKey
+from .journal import RunJournal
+from .results import ResultsSink
+from .progress import RunProgress
+import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor,TimeoutError as FutureTimeoutError
+from collections import deque
 from pathlib import Path
 # import csv
-from threading import Event
-from time import sleep
 import pandas as pd
 import logging
 
@@ -15,9 +21,18 @@ class MoveAndMeasure:
     """
     Attributes :
     - axis (tuple) : names of axis ex ('x','y','z'). Up to 3 axis supported.
-    - roadmap (list[list[str]]) : 2d list of positions loaded.
-    - move_finished_event (threading.Event) : event when running, wait until set before doing a measurement.
+    - roadmap (list[list[str]] | RoadmapReader | numpy.ndarray) : 2d list of positions loaded, positions read by chunks when streamed, or 2d array once optimized or generated.
     - settingsData (dict) : loaded and effective settings.
+    - processFunc (function) : processing of each measurement done in a pool while moving, None to disable.
+    - results (list) : results of processFunc of the last run, in roadmap order.
+    - roadmap_indexes (numpy.ndarray) : index in the roadmap file of each position once optimized, None if in file order.
+    - journal (RunJournal) : log of the positions done, to resume a run. None to disable. With a sink, a position is logged once its measurement is written.
+    - sink (ResultsSink) : storage of the measurements returned by measurementFunc. None to disable.
+    - settle_time (float) : wait between the end of each movement and its measurement (s).
+    - point_timeout (float) : maximum duration of each movement (s), None to wait without limit.
+    - overheads (list[float]) : time between the end of each movement (plus settle_time) and the start of its measurement during the last run (s).
+    - progress (RunProgress) : progress of the current or last run, None before the first run.
+    - program_segment (int) : number of moves of each program stored in the controller, None to send each move.
     """
     def __init__(self, axis_names: tuple, wait_ack=True):
         """
@@ -27,6 +42,24 @@ class MoveAndMeasure:
         self.axis = axis_names
 
         self.roadmap = None
+        self.roadmap_indexes = None
+        self.journal = None
+        self.sink = None
+
+        self.processFunc = None
+        self.workers = 2
+        self.max_in_flight = 4
+        self.use_processes = False
+        self.results = []
+
+        self.settle_time = 0.0
+        self.point_timeout = None
+        self.overheads = []
+        self.progress = None
+        self.progress_callbacks = []
+        self.progress_interval = 0.5
+        self.last_notify = 0
+        self.program_segment = None
 
         self.mSettings = ModelSettings(self.axis)
         self.mSettings.loadSettings(path)
@@ -44,6 +77,7 @@ class MoveAndMeasure:
         :type filepath: str
         """
         self.roadmap = []
+        self.roadmap_indexes = None
         if filepath[-3:] == "csv":
             df = pd.read_csv(filepath)
             # with open(filepath,"r") as roadmapFile:
@@ -74,9 +108,256 @@ class MoveAndMeasure:
 
         self.saveSettings(platines=platines)
 
+    def streamMoveSet(self, filepath: str, chunk_size: int = 10000):
+        """
+        Prepare a list of positions from a csv or xlsx file to be read by chunks during the run.
+        Only platines are read now, positions are parsed as float arrays while moving.
+
+        :param filepath: absolute path to the csv or xlsx file
+        :type filepath: str
+        :param chunk_size: *(Optional)* number of positions read at once
+        :type chunk_size: int
+        """
+        self.roadmap = RoadmapReader(filepath, chunk_size=chunk_size)
+        self.roadmap_indexes = None
+        logger.info("roadmap ready to be streamed")
+
+        platines={ self.axis[i]:self.roadmap.platines[i] for i in range(len(self.axis))}
+
+        logger.debug(f"platines loaded\n{platines}")
+
+        self.saveSettings(platines=platines)
+
+    def setRoadmap(self, positions):
+        """
+        Use an array of positions as roadmap, like the ones of python_files.otheruses.roadmap generators (gridRoadmap, serpentineRoadmap, spiralRoadmap, polarRoadmap, latinHypercubeRoadmap).
+        Platines settings are not changed.
+
+        :param positions: positions, shape is (number of positions, number of axis or more). Unit is mm
+        :type positions: numpy.ndarray | list[list[float]]
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        if positions.ndim != 2 or positions.shape[1] < len(self.axis):
+            raise ValueError(f"!! ERROR !! roadmap should have one position per line and at least {len(self.axis)} columns, not shape {positions.shape}")
+        self.roadmap = positions
+        self.roadmap_indexes = None
+        logger.info(f"roadmap of {len(positions)} positions set")
+
+    def optimizeRoadmap(self, speeds: list, mode: str = "nearest")-> tuple:
+        """
+        Reorder the loaded roadmap to reduce the time spent moving, from the current position.
+        The roadmap becomes a 2d array of positions, a streamed roadmap is entirely read.
+
+        :param speeds: list of speeds for each axis, limited like movements by speed_limits.
+        :type speeds: list[int|float]
+        :param mode: *(Optional)* "keep" the file order, "serpentine" by rows, or "nearest" neighbour improved by 2-opt (strips for large roadmaps, see orderRoadmap).
+        :type mode: str
+        :return: estimated movement time before and after reordering (s)
+        :rtype: tuple[float,float]
+        """
+        if self.roadmap is None:
+            raise AttributeError("!! ERROR !! no roadmap has been loaded, use .loadMoveSet(filepath) before optimizing")
+
+        if isinstance(self.roadmap, RoadmapReader):
+            positions = self.roadmap.toArray()
+        elif isinstance(self.roadmap, np.ndarray):
+            positions = self.roadmap
+        else:
+            positions = np.array(self.roadmap, dtype=object)
+        aSpeeds = self.mControl.checkSpeed({ self.axis[i]:speeds[i] for i in range(len(self.axis)) })
+        start = [ self.mControl.values[oneAxis] for oneAxis in self.axis ]
+
+        order,before,after = orderRoadmap(
+            self.axisPositions(positions),
+            [ aSpeeds[oneAxis] for oneAxis in self.axis ],
+            mode=mode,
+            start=start
+        )
+        self.roadmap = positions[order]
+        # keep file indexes for the journal
+        self.roadmap_indexes = order if self.roadmap_indexes is None else self.roadmap_indexes[order]
+
+        logger.info(f"roadmap ordered as {mode}: estimated movement time {before:.1f}s -> {after:.1f}s ({before-after:.1f}s saved)")
+        return before,after
+
+    def setProcessing(self, processFunc, workers: int = 2, max_in_flight: int = 4, use_processes: bool = False):
+        """
+        Split measurements in two steps : measurementFunc acquires data at rest, then processFunc processes it
+        in a pool while the stage moves to the next position. processFunc will be called as processFunc(position,data)
+        with data returned by measurementFunc, results are stored in self.results in roadmap order.
+
+        :param processFunc: processing of each measurement, None to process nothing.
+        :type processFunc: function
+        :param workers: *(Optional)* number of threads or processes processing measurements.
+        :type workers: int
+        :param max_in_flight: *(Optional)* maximum number of measurements waiting for their processing, the run waits for the oldest one above it.
+        :type max_in_flight: int
+        :param use_processes: *(Optional)* process in a process pool, processFunc and data must be picklable.
+        :type use_processes: bool
+        """
+        if processFunc is not None and not callable(processFunc):
+            raise TypeError("!! ERROR !! processFunc must be callable !")
+        if max_in_flight < 1:
+            raise ValueError("!! ERROR !! max_in_flight must be at least 1")
+        self.processFunc = processFunc
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.use_processes = use_processes
+
+    def setTiming(self, settle_time: float = 0.0, point_timeout: float = None):
+        """
+        Timing of each position of a run.
+
+        :param settle_time: *(Optional)* wait between the end of a movement and the measurement (s), to let the platines stabilize.
+        :type settle_time: float
+        :param point_timeout: *(Optional)* maximum duration of a movement (s), the controller is stopped and the run raises TimeoutError after it. None to wait without limit.
+        :type point_timeout: float
+        """
+        if settle_time < 0 or (point_timeout is not None and point_timeout <= 0):
+            raise ValueError("!! ERROR !! settle_time must be positive and point_timeout strictly positive")
+        self.settle_time = settle_time
+        self.point_timeout = point_timeout
+
+    def runStatistics(self)-> dict:
+        """
+        Overhead of the last run : time between the end of each movement (plus settle_time) and the start of its measurement.
+
+        :return: number of positions measured, mean, median and max overhead (s), None if no position has been measured.
+        :rtype: dict
+        """
+        overheads = np.array(self.overheads, dtype=np.float64)
+        return {
+            "nb_points": len(overheads),
+            "overhead_mean": float(overheads.mean()) if len(overheads) else None,
+            "overhead_median": float(np.median(overheads)) if len(overheads) else None,
+            "overhead_max": float(overheads.max()) if len(overheads) else None,
+        }
+
+    def setProgressCallbacks(self, callbacks: list = None, interval: float = 0.5):
+        """
+        Functions called during a run as callback(snapshot), snapshot being the dict of getProgress().
+        They are called by the run loop at most every interval seconds and at the end of the run, so they must return quickly :
+        a GUI should only store the snapshot, or poll getProgress() from its own loop instead.
+
+        :param callbacks: *(Optional)* functions called with the progress snapshot, None to remove them.
+        :type callbacks: list[function]
+        :param interval: *(Optional)* minimum time between two calls (s).
+        :type interval: float
+        """
+        self.progress_callbacks = list(callbacks or [])
+        self.progress_interval = interval
+
+    def getProgress(self)-> dict:
+        """
+        Progress of the current or last run, can be called from any thread.
+
+        :return: completed, total, averages move_time, settle_time and measure_time (s), points_per_minute, elapsed (s) and eta (s),
+            see RunProgress.snapshot. None before the first run.
+        :rtype: dict
+        """
+        return None if self.progress is None else self.progress.snapshot()
+
+    def axisPositions(self, positions = None)-> np.ndarray:
+        """
+        Axis columns of the roadmap as floats, the other columns are not converted and may hold anything.
+
+        :param positions: *(Optional)* positions to read instead of the roadmap in memory, one per line.
+        :type positions: numpy.ndarray | list[list]
+        :return: positions, shape is (number of positions, number of axis). Unit is mm
+        :rtype: numpy.ndarray
+        """
+        positions = self.roadmap if positions is None else positions
+        if isinstance(positions, np.ndarray):
+            columns = positions[:,:len(self.axis)]
+        else:
+            columns = [ list(place)[:len(self.axis)] for place in positions ]
+        return np.asarray(columns, dtype=np.float64).reshape(-1, len(self.axis))
+
+    def startProgress(self, speeds: dict, skip: set, index_offset: int = 0):
+        """
+        Create the progress of a run of the roadmap, with the modeled movement time of the positions not in skip.
+        No total nor ETA for a streamed roadmap.
+        """
+        if isinstance(self.roadmap, RoadmapReader):
+            self.progress = RunProgress()
+            return
+        positions = self.axisPositions()
+        indexes = index_offset+(np.arange(len(positions)) if self.roadmap_indexes is None else np.asarray(self.roadmap_indexes))
+        todo = ~np.isin(indexes, list(skip))
+        aSpeeds = self.mControl.checkSpeed(dict(speeds))
+        self.progress = RunProgress(
+            total=len(positions),
+            segment_times=segmentTimes(
+                positions[todo],
+                np.array([ aSpeeds[oneAxis] for oneAxis in self.axis ], dtype=np.float64),
+                start=np.array([ self.mControl.values[oneAxis] for oneAxis in self.axis ], dtype=np.float64)
+            ),
+            completed=int(len(positions)-todo.sum())
+        )
+
+    def notifyProgress(self, force: bool = False):
+        """
+        Call the progress callbacks if progress_interval has passed since the last call, or if force.
+        """
+        if not self.progress_callbacks:
+            return
+        now = time.monotonic()
+        if not force and now-self.last_notify < self.progress_interval:
+            return
+        self.last_notify = now
+        snapshot = self.progress.snapshot()
+        for callback in self.progress_callbacks:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.warning(f"progress callback {callback} failed: {e}")
+
+    def setProgramMode(self, segment_size: int = 100):
+        """
+        Run roadmaps in memory as programs stored in the controller : moves are uploaded by segments of segment_size,
+        then each move is started by a short command and its end is signaled by the controller (see ModelControl.programMove).
+        Streamed roadmaps still send each move.
+
+        :param segment_size: *(Optional)* number of moves of each program, None to send each move.
+        :type segment_size: int
+        """
+        if segment_size is not None and segment_size <= 0:
+            raise ValueError("!! ERROR !! segment_size must be strictly positive")
+        self.program_segment = segment_size
+
+    def setJournal(self, filepath: str, sync_interval: float = 1.0):
+        """
+        Log each position done by the next runs in a journal file, to be able to resume a run.
+
+        :param filepath: path of the journal file, None to disable the journal.
+        :type filepath: str
+        :param sync_interval: *(Optional)* maximum time between two syncs of the journal to the disk (s).
+        :type sync_interval: float
+        """
+        if self.journal:
+            self.journal.close()
+        self.journal = None if filepath is None else RunJournal(filepath, len(self.axis), sync_interval=sync_interval)
+
+    def setResultsSink(self, directory: str, batch_size: int = 1000):
+        """
+        Store what measurementFunc returns in chunk files of a directory during the next runs, with the index,
+        commanded position and times of each measurement. Read them with ResultsSink.read(directory).
+
+        :param directory: folder of the chunk files, None to disable the storage.
+        :type directory: str
+        :param batch_size: *(Optional)* number of measurements of each chunk file.
+        :type batch_size: int
+        """
+        if self.sink:
+            self.sink.close()
+        self.sink = None if directory is None else ResultsSink(directory, len(self.axis), batch_size=batch_size)
+
     def run(self, measurementFunc, speeds: list, *args, **kwargs):
         """
         Run a measure after every move. measurementFunc will be called as measurementFunc(position,*args,**kwargs)
+        With a streamed roadmap, position is a float numpy array and the first move starts once the first chunk is read.
+        With a journal set by setJournal, a new journal is started.
+        With a sink set by setResultsSink, its previous chunk files are removed.
 
         :param measurementFunc: a callable function without it's parameters. Meant to be called on each position.
         :type measurementFunc: function
@@ -84,33 +365,375 @@ class MoveAndMeasure:
         :type speeds: list[str:int]
         :param *args: as many parameters without name for the measurementFunc.
         :param **kwargs: as many parameters with a name for the the measurementFunc.
+        :return: results of processFunc for each position if set by setProcessing, else an empty list.
+        :rtype: list
+        """
+        self.checkRun(measurementFunc)
+        if self.journal:
+            self.journal.start(self.controllerOrigin())
+        if self.sink:
+            self.sink.start(clear=True)
+        return self.runPositions(measurementFunc, speeds, set(), args, kwargs)
+
+    def resume(self, measurementFunc, speeds: list, *args, rehome: bool = False, **kwargs):
+        """
+        Continue a run stopped before its end, from the journal set by setJournal.
+        The roadmap has to be loaded again (loadMoveSet, streamMoveSet, optimizeRoadmap), positions in the journal are skipped.
+
+        Position values are synchronized first : from the controller position and the origin saved in the journal,
+        or from the last position of the journal if the controller doesn't answer.
+        With rehome, the controller goes to its home position before.
+
+        :param measurementFunc: a callable function without it's parameters. Meant to be called on each position.
+        :type measurementFunc: function
+        :param speeds: list of speeds for each axis.
+        :type speeds: list[str:int]
+        :param rehome: *(Optional, keyword only)* go to the home position of the controller before synchronizing.
+        :type rehome: bool
+        :param *args: as many parameters without name for the measurementFunc.
+        :param **kwargs: as many parameters with a name for the the measurementFunc.
+        :return: results of processFunc for each remaining position if set by setProcessing, else an empty list.
+        :rtype: list
+        """
+        self.checkRun(measurementFunc)
+        if self.journal is None:
+            raise AttributeError("!! ERROR !! no journal has been set, use .setJournal(filepath) before resuming")
+        done = self.journal.load()
+        self.resyncPosition(rehome)
+        if self.sink:
+            self.sink.start(clear=False)
+        return self.runPositions(measurementFunc, speeds, done, args, kwargs)
+
+    def flyScan(self, measurementFunc, lines, speeds: list, sample_period: float, *args, **kwargs)-> list:
+        """
+        Scan lines in continuous movement : go to the start of each line, then move to its end in a single movement
+        while measurementFunc is called every sample_period seconds. measurementFunc will be called as measurementFunc(position,*args,**kwargs)
+        with position values interpolated from the commanded speeds and the start time of the movement.
+        With a sink set by setResultsSink, samples are stored with the index of their line. The journal is not used.
+
+        :param measurementFunc: a callable function without it's parameters. Meant to be called on each sample.
+        :type measurementFunc: function
+        :param lines: start and end position of each line, shape is (number of lines, 2, number of axis), like python_files.otheruses.roadmap.flyLines. Unit is mm
+        :type lines: numpy.ndarray
+        :param speeds: list of maximum speeds for each axis, the speed along each line.
+        :type speeds: list[int|float]
+        :param sample_period: time between two measurements (s)
+        :type sample_period: float
+        :param *args: as many parameters without name for the measurementFunc.
+        :param **kwargs: as many parameters with a name for the the measurementFunc.
+        :return: samples of every line as (position values, time.monotonic() at the call, time.monotonic() at the end, measurementFunc result)
+        :rtype: list[tuple]
+        """
+        if not callable(measurementFunc):
+            raise TypeError("!! ERROR !! measurementFunc must be callable !")
+        lines = np.asarray(lines, dtype=np.float64)
+        aSpeeds = { self.axis[i]:speeds[i] for i in range(len(self.axis)) }
+        # monotonic times of samples to time.time() for the sink
+        clockOffset = time.time()-time.monotonic()
+        if self.sink:
+            self.sink.start(clear=True)
+
+        self.results = []
+        try:
+            for idxLine,(lineStart,lineEnd) in enumerate(lines):
+                startVals = { self.axis[i]:float(lineStart[i]) for i in range(len(self.axis)) }
+                endVals = { self.axis[i]:float(lineEnd[i]) for i in range(len(self.axis)) }
+                logger.debug(f"line {idxLine} from {startVals} to {endVals}")
+                self.mControl.absMove(startVals,aSpeeds).result()
+
+                samples = self.mControl.flyMove(endVals, aSpeeds, sample_period, measurementFunc, *args, **kwargs)
+                if self.sink:
+                    for position,t,tEnd,data in samples:
+                        self.sink.add(idxLine, [ position[oneAxis] for oneAxis in self.axis ], t+clockOffset, tEnd+clockOffset, data)
+                self.results += samples
+        finally:
+            if self.sink:
+                self.sink.close()
+
+        logger.info(f"MoveAndMeasure fly scan ended, {len(self.results)} samples on {len(lines)} lines")
+        return self.results
+
+    def adaptiveRun(self, measurementFunc, metric, ranges: list, speeds: list, *args, budget: int = 1000, tolerance: float = 0.0,
+                    max_levels: int = 4, refine_factor: int = 2, order: str = "nearest", **kwargs)-> tuple:
+        """
+        Measure a grid, then refine it where the measurements change the most.
+
+        A coarse pass measures the grid of ranges. metric(result of measurementFunc) gives a value for each position,
+        the score of a grid cell is the difference between the maximum and the minimum values of its corners.
+        Cells with a score over tolerance, the highest first, are split in refine_factor parts on each axis
+        and the new positions of their sub-grid are measured in the next pass. Passes stop after max_levels
+        refinements, when no cell is over tolerance, or when budget positions have been measured.
+        Each pass is a roadmap ordered with optimizeRoadmap(speeds, order), "keep" to measure it in grid order.
+
+        With a journal or a sink, indexes are the order of the positions in the passes, the first pass being the coarse grid.
+        A stopped adaptive run can't be resumed.
+
+        :param measurementFunc: a callable function without it's parameters. Meant to be called on each position.
+        :type measurementFunc: function
+        :param metric: a callable function returning a float from a result of measurementFunc.
+        :type metric: function
+        :param ranges: (start, stop, number of positions) of each axis for the coarse grid, stop is included. At least 2 positions per axis.
+        :type ranges: list[tuple]
+        :param speeds: list of speeds for each axis.
+        :type speeds: list[int|float]
+        :param budget: *(Optional, keyword only)* maximum number of positions measured, the coarse grid included.
+        :type budget: int
+        :param tolerance: *(Optional, keyword only)* cells with a score lower or equal are not refined.
+        :type tolerance: float
+        :param max_levels: *(Optional, keyword only)* maximum number of refinement passes after the coarse pass.
+        :type max_levels: int
+        :param refine_factor: *(Optional, keyword only)* number of parts on each axis of a refined cell.
+        :type refine_factor: int
+        :param order: *(Optional, keyword only)* mode of optimizeRoadmap for each pass.
+        :type order: str
+        :param *args: as many parameters without name for the measurementFunc.
+        :param **kwargs: as many parameters with a name for the the measurementFunc.
+        :return: positions measured, shape is (number of positions, number of axis), and their metric values, in measurement order.
+        :rtype: tuple[numpy.ndarray,numpy.ndarray]
+        """
+        if not callable(measurementFunc) or not callable(metric):
+            raise TypeError("!! ERROR !! measurementFunc and metric must be callable !")
+        if len(ranges) != len(self.axis):
+            raise ValueError(f"!! ERROR !! {len(ranges)} ranges for {len(self.axis)} axis")
+
+        # metric value of each position measured
+        values = {}
+        def measure(place, *args, **kwargs):
+            data = measurementFunc(place, *args, **kwargs)
+            values[positionKey(place)] = float(metric(data))
+            return data
+
+        lows,size = gridCells(ranges)
+        batch = gridRoadmap(ranges)
+        planned = { positionKey(place) for place in batch }
+        results = []
+        nbDone = 0
+        level = 0
+        if self.journal:
+            self.journal.start(self.controllerOrigin())
+        if self.sink:
+            self.sink.start(clear=True)
+        while True:
+            batch = batch[:budget-nbDone]
+            self.setRoadmap(batch)
+            if order != "keep":
+                self.optimizeRoadmap(speeds, mode=order)
+            # journal and sink are closed at the end of each pass
+            if self.journal and level > 0:
+                self.journal.load()
+            if self.sink and level > 0:
+                self.sink.start(clear=False)
+            logger.info(f"adaptive run level {level}: {len(batch)} positions")
+            results += self.runPositions(measure, speeds, set(), args, kwargs, index_offset=nbDone)
+            nbDone += len(batch)
+            level += 1
+            if level > max_levels or nbDone >= budget:
+                break
+
+            # score of each cell from its corners
+            corners = cellPoints(lows, size)
+            cornerValues = np.array([ [ values.get(positionKey(corner), np.nan) for corner in cell ] for cell in corners ])
+            scores = np.nanmax(cornerValues, axis=1)-np.nanmin(cornerValues, axis=1)
+            selected = [ idx for idx in np.argsort(-scores, kind="stable") if scores[idx] > tolerance ]
+
+            newPlaces = []
+            refined = []
+            for idxCell in selected:
+                if nbDone+len(newPlaces) >= budget:
+                    break
+                for place in cellPoints(lows[idxCell:idxCell+1], size, refine_factor)[0]:
+                    key = positionKey(place)
+                    if key not in planned:
+                        planned.add(key)
+                        newPlaces.append(place)
+                refined.append(idxCell)
+            if not newPlaces:
+                break
+            lows,size = splitCells(lows[refined], size, refine_factor)
+            batch = np.array(newPlaces)
+
+        self.results = results
+        logger.info(f"MoveAndMeasure adaptive run ended, {nbDone} positions on {level} levels")
+        return np.array(list(values.keys()), dtype=np.float64).reshape(-1, len(self.axis)),np.array(list(values.values()), dtype=np.float64)
+
+    def checkRun(self, measurementFunc):
+        """
+        Check a run can be started.
         """
         if self.roadmap is None:
             raise AttributeError("!! ERROR !! no roadmap has been loaded, use .loadMoveSet(filepath) before running")
         if not callable(measurementFunc):
             raise TypeError("!! ERROR !! measurementFunc must be callable !")
 
-        self.move_finished_event = Event()
-        
+    def controllerOrigin(self)-> list:
+        """
+        :return: controller position of the origin of position values for each axis (step), None if the controller doesn't answer.
+        :rtype: list[float]
+        """
+        try:
+            steps = self.mControl.readPositionSteps()
+        except Exception as e:
+            logger.warning(f"controller position not read: {e}")
+            steps = None
+        if steps is None:
+            logger.warning("origin of the run unknown, resume will use the last position of the journal")
+            return None
+        stepscales = self.mSettings.stepscales
+        return [ steps[oneAxis]-self.mControl.values[oneAxis]*stepscales[oneAxis] for oneAxis in self.axis ]
+
+    def resyncPosition(self, rehome: bool = False, home_timeout: float = 120):
+        """
+        Set position values of the ModelControl from the controller position and the origin saved in the journal.
+
+        :param rehome: *(Optional)* go to the home position of the controller before.
+        :type rehome: bool
+        :param home_timeout: *(Optional)* maximum time to go to the home position (s).
+        :type home_timeout: float
+        """
+        steps = None
+        try:
+            steps = self.mControl.readPositionSteps()
+            if rehome:
+                self.mControl.goHome().result()
+                home = { oneAxis:0 for oneAxis in self.axis }
+                if steps is None or not self.mControl.waitPosition(steps, home, time.monotonic()+home_timeout):
+                    logger.warning("end of the go home movement not detected")
+                steps = home
+        except Exception as e:
+            logger.warning(f"controller position not read: {e}")
+
+        stepscales = self.mSettings.stepscales
+        if steps is not None and self.journal.hasOrigin():
+            values = { oneAxis:(steps[oneAxis]-origin)/stepscales[oneAxis] for oneAxis,origin in zip(self.axis,self.journal.origin) }
+        elif steps is not None and rehome:
+            logger.warning("origin of the run unknown, home position is used as origin")
+            values = { oneAxis:0 for oneAxis in self.axis }
+        elif self.journal.last_position is not None:
+            logger.warning("controller position unknown, the last position of the journal is used")
+            values = { oneAxis:pos for oneAxis,pos in zip(self.axis,self.journal.last_position) }
+        else:
+            logger.warning("nothing to synchronize position values with, current ones are kept")
+            return
+        self.mControl.values.update(values)
+        logger.info(f"position values synchronized at {values}")
+
+    def journalRows(self, rows: list):
+        """
+        Journal the positions of rows written by the sink, called by its writing thread.
+
+        :param rows: rows of a chunk, see ResultsSink.written_callbacks
+        :type rows: list[tuple]
+        """
+        for index,position,*_ in rows:
+            self.journal.append(index, position)
+
+    def runPositions(self, measurementFunc, speeds: list, skip: set, args: tuple, kwargs: dict, index_offset: int = 0)-> list:
+        """
+        Move and measure on every position of the roadmap which index is not in skip.
+        index_offset is added to the index of each position in the journal and the sink.
+        The measurement starts settle_time after the end of the movement, without polling.
+
+        :raises TimeoutError: if a movement lasts more than point_timeout, the controller is stopped.
+
+        :return: results of processFunc for each position if set by setProcessing, else an empty list.
+        :rtype: list
+        """
         aSpeeds = { self.axis[i]:speeds[i] for i in range(len(self.axis)) }
-        for place in self.roadmap:
-            aVals = { self.axis[i]:float(place[i]) for i in range(len(self.axis)) }
-
-            # print("position:",aVals)
-            # print("speeds:",aSpeeds)
-            logger.debug(f"position : {aVals}")
-            logger.debug(f"speeds : {aSpeeds}")
-            self.move_finished_event.clear()
-            cmd = self.mControl.absMove(aVals,aSpeeds,[self.move_finished_event.set])
-            # print(f"command executed: {cmd}")
-            logger.debug(f"move at {aVals}")
-            while not self.move_finished_event.isSet():
-                sleep(0.5)
-            # print("start measurement")
-            logger.debug("execute callback")
-            measurementFunc(place,*args,**kwargs)
+        self.results = []
+        self.overheads = []
+        self.startProgress(aSpeeds, skip, index_offset)
+        self.last_notify = time.monotonic()
+        # every move of a roadmap in memory is converted and encoded before the first one
+        compiled = None
+        if not isinstance(self.roadmap, RoadmapReader):
+            positions = self.axisPositions()
+            indexes = index_offset+(np.arange(len(positions)) if self.roadmap_indexes is None else np.asarray(self.roadmap_indexes))
+            compiled = self.mControl.compileRoadmap(positions[~np.isin(indexes, list(skip))], dict(aSpeeds))
+        nbMoves = 0
+        pool = None
+        if self.processFunc is not None:
+            pool = (ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor)(max_workers=self.workers)
+        # processings not finished, oldest first
+        pending = deque()
+        if self.sink and self.journal:
+            # journaled once its measurement is written, a resumed run doesn't skip measurements lost in a crash
+            self.sink.written_callbacks = [self.journalRows]
+        try:
+            for idxPlace,place in enumerate(self.roadmap):
+                index = index_offset+(idxPlace if self.roadmap_indexes is None else int(self.roadmap_indexes[idxPlace]))
+                if index in skip:
+                    continue
+                aVals = { self.axis[i]:float(place[i]) for i in range(len(self.axis)) }
+
+                # print("position:",aVals)
+                # print("speeds:",aSpeeds)
+                logger.debug(f"position : {aVals}")
+                logger.debug(f"speeds : {aSpeeds}")
+                tSent = time.monotonic()
+                if compiled is None:
+                    move = self.mControl.absMove(aVals,aSpeeds)
+                elif self.program_segment:
+                    move = self.mControl.programMove(compiled, nbMoves, self.program_segment, timeout=self.point_timeout)
+                else:
+                    move = self.mControl.compiledMove(compiled, nbMoves)
+                nbMoves += 1
+                # print(f"command executed: {move.command}")
+                logger.debug(f"move at {aVals}")
+                # wait for the end of the movement, raise the movement error if any
+                try:
+                    move.result(timeout=self.point_timeout)
+                except FutureTimeoutError:
+                    if move.done():
+                        # timeout of the move itself (program wait point), already stopped
+                        raise
+                    # stopped, position values are read from the controller instead of set to the unreached position
+                    self.mControl.abandon(move)
+                    try:
+                        move.result(timeout=self.point_timeout)
+                    except Exception as e:
+                        logger.debug(f"abandoned move ended with {e!r}")
+                    raise TimeoutError(f"!! ERROR !! position {index} not reached after {self.point_timeout}s, controller stopped")
+                t_arrived = time.time()
+                # settle time counted from the end of the movement, not from the wake up of this thread
+                tReady = move.end_time+self.settle_time
+                remaining = tReady-time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                tMeasure = time.monotonic()
+                self.overheads.append(tMeasure-tReady)
+                # print("start measurement")
+                logger.debug("execute callback")
+                data = measurementFunc(place,*args,**kwargs)
+                self.progress.update(move.end_time-tSent, tMeasure-move.end_time, time.monotonic()-tMeasure)
+                if self.sink:
+                    self.sink.add(index, [ aVals[oneAxis] for oneAxis in self.axis ], t_arrived, time.time(), data)
+                if self.journal and not self.sink:
+                    self.journal.append(index, [ aVals[oneAxis] for oneAxis in self.axis ])
+
+                if pool:
+                    # processed during the next movements
+                    pending.append(pool.submit(self.processFunc, place, data))
+                    while pending and (len(pending) > self.max_in_flight or pending[0].done()):
+                        self.results.append(pending.popleft().result())
+                self.notifyProgress()
+
+            while pending:
+                self.results.append(pending.popleft().result())
+            if self.overheads:
+                logger.info(f"measurement overhead after each move: {self.runStatistics()}")
+            self.notifyProgress(force=True)
+        finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+            # last rows written, and journaled, before closing the journal
+            if self.sink:
+                self.sink.close()
+                self.sink.written_callbacks = []
+            if self.journal:
+                self.journal.close()
 
         logger.info("MoveAndMeasure run ended")
+        return self.results
 
     def saveSettings(self, platines: dict = None, controller: str = None, port: str = None):
         """
@@ -142,4 +765,8 @@ class MoveAndMeasure:
         """
         Close and quit the ModelControl
         """
+        if self.journal:
+            self.journal.close()
+        if self.sink:
+            self.sink.close()
         self.mControl.quit()
\ No newline at end of file
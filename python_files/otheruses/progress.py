@@ -0,0 +1,103 @@
+import time
+from threading import Lock
+from collections import deque
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RunProgress:
+    """
+    Progress of a run, updated by the run loop after each position and read from any thread with snapshot().
+
+    Durations are moving averages over the last window positions. The ETA is the movement time of the remaining
+    positions given by a kinematic model (time of each movement, see python_files.otheruses.roadmap.segmentTimes),
+    corrected by the ratio between measured and modeled movement times, plus the average settle and measurement
+    times for each remaining position.
+
+    Attributes :
+    - total (int) : number of positions of the run, None if unknown (streamed roadmap).
+    - completed (int) : number of positions done, skipped ones included.
+    - window (int) : number of positions of the moving averages.
+    """
+    def __init__(self, total: int = None, segment_times = None, completed: int = 0, window: int = 20):
+        """
+        :param total: *(Optional)* number of positions of the run, None if unknown.
+        :type total: int
+        :param segment_times: *(Optional)* modeled time of the movement to each position still to do, in run order (s). No ETA if not given.
+        :type segment_times: numpy.ndarray
+        :param completed: *(Optional)* number of positions already done, like positions skipped by a resumed run.
+        :type completed: int
+        :param window: *(Optional)* number of positions of the moving averages.
+        :type window: int
+        """
+        self.total = total
+        self.completed = completed
+        self.window = window
+        self._lock = Lock()
+        # remaining modeled movement time after each position, O(1) lookup in update
+        self.remaining_model = None
+        if segment_times is not None:
+            segment_times = np.asarray(segment_times, dtype=np.float64)
+            self.remaining_model = np.concatenate([np.cumsum(segment_times[::-1])[::-1], [0.]])
+        self.done_in_run = 0
+        self.move_times = deque(maxlen=window)
+        self.settle_times = deque(maxlen=window)
+        self.measure_times = deque(maxlen=window)
+        self.model_time = 0.
+        self.measured_move_time = 0.
+        self.start_time = time.monotonic()
+        self.last_time = self.start_time
+
+    def update(self, move_time: float, settle_time: float, measure_time: float):
+        """
+        Record a position done.
+
+        :param move_time: duration of the movement (s)
+        :type move_time: float
+        :param settle_time: time between the end of the movement and the start of the measurement (s)
+        :type settle_time: float
+        :param measure_time: duration of the measurement (s)
+        :type measure_time: float
+        """
+        with self._lock:
+            if self.remaining_model is not None and self.done_in_run < len(self.remaining_model)-1:
+                self.model_time += self.remaining_model[self.done_in_run]-self.remaining_model[self.done_in_run+1]
+            self.measured_move_time += move_time
+            self.done_in_run += 1
+            self.completed += 1
+            self.move_times.append(move_time)
+            self.settle_times.append(settle_time)
+            self.measure_times.append(measure_time)
+            self.last_time = time.monotonic()
+
+    def snapshot(self)-> dict:
+        """
+        :return: completed, total, averages move_time, settle_time and measure_time (s), points_per_minute,
+            elapsed (s) and eta (s, None if unknown).
+        :rtype: dict
+        """
+        with self._lock:
+            elapsed = time.monotonic()-self.start_time
+            moveTime = sum(self.move_times)/len(self.move_times) if self.move_times else None
+            settleTime = sum(self.settle_times)/len(self.settle_times) if self.settle_times else None
+            measureTime = sum(self.measure_times)/len(self.measure_times) if self.measure_times else None
+            pointsPerMinute = 60*self.done_in_run/elapsed if self.done_in_run and elapsed > 0 else None
+
+            eta = None
+            if self.remaining_model is not None and self.done_in_run:
+                remaining = len(self.remaining_model)-1-self.done_in_run
+                # speed of the real movements compared to the model (accelerations, communication)
+                ratio = self.measured_move_time/self.model_time if self.model_time > 0 else 1.
+                eta = max(0., float(ratio*self.remaining_model[min(self.done_in_run, len(self.remaining_model)-1)]
+                          + max(remaining, 0)*(settleTime+measureTime)))
+            return {
+                "completed": self.completed,
+                "total": self.total,
+                "move_time": moveTime,
+                "settle_time": settleTime,
+                "measure_time": measureTime,
+                "points_per_minute": pointsPerMinute,
+                "elapsed": elapsed,
+                "eta": eta
+            }
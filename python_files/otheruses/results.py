@@ -0,0 +1,184 @@
+import os
+import glob
+from threading import Thread
+from queue import Queue
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ResultsSink:
+    """
+    Store measurements of a run by columns in chunk files, written by a background thread.
+
+    Each measurement is a row of columns :
+    - index : index of the position in the roadmap file.
+    - position : position values commanded (mm), one column per axis.
+    - t_arrived : time.time() at the end of the movement.
+    - t_measured : time.time() at the end of the measurement.
+    - payload : value returned by the measurement function, stacked as an array if every payload of a chunk
+      has the same shape, else stored as objects.
+
+    Rows are written by batches of batch_size in chunk_<number>.npz files of the directory, so writing a row
+    costs the same at the start and at the end of a run. Use ResultsSink.read(directory) to load them.
+
+    Attributes :
+    - directory (str) : folder of the chunk files.
+    - batch_size (int) : number of rows of each chunk file.
+    - nb_chunks (int) : number of chunk files in the directory.
+    - written_callbacks (list) : functions called by the writing thread with the rows of each chunk written,
+      as tuples (index, position, t_arrived, t_measured, payload).
+    """
+    CHUNK_NAME = "chunk_{:06d}.npz"
+
+    def __init__(self, directory: str, nb_axis: int, batch_size: int = 1000):
+        """
+        :param directory: folder of the chunk files, created if needed
+        :type directory: str
+        :param nb_axis: number of position values of each row
+        :type nb_axis: int
+        :param batch_size: *(Optional)* number of rows of each chunk file
+        :type batch_size: int
+        """
+        self.directory = directory
+        self.nb_axis = nb_axis
+        self.batch_size = batch_size
+        self.nb_chunks = 0
+        self.queue = None
+        self.writer = None
+        self.error = None
+        self.written_callbacks: list = []
+
+    def start(self, clear: bool = True):
+        """
+        Start the writing thread.
+
+        :param clear: *(Optional)* remove chunk files of a previous run, else new chunks are added after them.
+        :type clear: bool
+        """
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        chunks = self.chunkFiles(self.directory)
+        if clear:
+            for chunk in chunks:
+                os.remove(chunk)
+            chunks = []
+        self.nb_chunks = len(chunks)
+        self.error = None
+        self.queue = Queue()
+        self.writer = Thread(target=self.write, name="ResultsSinkWriter", daemon=True)
+        self.writer.start()
+
+    def add(self, index: int, position: list, t_arrived: float, t_measured: float, payload):
+        """
+        Add a row, written later by the writing thread.
+
+        :param index: index of the position in the roadmap file
+        :type index: int
+        :param position: position values commanded (mm)
+        :type position: list[float]
+        :param t_arrived: time.time() at the end of the movement
+        :type t_arrived: float
+        :param t_measured: time.time() at the end of the measurement
+        :type t_measured: float
+        :param payload: value returned by the measurement function
+        """
+        if self.error:
+            raise self.error
+        self.queue.put((index, position, t_arrived, t_measured, payload))
+
+    def write(self):
+        """
+        Writing thread, write a chunk each time batch_size rows are recieved and the last rows at close.
+        """
+        rows = []
+        while True:
+            row = self.queue.get()
+            if row is not None:
+                rows.append(row)
+            if rows and (row is None or len(rows) >= self.batch_size):
+                try:
+                    self.writeChunk(rows)
+                    for callback in self.written_callbacks:
+                        callback(rows)
+                except Exception as e:
+                    logger.warning(f"ResultsSink: chunk not written: {e}")
+                    self.error = e
+                rows = []
+            if row is None:
+                break
+
+    def writeChunk(self, rows: list):
+        """
+        Write rows as columns in a new chunk file.
+        """
+        index,position,t_arrived,t_measured,payload = zip(*rows)
+        columns = {
+            "index": np.array(index, dtype=np.int64),
+            "position": np.array(position, dtype=np.float64).reshape(len(rows), self.nb_axis),
+            "t_arrived": np.array(t_arrived, dtype=np.float64),
+            "t_measured": np.array(t_measured, dtype=np.float64)
+        }
+        try:
+            columns["payload"] = np.array(payload)
+            if columns["payload"].dtype == object:
+                raise ValueError("not stackable")
+        except ValueError:
+            # payloads of different shapes or types
+            columns["payload"] = np.empty(len(rows), dtype=object)
+            for idx,val in enumerate(payload):
+                columns["payload"][idx] = val
+
+        filepath = os.path.join(self.directory, self.CHUNK_NAME.format(self.nb_chunks))
+        # written under a temporary name, an interrupted write never leaves a broken chunk
+        with open(filepath+".tmp", "wb") as f:
+            np.savez(f, **columns)
+        os.replace(filepath+".tmp", filepath)
+        self.nb_chunks += 1
+        logger.debug(f"ResultsSink: {len(rows)} rows written in {filepath}")
+
+    def close(self):
+        """
+        Write the last rows and stop the writing thread.
+        """
+        if self.writer:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+            self.queue = None
+
+    @staticmethod
+    def chunkFiles(directory: str)-> list:
+        """
+        :return: chunk files of the directory, in writing order.
+        :rtype: list[str]
+        """
+        return sorted(glob.glob(os.path.join(directory, "chunk_*.npz")))
+
+    @staticmethod
+    def read(directory: str)-> dict:
+        """
+        Load every chunk of a directory.
+
+        :param directory: folder of the chunk files
+        :type directory: str
+        :return: columns index, position, t_arrived, t_measured and payload
+        :rtype: dict[str:numpy.ndarray]
+        """
+        chunks = []
+        for filepath in ResultsSink.chunkFiles(directory):
+            with np.load(filepath, allow_pickle=True) as data:
+                chunks.append({ key:data[key] for key in data.files })
+        if not chunks:
+            return {}
+        columns = {}
+        for key in chunks[0].keys():
+            try:
+                columns[key] = np.concatenate([ chunk[key] for chunk in chunks ])
+            except ValueError:
+                # payloads of different shapes between chunks
+                values = [ val for chunk in chunks for val in chunk[key] ]
+                columns[key] = np.empty(len(values), dtype=object)
+                for idx,val in enumerate(values):
+                    columns[key][idx] = val
+        return columns
@@ -0,0 +1,478 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RoadmapReader:
+    """
+    Positions of a roadmap file (csv or xlsx) read by chunks.
+
+    The file is formatted like the one of MoveAndMeasure.loadMoveSet : a header line with axis names,
+    a line with the platine of each axis, then one position per line.
+    Positions are read when iterating, every iteration reads the file again from its start.
+
+    Attributes :
+    - filepath (str) : path to the csv or xlsx file.
+    - chunk_size (int) : number of positions read at once.
+    - columns (list[str]) : names of the columns, from the header line.
+    - platines (list[str]) : platine names of each column.
+    """
+    def __init__(self, filepath: str, chunk_size: int = 10000):
+        """
+        :param filepath: absolute path to the csv or xlsx file
+        :type filepath: str
+        :param chunk_size: *(Optional)* number of positions read at once
+        :type chunk_size: int
+        """
+        if filepath[-3:] != "csv" and filepath[-4:] != "xlsx":
+            raise ValueError(f"!! ERROR !! roadmap file should be a csv or xlsx file, not {filepath}")
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.columns,self.platines = self.readHeader()
+
+    def readHeader(self)-> tuple:
+        """
+        Read only the header and platines lines.
+
+        :return: column names and platine names
+        :rtype: tuple[list[str],list[str]]
+        """
+        if self.filepath[-3:] == "csv":
+            df = pd.read_csv(self.filepath, nrows=1, dtype=str)
+        else:
+            df = pd.read_excel(self.filepath, nrows=1, dtype=str)
+        return list(df.columns),list(df.values[0])
+
+    def chunks(self):
+        """
+        Read positions by chunks.
+
+        :return: generator of positions arrays, shape is (chunk_size, number of columns), the last one can be smaller.
+        :rtype: generator[numpy.ndarray]
+        """
+        if self.filepath[-3:] == "csv":
+            # skip platines line, positions are parsed as float directly
+            with pd.read_csv(self.filepath, skiprows=[1], dtype=np.float64, chunksize=self.chunk_size) as reader:
+                for df in reader:
+                    yield df.to_numpy(dtype=np.float64)
+        else:
+            # openpyxl streams rows in read only mode, pandas reads the whole sheet
+            from openpyxl import load_workbook
+            workbook = load_workbook(self.filepath, read_only=True, data_only=True)
+            try:
+                rows = []
+                for row in workbook.active.iter_rows(min_row=3, max_col=len(self.columns), values_only=True):
+                    if all( val is None for val in row ):
+                        continue
+                    rows.append(row)
+                    if len(rows) == self.chunk_size:
+                        yield np.array(rows, dtype=np.float64)
+                        rows = []
+                if rows:
+                    yield np.array(rows, dtype=np.float64)
+            finally:
+                workbook.close()
+
+    def __iter__(self):
+        """
+        :return: generator of positions, one 1d array by line of the file.
+        :rtype: generator[numpy.ndarray]
+        """
+        for chunk in self.chunks():
+            yield from chunk
+
+    def toArray(self)-> np.ndarray:
+        """
+        :return: every position of the file in a single 2d array.
+        :rtype: numpy.ndarray
+        """
+        chunks = list(self.chunks())
+        if not chunks:
+            return np.empty((0,len(self.columns)), dtype=np.float64)
+        return np.concatenate(chunks)
+
+
+# Roadmaps generated as arrays, one position per line and one axis per column, unit is mm
+
+def axisValues(ranges: list)-> list:
+    """
+    :param ranges: (start, stop, number of positions) of each axis, stop is included.
+    :type ranges: list[tuple]
+    :return: positions of each axis
+    :rtype: list[numpy.ndarray]
+    """
+    return [ np.linspace(start, stop, int(nb)) for start,stop,nb in ranges ]
+
+def gridRoadmap(ranges: list)-> np.ndarray:
+    """
+    Rectangular grid, line by line : the first axis changes at each position, the last one at each plane.
+
+    :param ranges: (start, stop, number of positions) of each axis, stop is included. ex: [(0,10,11),(0,5,6)]
+    :type ranges: list[tuple]
+    :return: positions, shape is (number of positions, number of axis)
+    :rtype: numpy.ndarray
+    """
+    values = axisValues(ranges)
+    # last axis as the slowest one
+    mesh = np.meshgrid(*reversed(values), indexing="ij")
+    return np.stack([ axisMesh.ravel() for axisMesh in reversed(mesh) ], axis=1)
+
+def serpentineRoadmap(ranges: list)-> np.ndarray:
+    """
+    Rectangular grid like gridRoadmap, one line out of two is run through backwards.
+
+    :param ranges: (start, stop, number of positions) of each axis, stop is included. ex: [(0,10,11),(0,5,6)]
+    :type ranges: list[tuple]
+    :return: positions, shape is (number of positions, number of axis)
+    :rtype: numpy.ndarray
+    """
+    grid = gridRoadmap(ranges)
+    nbFirst = int(ranges[0][2])
+    lines = grid.reshape(-1, nbFirst, grid.shape[1])
+    lines[1::2] = lines[1::2,::-1]
+    return lines.reshape(-1, grid.shape[1])
+
+def spiralRoadmap(center: list, radius: float, pitch: float, step: float)-> np.ndarray:
+    """
+    Archimedean spiral on the first two axis, from the center to radius. Other axis stay at their center value.
+
+    :param center: center position of each axis
+    :type center: list[float]
+    :param radius: maximum distance to the center
+    :type radius: float
+    :param pitch: distance between two turns
+    :type pitch: float
+    :param step: distance between two positions along the spiral
+    :type step: float
+    :return: positions, shape is (number of positions, number of axis)
+    :rtype: numpy.ndarray
+    """
+    # arc length from the center is about pitch*angle**2/(4*pi)
+    maxAngle = 2*np.pi*radius/pitch
+    length = pitch*maxAngle**2/(4*np.pi)
+    angles = np.sqrt(4*np.pi*np.arange(0, length+step/2, step)/pitch)
+    radii = pitch*angles/(2*np.pi)
+    positions = np.tile(np.asarray(center, dtype=np.float64), (len(angles),1))
+    positions[:,0] += radii*np.cos(angles)
+    positions[:,1] += radii*np.sin(angles)
+    return positions
+
+def polarRoadmap(center: list, radii: list, nb_angles: int)-> np.ndarray:
+    """
+    Circles around the center on the first two axis, nb_angles positions per circle. Other axis stay at their center value.
+
+    :param center: center position of each axis
+    :type center: list[float]
+    :param radii: radius of each circle, a radius of 0 is a single position at the center
+    :type radii: list[float]
+    :param nb_angles: number of positions on each circle
+    :type nb_angles: int
+    :return: positions, shape is (number of positions, number of axis)
+    :rtype: numpy.ndarray
+    """
+    radii = np.asarray(radii, dtype=np.float64)
+    angles = np.linspace(0, 2*np.pi, nb_angles, endpoint=False)
+    circles = radii[radii > 0]
+    rs = np.repeat(circles, nb_angles)
+    ts = np.tile(angles, len(circles))
+    if np.any(radii == 0):
+        rs = np.concatenate([[0.], rs])
+        ts = np.concatenate([[0.], ts])
+    positions = np.tile(np.asarray(center, dtype=np.float64), (len(rs),1))
+    positions[:,0] += rs*np.cos(ts)
+    positions[:,1] += rs*np.sin(ts)
+    return positions
+
+def latinHypercubeRoadmap(lows: list, highs: list, nb_points: int, seed: int = None)-> np.ndarray:
+    """
+    Latin hypercube sampling : each axis range is cut in nb_points intervals, each interval holds one position.
+
+    :param lows: minimum value of each axis
+    :type lows: list[float]
+    :param highs: maximum value of each axis
+    :type highs: list[float]
+    :param nb_points: number of positions
+    :type nb_points: int
+    :param seed: *(Optional)* seed of the random generator, to get the same positions again.
+    :type seed: int
+    :return: positions, shape is (number of positions, number of axis)
+    :rtype: numpy.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    lows = np.asarray(lows, dtype=np.float64)
+    highs = np.asarray(highs, dtype=np.float64)
+    # one random interval per position for each axis, random place in the interval
+    intervals = rng.permuted(np.tile(np.arange(nb_points), (len(lows),1)), axis=1).T
+    samples = (intervals+rng.random((nb_points,len(lows))))/nb_points
+    return lows+samples*(highs-lows)
+
+def flyLines(ranges: list, serpentine: bool = True)-> np.ndarray:
+    """
+    Lines along the first axis of a rectangular grid, for a continuous movement scan (MoveAndMeasure.flyScan).
+
+    :param ranges: (start, stop, number of positions) of each axis, stop is included. The number of positions of the first axis is not used.
+    :type ranges: list[tuple]
+    :param serpentine: *(Optional)* one line out of two goes from stop to start.
+    :type serpentine: bool
+    :return: start and end position of each line, shape is (number of lines, 2, number of axis)
+    :rtype: numpy.ndarray
+    """
+    first = ranges[0]
+    others = gridRoadmap(ranges[1:]) if len(ranges) > 1 else np.empty((1,0))
+    lines = np.empty((len(others), 2, len(ranges)))
+    lines[:,0,0] = first[0]
+    lines[:,1,0] = first[1]
+    lines[:,:,1:] = others[:,np.newaxis,:]
+    if serpentine:
+        lines[1::2] = lines[1::2,::-1]
+    return lines
+
+def gridCells(ranges: list)-> tuple:
+    """
+    Cells of a rectangular grid, each one between 2 consecutive positions on every axis.
+
+    :param ranges: (start, stop, number of positions) of each axis, stop is included. At least 2 positions per axis.
+    :type ranges: list[tuple]
+    :return: lowest corner of each cell, shape is (number of cells, number of axis), and size of the cells on each axis
+    :rtype: tuple[numpy.ndarray,numpy.ndarray]
+    """
+    size = np.array([ (stop-start)/(int(nb)-1) for start,stop,nb in ranges ])
+    lows = gridRoadmap([ (start, stop-step, int(nb)-1) for (start,stop,nb),step in zip(ranges,size) ])
+    return lows,size
+
+def cellPoints(lows: np.ndarray, size: np.ndarray, factor: int = 1)-> np.ndarray:
+    """
+    Positions of a grid in each cell, corners included.
+
+    :param lows: lowest corner of each cell, shape is (number of cells, number of axis)
+    :type lows: numpy.ndarray
+    :param size: size of the cells on each axis
+    :type size: numpy.ndarray
+    :param factor: *(Optional)* number of intervals of the grid on each axis of a cell, 1 for the corners only.
+    :type factor: int
+    :return: positions of each cell, shape is (number of cells, (factor+1)**number of axis, number of axis)
+    :rtype: numpy.ndarray
+    """
+    offsets = gridRoadmap([ (0, 1, factor+1) ]*lows.shape[1])
+    return lows[:,np.newaxis,:]+offsets[np.newaxis,:,:]*size
+
+def splitCells(lows: np.ndarray, size: np.ndarray, factor: int = 2)-> tuple:
+    """
+    Split each cell in factor parts on each axis.
+
+    :return: lowest corner of each new cell and size of the new cells
+    :rtype: tuple[numpy.ndarray,numpy.ndarray]
+    """
+    subSize = size/factor
+    offsets = gridRoadmap([ (0, factor-1, factor) ]*lows.shape[1])*subSize
+    return (lows[:,np.newaxis,:]+offsets[np.newaxis,:,:]).reshape(-1, lows.shape[1]),subSize
+
+def positionKey(position, decimals: int = 9)-> tuple:
+    """
+    :return: hashable value of a position, equal for positions equal up to decimals.
+    :rtype: tuple
+    """
+    return tuple(np.round(np.asarray(position, dtype=np.float64), decimals)+0.)
+
+
+# Ordering of the positions of a roadmap
+ORDER_MODES = ("keep","serpentine","nearest")
+
+def segmentTimes(positions: np.ndarray, speeds: np.ndarray, start: np.ndarray = None)-> np.ndarray:
+    """
+    Time of each movement between consecutive positions, axis moving at the same time at their own speed.
+
+    :param positions: positions to go through, shape is (number of positions, number of axis). Unit is mm
+    :type positions: numpy.ndarray
+    :param speeds: speed of each axis. Unit is mm/s
+    :type speeds: numpy.ndarray
+    :param start: *(Optional)* position before the first one, no movement to the first position if not given.
+    :type start: numpy.ndarray
+    :return: time of each movement (s)
+    :rtype: numpy.ndarray
+    """
+    if start is not None:
+        positions = np.vstack([start, positions])
+    return np.max(np.abs(np.diff(positions, axis=0))/speeds, axis=1, initial=0)
+
+def pathTime(positions: np.ndarray, speeds: np.ndarray, start: np.ndarray = None)-> float:
+    """
+    :return: time to go through every positions (s), see segmentTimes.
+    :rtype: float
+    """
+    return float(np.sum(segmentTimes(positions, speeds, start)))
+
+def serpentineOrder(positions: np.ndarray, fast_axis: int = None)-> np.ndarray:
+    """
+    Order positions by rows, one row out of two is run through backwards to avoid going back to the start of the row.
+
+    :param positions: positions, shape is (number of positions, number of axis)
+    :type positions: numpy.ndarray
+    :param fast_axis: *(Optional)* index of the axis along the rows, the one changing the most often in the file if not given.
+    :type fast_axis: int
+    :return: indexes of the positions in their new order
+    :rtype: numpy.ndarray
+    """
+    if len(positions) < 2:
+        return np.arange(len(positions))
+    if fast_axis is None:
+        fast_axis = int(np.argmax(np.count_nonzero(np.diff(positions, axis=0), axis=0)))
+    others = [ idx for idx in range(positions.shape[1]) if idx != fast_axis ]
+
+    # rows sorted by other axis, positions in a row sorted by fast axis (lexsort primary key is the last one)
+    order = np.lexsort([positions[:,fast_axis]] + [ positions[:,idx] for idx in reversed(others) ])
+    rows = positions[order][:,others]
+    rowIds = np.concatenate([[0], np.cumsum(np.any(np.diff(rows, axis=0) != 0, axis=1))])
+    # odd rows backwards
+    direction = np.where(rowIds % 2 == 1, -1, 1)
+    return order[np.lexsort([direction*positions[order,fast_axis], rowIds])]
+
+def nearestOrder(positions: np.ndarray, speeds: np.ndarray, start: np.ndarray = None)-> np.ndarray:
+    """
+    Order positions by always going to the closest one in time (nearest neighbour).
+
+    :param positions: positions, shape is (number of positions, number of axis). Unit is mm
+    :type positions: numpy.ndarray
+    :param speeds: speed of each axis. Unit is mm/s
+    :type speeds: numpy.ndarray
+    :param start: *(Optional)* position before the first one, first position of the roadmap if not given.
+    :type start: numpy.ndarray
+    :return: indexes of the positions in their new order
+    :rtype: numpy.ndarray
+    """
+    nb = len(positions)
+    visited = np.zeros(nb, dtype=bool)
+    order = np.empty(nb, dtype=np.intp)
+    current = positions[0] if start is None else start
+    for idx in range(nb):
+        times = np.max(np.abs(positions-current)/speeds, axis=1)
+        times[visited] = np.inf
+        nearest = int(np.argmin(times))
+        order[idx] = nearest
+        visited[nearest] = True
+        current = positions[nearest]
+    return order
+
+def stripOrder(positions: np.ndarray, speeds: np.ndarray, cell_points: float = 3)-> np.ndarray:
+    """
+    Order positions by strips along the axis with the largest extent in time, one strip out of two backwards (strip heuristic).
+    Strips are cells of about cell_points positions on the other axis, see serpentineOrder. Sorting only, for large roadmaps.
+
+    :param positions: positions, shape is (number of positions, number of axis). Unit is mm
+    :type positions: numpy.ndarray
+    :param speeds: speed of each axis. Unit is mm/s
+    :type speeds: numpy.ndarray
+    :param cell_points: *(Optional)* average number of positions of a square cell, sets the width of the strips.
+    :type cell_points: float
+    :return: indexes of the positions in their new order
+    :rtype: numpy.ndarray
+    """
+    nb = len(positions)
+    # in time units, a movement takes the largest of the axis times
+    scaled = positions/speeds
+    lows = scaled.min(axis=0, initial=np.inf) if nb else np.zeros(positions.shape[1])
+    extents = scaled.max(axis=0, initial=-np.inf)-lows if nb else np.zeros(positions.shape[1])
+    active = extents > 0
+    if nb < 2 or not active.any():
+        return np.arange(nb)
+    width = (np.prod(extents[active])*cell_points/nb)**(1/np.count_nonzero(active))
+    fast_axis = int(np.argmax(extents))
+    strips = np.floor((scaled-lows)/width)
+    strips[:,fast_axis] = scaled[:,fast_axis]
+    return serpentineOrder(strips, fast_axis=fast_axis)
+
+def twoOpt(positions: np.ndarray, order: np.ndarray, speeds: np.ndarray, start: np.ndarray = None, max_passes: int = 10)-> np.ndarray:
+    """
+    Improve an order by reversing parts of the path while it reduces the movement time (2-opt).
+    The path is open : its start is kept and it does not come back to it.
+
+    :param positions: positions, shape is (number of positions, number of axis). Unit is mm
+    :type positions: numpy.ndarray
+    :param order: indexes of the positions to improve
+    :type order: numpy.ndarray
+    :param speeds: speed of each axis. Unit is mm/s
+    :type speeds: numpy.ndarray
+    :param start: *(Optional)* position before the first one, first position of order is kept first if not given.
+    :type start: numpy.ndarray
+    :param max_passes: *(Optional)* maximum number of times the whole path is checked.
+    :type max_passes: int
+    :return: indexes of the positions in their new order
+    :rtype: numpy.ndarray
+    """
+    # route[0] is fixed
+    points = positions if start is None else np.vstack([start, positions])
+    route = np.array(order) if start is None else np.concatenate([[0], np.asarray(order)+1])
+    nb = len(route)
+
+    def times(a, b):
+        return np.max(np.abs(a-b)/speeds, axis=-1)
+
+    for idxPass in range(max_passes):
+        improved = False
+        for i in range(1, nb-1):
+            # reverse route[i:j+1] for every j > i
+            a = points[route[i-1]]
+            b = points[route[i]]
+            c = points[route[i+1:]]
+            d = points[route[i+2:]]
+            removed = times(a,b) + np.append(times(c[:-1],d), 0)
+            added = times(a,c) + np.append(times(b,d), 0)
+            gains = removed-added
+            k = int(np.argmax(gains))
+            if gains[k] > 1e-9:
+                j = i+1+k
+                route[i:j+1] = route[i:j+1][::-1]
+                improved = True
+        if not improved:
+            break
+    return route if start is None else route[1:]-1
+
+def orderRoadmap(positions: np.ndarray, speeds: np.ndarray, mode: str = "nearest", start: np.ndarray = None, two_opt_limit: int = 2000, nearest_limit: int = 5000)-> tuple:
+    """
+    Reorder positions to reduce the total movement time.
+
+    :param positions: positions, shape is (number of positions, number of axis). Unit is mm
+    :type positions: numpy.ndarray
+    :param speeds: speed of each axis. Unit is mm/s
+    :type speeds: numpy.ndarray
+    :param mode: *(Optional)* "keep" the file order, "serpentine" by rows, or "nearest" neighbour improved by 2-opt.
+    :type mode: str
+    :param start: *(Optional)* current position, before the first one.
+    :type start: numpy.ndarray
+    :param two_opt_limit: *(Optional)* 2-opt is skipped above this number of positions, it takes number of positions squared operations.
+    :type two_opt_limit: int
+    :param nearest_limit: *(Optional)* above this number of positions, "nearest" takes the fastest of stripOrder and serpentineOrder
+        instead of the nearest neighbour, which takes number of positions squared operations too.
+    :type nearest_limit: int
+    :return: indexes of the positions in their new order, estimated time in file order and in the new order (s)
+    :rtype: tuple[numpy.ndarray,float,float]
+    """
+    if mode not in ORDER_MODES:
+        raise ValueError(f"!! ERROR !! unknown order mode {mode}, should be one of {ORDER_MODES}")
+    positions = np.asarray(positions, dtype=np.float64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    if start is not None:
+        start = np.asarray(start, dtype=np.float64)
+
+    if mode == "serpentine":
+        order = serpentineOrder(positions)
+    elif mode == "nearest" and len(positions) > nearest_limit:
+        logger.info(f"{len(positions)} positions, strips used instead of nearest neighbour (limit is {nearest_limit})")
+        candidates = [ stripOrder(positions, speeds), serpentineOrder(positions) ]
+        order = min(candidates, key=lambda candidate: pathTime(positions[candidate], speeds, start))
+    elif mode == "nearest" and len(positions) > 0:
+        order = nearestOrder(positions, speeds, start)
+        if len(positions) <= two_opt_limit:
+            order = twoOpt(positions, order, speeds, start)
+        else:
+            logger.info(f"{len(positions)} positions, 2-opt skipped (limit is {two_opt_limit})")
+    else:
+        order = np.arange(len(positions))
+
+    before = pathTime(positions, speeds, start)
+    after = pathTime(positions[order], speeds, start)
+    # keep file order if nothing is gained
+    if after > before:
+        order,after = np.arange(len(positions)),before
+    return order,before,after
@@ -168,7 +168,7 @@ class UiConsole:
         }
 
         idx = 1
-        for onePort in self.mSettings.portsData.values():
+        for onePort in self.mSettings.waitPorts().values():
             print("CREATING",onePort)
             # add decoration to display on the current platine
             prefix = ""
@@ -0,0 +1,376 @@
+import os
+import tty
+import select
+import time
+from threading import Thread,Lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CSeriesSimulator(Thread):
+    """
+    C-series controller simulated behind a pseudo-terminal, only available on posix platforms.
+
+    Open a SerialConnection on the port attribute to talk to it. Understood commands :
+    - @0<n> : axis definition, 1 (X), 3 (XY) or 7 (XYZ).
+    - @0a x,vx[,y,vy[,z,vz]] : relative move in steps at speeds in step/s of the defined axis.
+    - @0R<n> : go to home (position 0) on axis of the mask n, at home_speed.
+    - @0n<n> : set current position as home on axis of the mask n.
+    - @0P : position of the 3 axis, answered as "0" followed by 6 hexadecimal characters per axis.
+    - 0xFF byte : stop the current movement.
+    - @0i : store the next lines as a program until a line "9". Program lines are "0" followed by distance,speed
+      of each defined axis (relative move), or "W" (wait point : send "S", then wait for @0S).
+    - @0S : start the stored program, or continue it after a wait point.
+    - @0H : pause the program after its current line.
+
+    Every command is acknowledged with "0", or an error character : "4" if no axis is defined, "5" for a syntax error.
+    Transmission time of each character at baudrate is simulated in both directions.
+
+    Attributes:
+        - port: str, name of the pseudo-terminal to connect to.
+        - baudrate: int, simulated transmission speed, unit is baud/s.
+        - ack_after_move: bool, acknowledge a movement when it is finished instead of when it starts.
+        - nb_axis_defined: int, number of axis defined by the last axis definition command, 0 if none.
+        - commands: list of commands recieved.
+        - program: list of the stored program lines.
+    """
+    ACK = b"0"
+    ERR_NO_AXIS = b"4"
+    ERR_SYNTAX = b"5"
+    STOP = 255
+    SYNC = b"S"
+    axisMasks = { 1:[0], 2:[1], 3:[0,1], 4:[2], 5:[0,2], 6:[1,2], 7:[0,1,2] }
+
+    def __init__(self, baudrate: int = 9600, ack_after_move: bool = False, home_speed: float = 10000):
+        """
+        :param baudrate: simulated transmission speed, unit is baud/s.
+        :type baudrate: int
+        :param ack_after_move: *(Optional)* acknowledge a movement when it is finished instead of when it starts.
+        :type ack_after_move: bool
+        :param home_speed: *(Optional)* speed of the go to home movement, unit is step/s.
+        :type home_speed: float | int
+        """
+        Thread.__init__(self, daemon=True)
+        self.name = "CSeriesSimulator"
+        self.baudrate = baudrate
+        self.ack_after_move = ack_after_move
+        self.home_speed = home_speed
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port: str = os.ttyname(self.slave)
+
+        self.buffer = bytearray()
+        self.killed = False
+        self.nb_axis_defined = 0
+        self.commands: list = []
+        self._write_lock = Lock()
+
+        # Stored program
+        self.programming = False
+        self.program: list = []
+        self.program_line = 0
+        self.program_paused = False
+        self.program_thread: Thread = None
+
+        # Motion of each axis, position(t) = start + direction*min(distance, speed*(t-start_time))
+        self._lock = Lock()
+        self.start_positions = [0,0,0]
+        self.targets = [0,0,0]
+        self.speeds = [0,0,0]
+        self.start_time = time.monotonic()
+
+    def run(self):
+        """
+        Read and execute commands until killed.
+        """
+        logger.info(f"C-series simulator listening on {self.port} at {self.baudrate} baud/s")
+        while not self.killed:
+            readable,_,_ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            # reception time of the bytes
+            self.transmit(len(data))
+            self.buffer.extend(data)
+            self.parseBuffer()
+        logger.debug(f"{self.name} has been killed.")
+
+    def parseBuffer(self):
+        """
+        Execute every complete command in the buffer.
+        """
+        while self.buffer:
+            # separators between commands
+            if self.buffer[0] in b"\r\n ":
+                del self.buffer[0]
+                continue
+            if self.buffer[0] == self.STOP:
+                del self.buffer[0]
+                self.execute(bytes([self.STOP]))
+                continue
+            if self.programming and self.buffer[0:1] != b"@":
+                # program line, until its terminator
+                end = min([ idx for idx in (self.buffer.find(b"\r"), self.buffer.find(b"\n")) if idx >= 0 ], default=-1)
+                if end < 0:
+                    return
+                line = bytes(self.buffer[:end])
+                del self.buffer[:end]
+                self.commands.append(line)
+                self.programLine(line)
+                continue
+            if self.buffer[0:1] != b"@":
+                # not a command, drop until the next one
+                end = self.buffer.find(b"@")
+                logger.warning(f"simulator dropped {bytes(self.buffer[:end if end >= 0 else len(self.buffer)])}")
+                del self.buffer[:end if end >= 0 else len(self.buffer)]
+                self.reply(self.ERR_SYNTAX)
+                continue
+            if len(self.buffer) < 3:
+                return
+            code = self.buffer[2:3]
+            if code in b"Rn":
+                # one digit mask, terminator optional
+                if len(self.buffer) < 4:
+                    return
+                end = 4
+            elif code == b"P":
+                end = 3
+            else:
+                end = min([ idx for idx in (self.buffer.find(b"\r"), self.buffer.find(b"\n")) if idx >= 0 ], default=-1)
+                if end < 0:
+                    return
+            cmd = bytes(self.buffer[:end])
+            del self.buffer[:end]
+            self.execute(cmd)
+
+    def execute(self, cmd: bytes):
+        """
+        Execute a single command and answer it.
+
+        :param cmd: command without its terminator
+        :type cmd: bytes
+        """
+        self.commands.append(cmd)
+        logger.debug(f"simulator recieved {cmd}")
+        if cmd == bytes([self.STOP]):
+            self.program_paused = True
+            self.stop()
+            self.reply(self.ACK)
+            return
+
+        code = cmd[2:3]
+        args = cmd[3:].strip()
+        try:
+            if code == b"a":
+                self.moveCmd(args)
+                return
+            elif code == b"R":
+                self.homeCmd(int(args))
+            elif code == b"n":
+                self.setHomeCmd(int(args))
+            elif code == b"P":
+                self.reply(self.ACK+b"".join( b"%06X" % (pos & 0xFFFFFF) for pos in self.position() ))
+                return
+            elif code == b"i":
+                self.programming = True
+                self.program = []
+                self.program_line = 0
+            elif code == b"S":
+                self.reply(self.ACK)
+                self.runProgram()
+                return
+            elif code == b"H":
+                self.program_paused = True
+            elif code.isdigit():
+                self.nb_axis_defined = len(self.axisMasks[int(cmd[2:])])
+            else:
+                raise ValueError(f"unknown command {cmd}")
+        except (ValueError, KeyError) as e:
+            logger.warning(f"simulator syntax error: {e}")
+            self.reply(self.ERR_SYNTAX)
+            return
+        self.reply(self.ACK)
+
+    def moveCmd(self, args: bytes):
+        """
+        Start a relative movement of the defined axis, and acknowledge it.
+
+        :param args: distance and speed of each defined axis, like b"100,500,-20,300"
+        :type args: bytes
+        """
+        if self.nb_axis_defined == 0:
+            self.reply(self.ERR_NO_AXIS)
+            return
+        values = [ int(val) for val in args.split(b",") ]
+        if len(values) != 2*self.nb_axis_defined:
+            raise ValueError(f"{len(values)} values for {self.nb_axis_defined} axis")
+        moves = { idxAxis:(values[2*idxAxis],values[2*idxAxis+1]) for idxAxis in range(self.nb_axis_defined) }
+        duration = self.startMove(moves)
+        if self.ack_after_move:
+            time.sleep(duration)
+        self.reply(self.ACK)
+
+    def programLine(self, line: bytes):
+        """
+        Store a line of the program being recieved, and acknowledge it.
+
+        :param line: program line without its terminator
+        :type line: bytes
+        """
+        line = line.strip()
+        if line == b"9":
+            self.programming = False
+            logger.debug(f"simulator stored a program of {len(self.program)} lines")
+        elif line == b"W":
+            self.program.append(("wait",None))
+        elif line[:1] == b"0":
+            try:
+                values = [ int(val) for val in line[1:].split(b",") ]
+            except ValueError:
+                self.reply(self.ERR_SYNTAX)
+                return
+            if self.nb_axis_defined == 0 or len(values) != 2*self.nb_axis_defined:
+                self.reply(self.ERR_SYNTAX)
+                return
+            self.program.append(("move",{ idxAxis:(values[2*idxAxis],values[2*idxAxis+1]) for idxAxis in range(self.nb_axis_defined) }))
+        else:
+            self.reply(self.ERR_SYNTAX)
+            return
+        self.reply(self.ACK)
+
+    def runProgram(self):
+        """
+        Execute the program from its current line, in a thread, until a wait point, a pause or its end.
+        """
+        if self.program_thread and self.program_thread.is_alive():
+            return
+        self.program_paused = False
+        self.program_thread = Thread(target=self.executeProgram, name="CSeriesSimulatorProgram", daemon=True)
+        self.program_thread.start()
+
+    def executeProgram(self):
+        """
+        Program execution, moves are done one after another.
+        """
+        while self.program_line < len(self.program) and not self.program_paused and not self.killed:
+            kind,moves = self.program[self.program_line]
+            self.program_line += 1
+            if kind == "move":
+                time.sleep(self.startMove(moves))
+            elif kind == "wait":
+                self.reply(self.SYNC)
+                return
+        if self.program_line >= len(self.program):
+            # next start executes the program from its first line
+            self.program_line = 0
+
+    def homeCmd(self, mask: int):
+        """
+        Start a movement to position 0 of axis in mask.
+        """
+        current = self.position()
+        duration = self.startMove({ idxAxis:(-current[idxAxis],self.home_speed) for idxAxis in self.axisMasks[mask] })
+        if self.ack_after_move:
+            time.sleep(duration)
+
+    def setHomeCmd(self, mask: int):
+        """
+        Set current position of axis in mask as position 0.
+        """
+        current = self.position()
+        with self._lock:
+            for idxAxis in self.axisMasks[mask]:
+                self.start_positions[idxAxis] -= current[idxAxis]
+                self.targets[idxAxis] -= current[idxAxis]
+
+    def startMove(self, moves: dict)-> float:
+        """
+        Start the movement of axis from their current position.
+
+        :param moves: distance (step) and speed (step/s) by axis index, like { 0: (100,500) }
+        :type moves: dict[int:tuple]
+        :return: duration of the movement (s)
+        :rtype: float
+        """
+        current = self.position()
+        duration = 0
+        with self._lock:
+            self.start_positions = current
+            self.targets = list(current)
+            self.speeds = [0,0,0]
+            for idxAxis,(dist,speed) in moves.items():
+                self.targets[idxAxis] = current[idxAxis]+dist
+                self.speeds[idxAxis] = abs(speed)
+                if dist != 0:
+                    duration = max(duration, abs(dist)/abs(speed) if speed else float("inf"))
+            self.start_time = time.monotonic()
+        return duration
+
+    def stop(self):
+        """
+        Stop every axis at its current position.
+        """
+        current = self.position()
+        with self._lock:
+            self.start_positions = current
+            self.targets = list(current)
+
+    def position(self)-> list:
+        """
+        :return: current position of the 3 axis (step)
+        :rtype: list[int]
+        """
+        with self._lock:
+            elapsed = time.monotonic()-self.start_time
+            positions = []
+            for start,target,speed in zip(self.start_positions,self.targets,self.speeds):
+                dist = target-start
+                done = min(abs(dist), speed*elapsed)
+                positions.append(int(round(start+(done if dist >= 0 else -done))))
+            return positions
+
+    def isMoving(self)-> bool:
+        """
+        :return: If an axis is not on its target.
+        :rtype: bool
+        """
+        return self.position() != self.targets
+
+    def transmit(self, nb_bytes: int):
+        """
+        Wait the time needed to transmit nb_bytes at baudrate, 10 bits per byte.
+        """
+        time.sleep(nb_bytes*10/self.baudrate)
+
+    def reply(self, data: bytes):
+        """
+        Send an answer to the host after its transmission time.
+        """
+        with self._write_lock:
+            self.transmit(len(data))
+            os.write(self.master, data)
+
+    def kill(self):
+        """
+        Stop listening and close the pseudo-terminal.
+        """
+        self.killed = True
+        if self.is_alive():
+            self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+if __name__ == "__main__":
+    print("start simulator")
+    logging.basicConfig(level=logging.DEBUG)
+
+    sim = CSeriesSimulator()
+    sim.start()
+    print(f"connect to {sim.port}, enter to quit")
+    input()
+    sim.kill()
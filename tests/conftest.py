@@ -0,0 +1,77 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__, "../..").resolve()))
+
+import python_files.models as models
+from python_files.simulator import CSeriesSimulator
+
+BAUDRATE = 115200
+STEPSCALE = 100 # step/mm
+
+def makeSettings(port: str, axis: tuple = ('X','Y'), wait_ack: bool = True, ack_window: int = 1)-> models.ModelSettings:
+    """
+    Settings of a controller simulated on port, 100 step/mm on each axis and no speed limit.
+    """
+    settings = models.ModelSettings(axis, wait_ack=wait_ack, ack_window=ack_window)
+    settings.applySettings(
+        port=port,
+        stepscales={ oneAxis:STEPSCALE for oneAxis in axis },
+        speed_limits={ oneAxis:{ "max":None, "min":None } for oneAxis in axis },
+        baudrate=BAUDRATE,
+        communication="cseries"
+    )
+    return settings
+
+@pytest.fixture
+def simulators():
+    """
+    Start simulated controllers : simulators(cls=CSeriesSimulator, **kwargs), killed after the test.
+    """
+    if os.name != "posix":
+        pytest.skip("CSeriesSimulator needs a posix pseudo-terminal")
+    started = []
+
+    def start(cls=CSeriesSimulator, **kwargs):
+        sim = cls(BAUDRATE, **kwargs)
+        sim.start()
+        started.append(sim)
+        return sim
+
+    yield start
+    for sim in started:
+        sim.kill()
+
+@pytest.fixture
+def controls(simulators):
+    """
+    Create a control of a simulated controller : controls(axis=('X','Y'), sim_cls=CSeriesSimulator, control_cls=ModelControl, ack_window=1),
+    returns the control and its simulator. Controls are closed after the test.
+    """
+    created = []
+
+    def create(axis: tuple = ('X','Y'), sim_cls=CSeriesSimulator, control_cls=models.ModelControl, ack_window: int = 1):
+        sim = simulators(sim_cls)
+        control = control_cls(axis, makeSettings(sim.port, axis, ack_window=ack_window))
+        created.append(control)
+        return control,sim
+
+    yield create
+    for control in created:
+        control.quit()
+
+@pytest.fixture
+def control(controls):
+    """
+    Control of a simulated X,Y controller and its simulator.
+    """
+    return controls()
+
+def controllerValues(sim: CSeriesSimulator, axis: tuple = ('X','Y'))-> dict:
+    """
+    Position of the simulated controller in mm, by axis name.
+    """
+    return { oneAxis:steps/STEPSCALE for oneAxis,steps in zip(axis, sim.position()) }
@@ -0,0 +1,125 @@
+import time
+from threading import Lock
+
+import pytest
+
+from python_files.connection import SerialConnection, SerialReader
+from conftest import BAUDRATE
+
+class FakeLink:
+    """
+    Serial link without file descriptor, bytes recieved are added with feed.
+    """
+    is_open = True
+
+    def __init__(self):
+        self.buffer = b""
+        self.lock = Lock()
+
+    def fileno(self):
+        raise AttributeError("no file descriptor")
+
+    @property
+    def in_waiting(self)-> int:
+        return len(self.buffer)
+
+    def read(self, nb: int)-> bytes:
+        with self.lock:
+            data,self.buffer = self.buffer[:nb],self.buffer[nb:]
+        return data
+
+    def feed(self, data: bytes):
+        with self.lock:
+            self.buffer += data
+
+@pytest.fixture
+def reader():
+    """
+    Create a SerialReader of a FakeLink : reader(**kwargs), returns the reader and its link. Killed after the test.
+    """
+    started = []
+
+    def start(**kwargs):
+        link = FakeLink()
+        serialReader = SerialReader(link, **kwargs)
+        serialReader.start()
+        started.append(serialReader)
+        return serialReader,link
+
+    yield start
+    for serialReader in started:
+        serialReader.kill()
+
+def waitFor(condition, timeout: float = 1.0)-> bool:
+    end = time.monotonic()+timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+def testAnswersInOrder(reader):
+    serialReader,link = reader(size=8)
+    requests = [ serialReader.expect(size) for size in (1, 5, 3) ]
+    # wraps the ring buffer
+    link.feed(b"0ABCDE")
+    link.feed(b"xyz")
+    assert [ request.wait(1) for request in requests ] == [b"0", b"ABCDE", b"xyz"]
+
+def testLateAnswerDiscarded(reader):
+    serialReader,link = reader(late_timeout=1.0, unsolicited_markers=b"S")
+    late = serialReader.expect(1)
+    assert late.wait(0.05) == b""
+    request = serialReader.expect(1)
+    link.feed(b"10")
+    # the late answer is not taken as the answer of the next request
+    assert request.wait(1) == b"0"
+    assert late.data == b"1"
+    assert not serialReader.unsolicited
+
+def testLateAnswerAfterLateTimeout(reader):
+    serialReader,link = reader(late_timeout=0.1, unsolicited_markers=b"S")
+    assert serialReader.expect(1).wait(0.05) == b""
+    time.sleep(0.3)
+    link.feed(b"0")
+    assert waitFor(lambda: link.in_waiting == 0)
+    time.sleep(0.05)
+    # discarded, not an unsolicited frame
+    assert not serialReader.unsolicited
+    assert serialReader.count == 0
+
+def testUnsolicitedMarkers(reader):
+    serialReader,link = reader(unsolicited_markers=b"S")
+    request = serialReader.expect(1)
+    link.feed(b"S0")
+    assert request.wait(1) == b"0"
+    assert list(serialReader.unsolicited) == [b"S"]
+
+def testUnsolicitedBounded(reader):
+    serialReader,link = reader(unsolicited_markers=b"S", max_unsolicited=3)
+    recieved = []
+    serialReader.unsolicited_callbacks.append(recieved.append)
+    link.feed(b"SSSSS")
+    assert waitFor(lambda: len(recieved) == 5)
+    assert len(serialReader.unsolicited) == 3
+
+def testUnsolicitedWithoutMarkers(reader):
+    serialReader,link = reader()
+    link.feed(b"S")
+    assert waitFor(lambda: len(serialReader.unsolicited) == 1)
+    assert serialReader.unsolicited[0] == b"S"
+
+def testLateQueryAnswer(simulators):
+    sim = simulators()
+    connection = SerialConnection(timeout=2)
+    connection.configure(port=sim.port, baudrate=BAUDRATE)
+    try:
+        connection.setUnsolicitedMarkers(b"S")
+        assert connection.query([b"@0P\n\r"], 19, timeout=0.0001) in (b"", None)
+        # the late position answer is not read as the acknowledge
+        assert connection.exchange([b"@03\n\r"]) == [(b"@03\n\r", b"0")]
+        assert connection.query([b"@0P\n\r"], 19, timeout=2) == b"0"+b"000000"*3
+        sim.reply(b"S")
+        assert connection.query([], 1, timeout=1) == b"S"
+    finally:
+        connection.close()
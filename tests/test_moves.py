@@ -0,0 +1,124 @@
+import asyncio
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+import python_files.models as models
+from python_files.simulator import CSeriesSimulator
+from conftest import controllerValues
+
+class StuckSimulator(CSeriesSimulator):
+    """
+    Controller acknowledging movements without moving.
+    """
+    def startMove(self, moves: dict)-> float:
+        return 0.0
+
+def moveCommands(sim: CSeriesSimulator)-> list:
+    return [ cmd for cmd in sim.commands if cmd.startswith(b"@0a") ]
+
+# Move completion
+
+def testMoveReached(control):
+    control,sim = control
+    values = control.absMove({ 'X':1, 'Y':0.5 }, { 'X':10, 'Y':10 }).result(timeout=10)
+    assert values == { 'X':1, 'Y':0.5 }
+    assert controllerValues(sim) == pytest.approx(values)
+
+def testMoveStoppedShort(control):
+    control,sim = control
+    future = control.absMove({ 'X':20, 'Y':0 }, { 'X':5, 'Y':5 })
+    future.started.wait(5)
+    time.sleep(0.3)
+    control.stop()
+    with pytest.raises(models.MoveInterrupted):
+        future.result(timeout=10)
+    assert 0 < control.values['X'] < 20
+    assert control.values == pytest.approx(controllerValues(sim))
+
+def testMoveNeverMoving(controls):
+    control,sim = controls(sim_cls=StuckSimulator)
+    with pytest.raises(models.MoveInterrupted, match="did not move"):
+        control.absMove({ 'X':1, 'Y':1 }, { 'X':10, 'Y':10 }).result(timeout=10)
+    assert control.values == { 'X':0, 'Y':0 }
+
+def testAsyncMoveNeverMoving(controls):
+    control,sim = controls(sim_cls=StuckSimulator, control_cls=models.AsyncModelControl)
+
+    async def move():
+        await control.absMove({ 'X':1, 'Y':1 }, { 'X':10, 'Y':10 })
+
+    with pytest.raises(models.MoveInterrupted):
+        asyncio.run(move())
+    assert control.values == { 'X':0, 'Y':0 }
+
+# Acknowledges
+
+def testPipelinedAckWindow(controls):
+    control,sim = controls(ack_window=4)
+    commands = [b"@03\n\r"] + [ b"@0a 10,1000,%d,1000\n\r" % idx for idx in range(10) ]
+    acks = control.connection.exchange(commands)
+    assert [ cmd for cmd,ack in acks ] == commands
+    assert all( ack == b"0" for cmd,ack in acks )
+    assert sim.commands == [ cmd[:-2] for cmd in commands ]
+
+class DeafSimulator(CSeriesSimulator):
+    """
+    Controller not answering anymore after its axis definition.
+    """
+    def execute(self, cmd: bytes):
+        if self.nb_axis_defined:
+            self.commands.append(cmd)
+            return
+        super().execute(cmd)
+
+def testMissingAck(controls):
+    control,sim = controls(sim_cls=DeafSimulator, ack_window=4)
+    control.connection.timeout = 0.3
+    commands = [b"@03\n\r"] + [ b"@0a 10,1000,%d,1000\n\r" % idx for idx in range(8) ]
+    acks = control.connection.exchange(commands)
+    assert acks[0] == (commands[0], b"0")
+    assert all( ack is None for cmd,ack in acks[1:] )
+    # commands of the window sent before the first acknowledge was missed, not the next ones
+    assert len(sim.commands) == 1+4
+    with pytest.raises(models.ControllerError):
+        control.checkAcks(acks, strict=True)
+
+# Cancel and abandon
+
+def testCancelQueuedAction(control):
+    control,sim = control
+    first = control.absMove({ 'X':3, 'Y':0 }, { 'X':10, 'Y':10 })
+    second = control.absMove({ 'X':0, 'Y':3 }, { 'X':10, 'Y':10 })
+    assert second.cancel()
+    assert first.result(timeout=10) == { 'X':3, 'Y':0 }
+    with pytest.raises(CancelledError):
+        second.result(timeout=10)
+    assert len(moveCommands(sim)) == 1
+    assert control.values == { 'X':3, 'Y':0 }
+
+def testAbandonRunningAction(control):
+    control,sim = control
+    future = control.absMove({ 'X':20, 'Y':0 }, { 'X':5, 'Y':5 })
+    future.started.wait(5)
+    time.sleep(0.3)
+    control.abandon(future)
+    with pytest.raises(models.MoveInterrupted):
+        future.result(timeout=10)
+    assert future.abandoned
+    assert 0 < control.values['X'] < 20
+    assert control.values == pytest.approx(controllerValues(sim))
+
+def testMultiControlCancel(controls):
+    controlXY,simXY = controls(('X','Y'))
+    controlZ,simZ = controls(('Z',))
+    multi = models.MultiControl([controlXY, controlZ])
+    # keeps the X,Y waiting list busy
+    busy = controlXY.absMove({ 'X':3, 'Y':0 }, { 'X':10, 'Y':10 })
+    gathered = multi.absMove({ 'X':0, 'Y':1, 'Z':1 }, { 'X':10, 'Y':10, 'Z':10 })
+    assert gathered.cancel()
+    assert busy.result(timeout=10) == { 'X':3, 'Y':0 }
+    time.sleep(0.3)
+    assert len(moveCommands(simXY)) == 1
+    assert controlXY.values == { 'X':3, 'Y':0 }
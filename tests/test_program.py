@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+import pytest
+
+import python_files.models as models
+from python_files.simulator import CSeriesSimulator
+from conftest import controllerValues, STEPSCALE
+
+ROADMAP = np.array([[1.0, 0.5], [0.5, 1.5], [0.0, 0.2]])
+SPEEDS = { 'X':20, 'Y':20 }
+
+def testCompileRoadmap(control):
+    control,sim = control
+    compiled = control.compileRoadmap(ROADMAP, SPEEDS)
+    assert len(compiled) == len(ROADMAP)
+    # relative moves from the current position, rounding errors don't add up
+    assert np.array_equal(np.cumsum(compiled.steps, axis=0), np.rint(ROADMAP*STEPSCALE))
+    assert compiled.commands[0] == b"@0a 100,2000,50,2000\n\r"
+
+def testCompiledMoves(control):
+    control,sim = control
+    compiled = control.compileRoadmap(ROADMAP, SPEEDS)
+    for index in range(len(compiled)):
+        values = control.compiledMove(compiled, index).result(timeout=10)
+    assert values == dict(zip(('X','Y'), ROADMAP[-1]))
+    assert controllerValues(sim) == pytest.approx(values)
+
+def testProgramSync(control):
+    control,sim = control
+    compiled = control.compileRoadmap(ROADMAP, SPEEDS)
+    for index in range(len(compiled)):
+        values = control.programMove(compiled, index, segment_size=2).result()
+        assert values == dict(zip(('X','Y'), ROADMAP[index]))
+        # the wait point is reached at the end of the move
+        assert controllerValues(sim) == pytest.approx(values)
+    # a segment of 2 moves, then a segment of 1 move
+    assert sim.commands.count(b"@0i") == 2
+    assert [ kind for kind,move in sim.program ] == ["move", "wait"]
+
+def testProgramTimeout(control):
+    control,sim = control
+    compiled = control.compileRoadmap(np.array([[5.0, 0.0], [0.0, 0.0]]), { 'X':5, 'Y':5 })
+    future = control.programMove(compiled, 0, segment_size=2, timeout=0.3)
+    assert isinstance(future.exception(), TimeoutError)
+    # stopped and synchronised with the controller, the program is uploaded again by the next move
+    assert control.program is None
+    assert 0 < control.values['X'] < 5
+    assert control.values == pytest.approx(controllerValues(sim))
+    # a wait point recieved after the timeout is not taken as the one of the next move
+    sim.reply(b"S")
+    time.sleep(0.05)
+    assert control.connection.discardUnsolicited() == b"S"
+
+class NoProgramSimulator(CSeriesSimulator):
+    """
+    Controller answering a syntax error to the moves of a program.
+    """
+    def programLine(self, line: bytes):
+        if line.startswith(b"0"):
+            self.reply(self.ERR_SYNTAX)
+            return
+        super().programLine(line)
+
+def testProgramUploadFailed(controls):
+    control,sim = controls(sim_cls=NoProgramSimulator)
+    compiled = control.compileRoadmap(ROADMAP, SPEEDS)
+    future = control.programMove(compiled, 0, segment_size=2)
+    assert isinstance(future.exception(), models.ControllerError)
+    assert control.program is None
+    # the program is not run
+    assert b"@0S" not in sim.commands
+    assert control.values == { 'X':0, 'Y':0 }
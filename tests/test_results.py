@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+import pytest
+
+from python_files.otheruses.journal import RunJournal
+from python_files.otheruses.results import ResultsSink
+
+# RunJournal
+
+def testJournalResume(tmp_path):
+    filepath = str(tmp_path/"run.journal")
+    journal = RunJournal(filepath, 2)
+    journal.start([100, None])
+    journal.append(0, [0.0, 1.0])
+    journal.append(3, [2.0, 1.5])
+    journal.close()
+
+    resumed = RunJournal(filepath, 2)
+    assert resumed.load() == {0, 3}
+    assert resumed.last_position == [2.0, 1.5]
+    assert resumed.origin[0] == 100 and math.isnan(resumed.origin[1])
+    assert not resumed.hasOrigin()
+    # the next positions are appended after the ones done
+    resumed.append(4, [3.0, 0.0])
+    resumed.close()
+    assert RunJournal(filepath, 2).load() == {0, 3, 4}
+
+def testJournalTruncatedRecord(tmp_path):
+    filepath = str(tmp_path/"run.journal")
+    journal = RunJournal(filepath, 2)
+    journal.start([0, 0])
+    journal.append(0, [0.0, 1.0])
+    journal.append(1, [1.0, 1.0])
+    journal.close()
+    # crash while writing the third record
+    with open(filepath, "ab") as f:
+        f.write(journal.record.pack(2, 2.0, 1.0)[:7])
+
+    resumed = RunJournal(filepath, 2)
+    assert resumed.load() == {0, 1}
+    assert resumed.last_position == [1.0, 1.0]
+    resumed.append(2, [2.0, 1.0])
+    resumed.close()
+
+    reloaded = RunJournal(filepath, 2)
+    assert reloaded.load() == {0, 1, 2}
+    assert reloaded.last_position == [2.0, 1.0]
+    reloaded.close()
+
+def testJournalOtherAxis(tmp_path):
+    filepath = str(tmp_path/"run.journal")
+    journal = RunJournal(filepath, 2)
+    journal.start()
+    journal.close()
+    with pytest.raises(ValueError):
+        RunJournal(filepath, 3).load()
+
+# ResultsSink
+
+def testSinkRoundTrip(tmp_path):
+    directory = str(tmp_path/"results")
+    sink = ResultsSink(directory, 2, batch_size=3)
+    written = []
+    sink.written_callbacks.append(written.append)
+    sink.start()
+    rows = [ (idx, [idx*0.5, 1.0], 10.0+idx, 10.5+idx, np.full(4, idx)) for idx in range(7) ]
+    for row in rows:
+        sink.add(*row)
+    sink.close()
+
+    assert sink.nb_chunks == 3
+    assert [ len(chunk) for chunk in written ] == [3, 3, 1]
+    columns = ResultsSink.read(directory)
+    assert np.array_equal(columns["index"], np.arange(7))
+    assert np.array_equal(columns["position"], np.array([ row[1] for row in rows ]))
+    assert np.array_equal(columns["t_arrived"], np.array([ row[2] for row in rows ]))
+    assert np.array_equal(columns["t_measured"], np.array([ row[3] for row in rows ]))
+    assert columns["payload"].shape == (7, 4)
+    assert np.array_equal(columns["payload"][5], np.full(4, 5))
+
+def testSinkObjectPayloads(tmp_path):
+    directory = str(tmp_path/"results")
+    sink = ResultsSink(directory, 1, batch_size=2)
+    sink.start()
+    payloads = [ [1, 2], [1, 2, 3], "text" ]
+    for idx,payload in enumerate(payloads):
+        sink.add(idx, [float(idx)], 0.0, 0.0, payload)
+    sink.close()
+
+    columns = ResultsSink.read(directory)
+    assert columns["payload"].dtype == object
+    assert [ list(val) if not isinstance(val, str) else val for val in columns["payload"] ] == payloads
+
+def testSinkAppendAfterResume(tmp_path):
+    directory = str(tmp_path/"results")
+    sink = ResultsSink(directory, 1, batch_size=10)
+    sink.start()
+    sink.add(0, [0.0], 0.0, 0.0, 1.0)
+    sink.close()
+    sink.start(clear=False)
+    sink.add(1, [1.0], 0.0, 0.0, 2.0)
+    sink.close()
+    assert np.array_equal(ResultsSink.read(directory)["index"], [0, 1])
+
+    sink.start(clear=True)
+    sink.close()
+    assert ResultsSink.read(directory) == {}
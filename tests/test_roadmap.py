@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from python_files.otheruses.roadmap import gridRoadmap, orderRoadmap, pathTime, serpentineOrder, nearestOrder, stripOrder, twoOpt
+
+SPEEDS = np.array([10.0, 5.0])
+
+def randomRoadmap(nb: int, seed: int = 0)-> np.ndarray:
+    return np.random.default_rng(seed).uniform(0, 20, (nb, 2))
+
+def isPermutation(order, nb: int)-> bool:
+    return np.array_equal(np.sort(order), np.arange(nb))
+
+@pytest.mark.parametrize("positions", [
+    gridRoadmap([(0, 4, 5), (0, 3, 4)]),
+    randomRoadmap(50).round(0),
+    np.array([[1.0, 2.0]]),
+])
+def testSerpentineOrder(positions):
+    order = serpentineOrder(positions)
+    assert isPermutation(order, len(positions))
+
+def testSerpentineGrid():
+    # rows along X shuffled, every move of the serpentine is one step
+    positions = gridRoadmap([(0, 4, 5), (0, 3, 4)])
+    positions = positions[np.random.default_rng(1).permutation(len(positions))]
+    order = serpentineOrder(positions, fast_axis=0)
+    steps = np.abs(np.diff(positions[order], axis=0)).sum(axis=1)
+    assert np.all(steps == 1)
+
+def testStripOrder():
+    positions = randomRoadmap(300)
+    assert isPermutation(stripOrder(positions, SPEEDS), len(positions))
+
+@pytest.mark.parametrize("seed", range(3))
+def testTwoOptDoesNotSlowDown(seed):
+    positions = randomRoadmap(80, seed)
+    start = np.array([0.0, 0.0])
+    order = nearestOrder(positions, SPEEDS, start)
+    improved = twoOpt(positions, order, SPEEDS, start)
+    assert isPermutation(improved, len(positions))
+    assert pathTime(positions[improved], SPEEDS, start) <= pathTime(positions[order], SPEEDS, start)+1e-9
+
+@pytest.mark.parametrize("mode", ["keep", "serpentine", "nearest"])
+@pytest.mark.parametrize("nb", [0, 1, 2, 60])
+def testOrderRoadmap(mode, nb):
+    positions = randomRoadmap(nb)
+    start = np.array([20.0, 0.0])
+    order,before,after = orderRoadmap(positions, SPEEDS, mode, start)
+    assert isPermutation(order, nb)
+    assert before == pytest.approx(pathTime(positions, SPEEDS, start))
+    assert after == pytest.approx(pathTime(positions[order], SPEEDS, start))
+    assert after <= before
+
+def testOrderRoadmapLimits():
+    # strips instead of nearest neighbour, no 2-opt
+    positions = randomRoadmap(400)
+    order,before,after = orderRoadmap(positions, SPEEDS, "nearest", two_opt_limit=10, nearest_limit=100)
+    assert isPermutation(order, len(positions))
+    assert after <= before
+
+def testOrderRoadmapUnknownMode():
+    with pytest.raises(ValueError):
+        orderRoadmap(randomRoadmap(3), SPEEDS, "random")
@@ -2,18 +2,22 @@ from pathlib import Path
 import logging
 import python_files.otheruses.uiconsole as uic
 
-def launchUiConsole(axis_names = ('X','Y')):
+def launchUiConsole(axis_names = ('X','Y'), interactive: bool = True):
+    uicon = None
     try:
         uic.path = str(Path(__file__).parent.absolute())+"\\"
 
         logging.basicConfig(level=logging.INFO)
 
         uicon = uic.UiConsole(axis_names)
-        uicon.printCurrentPosition()
-        uicon.mainMenu()
+        # without menu the console is only created and closed, used to measure startup time
+        if interactive:
+            uicon.printCurrentPosition()
+            uicon.mainMenu()
 
     finally:
-        uicon.mControl.quit()
+        if uicon:
+            uicon.mControl.quit()
 
 if __name__ == "__main__":
     print("starting")